@@ -7,7 +7,6 @@ monkey.patch_all()
 import os
 import logging
 import gevent
-import io
 import json
 import argparse
 
@@ -21,10 +20,23 @@ try:
 except Exception as e:
     print(f"Warning: Could not set timezone from config: {e}")
 
-from flask import Flask, render_template, jsonify, request, send_file
-from flask_socketio import SocketIO, emit
+from flask import Flask, render_template, jsonify, request, send_file, send_from_directory, redirect
+from flask_socketio import SocketIO, emit, join_room
 from functions.dream_db import DreamDB
-from functions.audio import create_wav_file, process_audio
+from functions.audio import (
+    decode_audio_chunk, process_audio, resume_jobs, start_streaming_transcoder,
+    get_playback_file, remove_playback_files
+)
+from functions.recording import RecordingSpool, RecordingSession, new_recording_state
+from functions.callbacks import valid_secret
+from functions.hls import playlist_url, remove_hls
+from functions.http_pool import connection_stats
+from functions.polling import generation_times
+from functions.postprocess import executor
+from functions.scheduler import scheduler
+from functions.speculative import SpeculativeGeneration
+from functions.timing import summarize_durations
+from functions.video import tracker
 from functions.config_loader import load_config, get_config
 
 # Configure logging
@@ -35,27 +47,24 @@ logger = logging.getLogger(__name__)
 # Global Variables & Constants
 # =============================
 
-# Global state for recording
-recording_state = {
-    'is_recording': False,
-    'status': 'ready',  # ready, recording, processing, generating, complete
-    'transcription': '',
-    'video_prompt': '',
-    'video_url': None
-}
-
 # Video playback state
 video_playback_state = {
     'current_index': 0,  # Index of the current video being played
     'is_playing': False  # Whether a video is currently playing
 }
 
-# Audio buffer for storing chunks
-audio_buffer = io.BytesIO()
-wav_file = None
-
-# List to store incoming audio chunks
-audio_chunks = []
+# Recording sessions by device id (or sid), and the session key of each connected sid
+recording_sessions = {}
+session_keys = {}
+
+# Counters for recordings cut short by the size/duration caps
+recording_stats = {
+    'recordings': 0,
+    'limits_reached': 0,
+    'dropped_chunks': 0,    # chunks discarded after a cap or after recording stopped
+    'truncated_chunks': 0,  # chunks cut short to fit RECORDING_MAX_BYTES
+    'dropped_bytes': 0
+}
 
 # =============================
 # Flask App & Extensions Initialization
@@ -74,25 +83,69 @@ socketio = SocketIO(app, cors_allowed_origins="*", async_mode='gevent')
 
 # Initialize DreamDB
 dream_db = DreamDB()
+# Learn Luma render times across restarts
+generation_times.attach(dream_db)
 
 # =============================
 # Core Logic / Helper Functions
 # =============================
 
-def initiate_recording():
-    """Handles the common state changes and buffer resets for starting recording."""
-    global audio_buffer, wav_file, audio_chunks
-    recording_state['is_recording'] = True
-    recording_state['status'] = 'recording'
-    recording_state['transcription'] = '' # Reset transcription
-    recording_state['video_prompt'] = ''  # Reset video prompt
-    # Reset audio storage
-    audio_buffer = io.BytesIO() 
-    audio_chunks = []
-    wav_file = None # Ensure wav_file is reset before creating a new one
-    wav_file = create_wav_file(audio_buffer)
+def get_session(sid):
+    """Return the recording session for a connected client, creating it if needed."""
+    key = session_keys.get(sid, sid)
+    session = recording_sessions.get(key)
+    if session is None:
+        session = recording_sessions[key] = RecordingSession(key)
+    return session
+
+def initiate_recording(session):
+    """Start a new recording for `session` with its own spool and transcoder."""
+    # A previous spool is owned by its process_audio task, which discards it
+    session.start(RecordingSpool(logger=logger), start_streaming_transcoder(logger))
+    # A client that disappears mid-recording stops sending chunks, so the
+    # duration cap can't rely on handle_audio_data alone
+    if session.spool.max_seconds:
+        session.watchdog = gevent.spawn_later(session.spool.max_seconds, enforce_recording_limit, session, session.spool)
+    if get_config().get('SPECULATIVE_GENERATION', False):
+        session.speculation = SpeculativeGeneration(session.spool, owner=session.key, logger=logger).start()
+    if logger:
+        logger.debug(f"Initiated recording for session {session.key}")
+
+def finalize_recording(session, limit_reason=None):
+    """Stop the session's recording and hand it to process_audio in the background."""
+    spool = session.spool
+    speculation = session.speculation
+    session.speculation = None
+    session.stop()
+    if speculation is not None:
+        speculation.stop()
+    recording_stats['recordings'] += 1
+    recording_stats['dropped_chunks'] += spool.dropped_chunks
+    recording_stats['truncated_chunks'] += spool.truncated_chunks
+    recording_stats['dropped_bytes'] += spool.dropped_bytes
+    if limit_reason:
+        recording_stats['limits_reached'] += 1
+        if logger:
+            logger.warning(f"Recording for session {session.key} reached {limit_reason} after "
+                           f"{spool.size} bytes and {spool.elapsed:.1f}s, stopping it")
+        socketio.emit('recording_limit', {
+            'reason': limit_reason,
+            'bytes': spool.size,
+            'seconds': round(spool.elapsed, 1)
+        }, room=session.key)
     if logger:
-        logger.debug("Initiated recording: state set, buffers reset, wav file created.")
+        logger.info(f"Finalizing recording. Status set to processing. Triggering process_audio for session: {session.key}")
+    # Process the audio in a background task; it emits to the session's room
+    session.task = gevent.spawn(
+        process_audio, session.key, socketio, dream_db, session.state, spool, logger,
+        transcoder=session.transcoder, speculation=speculation
+    )
+
+def enforce_recording_limit(session, spool):
+    """Stop the session's recording if it is still recording `spool` and has reached a cap."""
+    if session.is_recording and session.spool is spool and spool.limit_reason:
+        finalize_recording(session, spool.limit_reason)
+        socketio.emit('state_update', session.state, room=session.key)
 
 def init_sample_dreams_if_missing():
     """Attempt to initialize sample dreams by running the init_sample_dreams script."""
@@ -116,22 +169,39 @@ def init_sample_dreams_if_missing():
 @socketio.on('connect')
 def handle_connect(auth=None):
     """Handle new client connection."""
+    # Clients that send a device id keep their session across reconnects
+    device_id = auth.get('device_id') if isinstance(auth, dict) else None
+    key = str(device_id) if device_id else request.sid
+    session_keys[request.sid] = key
+    # Events for the session are sent to a room named after its key
+    join_room(key)
     if logger:
-        logger.info('Client connected')
-    emit('state_update', recording_state)
+        logger.info(f'Client connected (session {key})')
+    session = recording_sessions.get(key)
+    emit('state_update', session.state if session else new_recording_state())
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection."""
+    key = session_keys.pop(request.sid, request.sid)
+    session = recording_sessions.get(key)
+    if session is not None and key == request.sid:
+        # An sid-keyed session can never be resumed, so process what was recorded
+        if session.is_recording:
+            finalize_recording(session)
+        recording_sessions.pop(key, None)
+    elif session is not None and not session.is_busy:
+        recording_sessions.pop(key, None)
     if logger:
-        logger.info('Client disconnected')
+        logger.info(f'Client disconnected (session {key})')
 
 @socketio.on('start_recording')
 def handle_start_recording():
     """Socket event to start recording."""
-    if not recording_state['is_recording']:
-        initiate_recording()
-        emit('state_update', recording_state)
+    session = get_session(request.sid)
+    if not session.is_recording:
+        initiate_recording(session)
+        emit('state_update', session.state)
         if logger:
             logger.info('Started recording via socket event')
     else:
@@ -141,36 +211,36 @@ def handle_start_recording():
 @socketio.on('stream_recording')
 def handle_audio_data(data):
     """Handle incoming audio data chunks from the client during recording."""
-    if recording_state['is_recording']:
+    session = get_session(request.sid)
+    if session.is_recording:
         try:
-            # Convert the received data to bytes
-            audio_bytes = bytes(data['data'])
-            # Store the chunk
-            audio_chunks.append(audio_bytes)
+            # Binary attachments arrive as bytes; int lists are the legacy fallback
+            audio_bytes = decode_audio_chunk(data)
+            # Append the chunk to the on-disk spool, which enforces the size/duration caps
+            kept = session.spool.write(audio_bytes)
+            if session.transcoder and kept:
+                session.transcoder.write(audio_bytes[:kept])
+            if session.spool.limit_reason:
+                finalize_recording(session, session.spool.limit_reason)
+                emit('state_update', session.state)
         except Exception as e:
             if logger:
                 logger.error(f"Error handling audio data: {str(e)}")
             emit('error', {'message': f"Error handling audio data: {str(e)}"})
+    else:
+        # Chunks still in flight after the recording stopped
+        recording_stats['dropped_chunks'] += 1
 
 @socketio.on('stop_recording')
 def handle_stop_recording():
     """Socket event to stop recording and trigger processing."""
-    if recording_state['is_recording']:
-        sid = request.sid # Get SID before changing state
-
+    session = get_session(request.sid)
+    if session.is_recording:
         # Finalize the recording
-        recording_state['is_recording'] = False
-        recording_state['status'] = 'processing'
-        if logger:
-            logger.info(f"Finalizing recording. Status set to processing. Triggering process_audio for SID: {sid}")
-
-        # Process the audio in a background task, passing all required arguments
-        gevent.spawn(
-            process_audio, sid, socketio, dream_db, recording_state, audio_chunks, logger
-        )
+        finalize_recording(session)
 
         # Emit the comprehensive state update after finalizing
-        emit('state_update', recording_state)
+        emit('state_update', session.state)
         if logger:
             logger.info('Stopped recording via socket event.')
     else:
@@ -201,6 +271,7 @@ def handle_show_previous_dream():
         # Emit the video URL to the client
         socketio.emit('play_video', {
             'video_url': f"/media/video/{dream['video_filename']}",
+            'hls_url': playlist_url(dream['video_filename']),
             'loop': True  # Enable looping for the video
         })
         if logger:
@@ -249,6 +320,72 @@ def api_get_config():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/recording_stats')
+def api_recording_stats():
+    """API endpoint reporting recording cap counters and the sessions currently recording or processing."""
+    stats = dict(recording_stats)
+    stats['sessions'] = {}
+    for key, session in list(recording_sessions.items()):
+        if not session.is_busy:
+            continue
+        stats['sessions'][key] = {'status': session.state['status']}
+        if session.is_recording:
+            stats['sessions'][key].update({
+                'bytes': session.spool.size,
+                'seconds': round(session.spool.elapsed, 1),
+                'max_bytes': session.spool.max_bytes,
+                'max_seconds': session.spool.max_seconds
+            })
+    return jsonify(stats)
+
+@app.route('/api/pipeline')
+def api_pipeline():
+    """API endpoint reporting the concurrency limit, running and queued requests of each pipeline stage."""
+    return jsonify(scheduler.snapshot())
+
+@app.route('/api/postprocess')
+def api_postprocess():
+    """API endpoint reporting ffmpeg jobs waiting, running and recently finished, with the CPU seconds each used."""
+    return jsonify(executor.snapshot(scheduler.stages['ffmpeg']))
+
+@app.route('/api/luma_generations')
+def api_luma_generations():
+    """API endpoint listing the Luma generations being waited on, with their age and status checks so far."""
+    return jsonify(tracker.snapshot())
+
+@app.route('/api/http_stats')
+def api_http_stats():
+    """API endpoint reporting requests, new connections and reused keep-alive connections per upstream host."""
+    return jsonify(connection_stats())
+
+@app.route('/api/stage_timings')
+def api_stage_timings():
+    """API endpoint reporting p50/p95/p99 and a histogram of each pipeline stage's duration."""
+    try:
+        limit = request.args.get('limit', 10000, type=int)
+        return jsonify(summarize_durations(dream_db.get_stage_durations(limit)))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/dreams/<int:dream_id>/timings')
+def api_dream_timings(dream_id):
+    """API endpoint listing how long each pipeline stage of a dream took."""
+    try:
+        return jsonify(dream_db.get_stage_timings(dream_id))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/luma_callback/<secret>', methods=['POST'])
+def api_luma_callback(secret):
+    """API endpoint Luma posts generation updates to (see LUMA_CALLBACK_URL); wakes the job waiting on the generation."""
+    if not valid_secret(secret):
+        return jsonify({'error': 'Invalid callback secret'}), 403
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data.get('id'):
+        return jsonify({'error': 'Missing generation in callback'}), 400
+    # Answer 200 for generations no one waits on, so Luma doesn't retry them
+    return jsonify({'status': 'success', 'delivered': tracker.deliver(data)})
+
 @app.route('/api/gpio_single_tap', methods=['POST'])
 def gpio_single_tap():
     """API endpoint for single tap from GPIO controller."""
@@ -321,6 +458,10 @@ def delete_dream(dream_id):
                 audio_path = os.path.join(get_config()['RECORDINGS_DIR'], dream['audio_filename'])
                 if os.path.exists(audio_path):
                     os.remove(audio_path)
+                if dream['audio_filename']:
+                    remove_playback_files(dream['audio_filename'])
+                # Delete HLS renditions, if the video was packaged
+                remove_hls(dream['video_filename'])
             except Exception as e:
                 if logger:
                     logger.error(f"Error deleting files for dream {dream_id}: {str(e)}")
@@ -516,6 +657,39 @@ def serve_media(filename):
     except FileNotFoundError:
         return "File not found", 404
 
+@app.route('/media/audio/<path:filename>')
+def serve_audio(filename):
+    """Serve an archived recording, or a cached playback copy if ?format= is given."""
+    try:
+        fmt = request.args.get('format')
+        if fmt:
+            return send_file(get_playback_file(filename, fmt, logger))
+        return send_from_directory(get_config()['RECORDINGS_DIR'], filename)
+    except ValueError as e:
+        return str(e), 400
+    except Exception as e:
+        if logger:
+            logger.error(f"Error serving audio {filename}: {str(e)}")
+        return "Audio not found", 404
+
+@app.route('/media/hls/<path:filename>')
+def serve_hls(filename):
+    """Serve HLS playlists and segments from the HLS directory."""
+    mimetype = 'application/vnd.apple.mpegurl' if filename.endswith('.m3u8') else 'video/mp2t'
+    response = send_from_directory(get_config().get('HLS_DIR', 'media/hls'), filename, mimetype=mimetype)
+    if filename.endswith('.m3u8'):
+        # Playlists of a video being repackaged may change; segments never do
+        response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/dreams/<int:dream_id>/playlist')
+def dream_playlist(dream_id):
+    """Redirect to a dream's HLS master playlist, or to its MP4 if it hasn't been packaged."""
+    dream = dream_db.get_dream(dream_id)
+    if not dream:
+        return jsonify({'error': 'Dream not found'}), 404
+    return redirect(playlist_url(dream['video_filename']) or f"/media/video/{dream['video_filename']}")
+
 @app.route('/media/thumbs/<path:filename>')
 def serve_thumbnail(filename):
     """Serve thumbnail files from the thumbs directory."""
@@ -533,6 +707,8 @@ if __name__ == '__main__':  # pragma: no cover
     parser = argparse.ArgumentParser()
     parser.add_argument('--reload', action='store_true', help='Enable auto-reloader')
     args = parser.parse_args()
+    # Carry on with dreams that were being generated when the server last stopped
+    resume_jobs(socketio, dream_db, logger)
     # Start the Flask-SocketIO server
     socketio.run(
         app, 
@@ -1,18 +1,55 @@
 import wave
 import os
-import tempfile
+import time
 import ffmpeg
-import wave
+import gevent
 
 from datetime import datetime
-from functions.video import generate_video
+from functions.video import generate_video, remove_preview_files, timestamped_name
+from functions.hls import hls_enabled, package_in_background
 from functions.config_loader import get_config
+from functions.http_pool import openai_http_client
+from functions.recording import RecordingSpool, read_recording, recording_hash, new_recording_state
+from functions.jobs import PipelineJob
+from functions.scheduler import scheduler, set_job_context
+from functions.timing import timed_stage, set_stage_listener
+from functions.vad import trim_wav_file, read_wav_samples
 from openai import OpenAI
+from werkzeug.utils import safe_join
+
+# File extension and ffmpeg output options for each archive format
+ARCHIVE_FORMATS = {
+    'wav': ('.wav', {'acodec': 'pcm_s16le'}),
+    'webm': ('.webm', {'acodec': 'libopus'}),
+    'opus': ('.ogg', {'acodec': 'libopus'}),
+    'flac': ('.flac', {'acodec': 'flac'}),
+}
+
+# Formats the dreams page can ask for when a browser can't play the archive
+PLAYBACK_FORMATS = {
+    'm4a': {'acodec': 'aac', 'audio_bitrate': '96k'},
+    'wav': {'acodec': 'pcm_s16le'},
+}
+
+# Whisper resamples everything to 16 kHz mono, so anything above that is wasted upload
+WHISPER_SAMPLE_RATE = 16000
+
+# Encodings for the transcription upload: (filename sent to Whisper, ffmpeg output options)
+UPLOAD_FORMATS = {
+    'original': ('recording.webm', {'format': 'webm', 'acodec': 'libopus', 'audio_bitrate': '48k'}),
+    'wav16k': ('recording.wav', {'format': 'wav', 'acodec': 'pcm_s16le', 'ar': WHISPER_SAMPLE_RATE}),
+    # compression_level 5 encodes about twice as fast as the default 10 for <1% more bytes
+    'opus16k': ('recording.webm', {'format': 'webm', 'acodec': 'libopus', 'audio_bitrate': '24k',
+                                   'application': 'voip', 'compression_level': 5, 'ar': WHISPER_SAMPLE_RATE}),
+}
+
+# Trimming less than this isn't worth re-encoding the upload for
+MIN_TRIMMED_SECONDS = 0.5
 
 # Initialize OpenAI client
 client = OpenAI(
     api_key=get_config()["OPENAI_API_KEY"],
-    http_client=None
+    http_client=openai_http_client()
 )
 
 def create_wav_file(audio_buffer):
@@ -23,87 +60,423 @@ def create_wav_file(audio_buffer):
     wav_file.setframerate(int(get_config()['AUDIO_FRAME_RATE']))
     return wav_file
 
+def decode_audio_chunk(payload):
+    """Return the raw bytes of a `stream_recording` payload.
+
+    Binary Socket.IO attachments (bytes/memoryview) are used as-is. The legacy
+    JSON list-of-ints encoding is still accepted as a fallback for older clients.
+    """
+    data = payload['data'] if isinstance(payload, dict) else payload
+    if isinstance(data, bytes):
+        return data
+    if isinstance(data, (bytearray, memoryview)):
+        return bytes(data)
+    if isinstance(data, list):
+        return bytes(data)
+    raise TypeError(f"Unsupported audio chunk type: {type(data).__name__}")
+
 def save_wav_file(audio_data, filename=None, logger=None):
-    """Save the WAV file locally for debugging. Converts WebM to WAV using ffmpeg."""
+    """Save the WAV file locally for debugging. Converts WebM to WAV using ffmpeg.
+
+    The recording is fed to ffmpeg over stdin, so the WebM is never written to a
+    temporary file; `audio_data` may be bytes or a memory map of the spool.
+    """
     if filename is None:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"recording_{timestamp}.wav"
+        filename = f"{timestamped_name('recording')}.wav"
     # Ensure the recordings directory exists
     os.makedirs(get_config()['RECORDINGS_DIR'], exist_ok=True)
     filepath = os.path.join(get_config()['RECORDINGS_DIR'], filename)
-    # Create a temporary file for the WebM data
-    with tempfile.NamedTemporaryFile(suffix='.webm', delete=False) as temp_webm:
-        temp_webm.write(audio_data)
-        temp_webm_path = temp_webm.name
-    try:
-        # Convert WebM to WAV using ffmpeg
-        stream = ffmpeg.input(temp_webm_path)
-        stream = ffmpeg.output(stream, filepath, acodec='pcm_s16le', ac=1, ar=44100)
-        ffmpeg.run(stream, overwrite_output=True, quiet=True)
+    # Convert WebM to WAV using ffmpeg, reading the WebM from a pipe
+    stream = ffmpeg.input('pipe:0')
+    stream = ffmpeg.output(stream, filepath, acodec='pcm_s16le', ac=1, ar=44100)
+    ffmpeg.run(stream, input=audio_data, overwrite_output=True, quiet=True)
+    if logger:
         logger.info(f"Saved WAV file to {filepath}")
-        return filename
-    finally:
-        # Clean up temporary file
+    return filename
+
+class StreamingTranscoder:
+    """Long-lived ffmpeg process that converts a recording to WAV while it is being captured.
+
+    Chunks are written to ffmpeg's stdin as they arrive, so when recording stops
+    only the last few hundred milliseconds of audio are left to decode.
+    """
+
+    def __init__(self, filename=None, logger=None):
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            filename = f"recording_{timestamp}.wav"
+        os.makedirs(get_config()['RECORDINGS_DIR'], exist_ok=True)
+        self.filename = filename
+        self.filepath = os.path.join(get_config()['RECORDINGS_DIR'], filename)
+        self.logger = logger
+        self.failed = False
+        self.ready_seconds = None
+        stream = ffmpeg.input('pipe:0')
+        stream = ffmpeg.output(stream, self.filepath, acodec='pcm_s16le', ac=1, ar=44100)
+        # Only errors go to stderr, so the pipe can't fill up during a long recording
+        stream = stream.global_args('-nostats', '-loglevel', 'error')
+        self.process = ffmpeg.run_async(stream, pipe_stdin=True, pipe_stderr=True, overwrite_output=True)
+
+    def write(self, chunk):
+        """Feed a chunk of WebM audio to ffmpeg."""
+        if self.failed:
+            return
+        try:
+            self.process.stdin.write(chunk)
+        except (BrokenPipeError, OSError, ValueError) as e:
+            self.failed = True
+            if self.logger:
+                self.logger.warning(f"Streaming transcoder stopped accepting audio: {str(e)}")
+
+    def finish(self):
+        """Close ffmpeg's input and wait for the WAV. Returns the filename, or None on failure."""
+        start = time.perf_counter()
+        try:
+            _, stderr = self.process.communicate()
+        except Exception as e:
+            self.failed = True
+            stderr = str(e).encode()
+        if self.process.returncode != 0:
+            self.failed = True
+        if self.failed:
+            if self.logger:
+                self.logger.warning(f"Streaming transcoder failed: {(stderr or b'').decode(errors='replace').strip()}")
+            self.abort()
+            return None
+        self.ready_seconds = time.perf_counter() - start
+        if self.logger:
+            self.logger.info(f"Saved WAV file to {self.filepath} ({self.ready_seconds * 1000:.0f} ms after stop)")
+        return self.filename
+
+    def abort(self):
+        """Stop ffmpeg and remove the partial WAV."""
+        try:
+            self.process.kill()
+            self.process.wait()
+        except Exception:
+            pass
+        try:
+            os.unlink(self.filepath)
+        except OSError:
+            pass
+
+def start_streaming_transcoder(logger=None):
+    """Start a StreamingTranscoder if enabled in the config, or return None."""
+    if not get_config().get('AUDIO_STREAMING_TRANSCODE', True):
+        return None
+    try:
+        return StreamingTranscoder(logger=logger)
+    except Exception as e:
+        if logger:
+            logger.warning(f"Could not start streaming transcoder, falling back to conversion at stop: {str(e)}")
+        return None
+
+def encode_pcm_for_upload(samples, sample_rate, fmt='original'):
+    """Encode 16-bit mono PCM samples for Whisper in one of the UPLOAD_FORMATS, in memory.
+
+    Returns the (filename, content) tuple to upload.
+    """
+    upload_filename, options = UPLOAD_FORMATS[fmt]
+    stream = ffmpeg.input('pipe:0', format='s16le', ar=sample_rate, ac=1)
+    stream = ffmpeg.output(stream, 'pipe:1', ac=1, **options)
+    out, _ = ffmpeg.run(stream, input=samples.tobytes(), capture_stdout=True, quiet=True)
+    return (upload_filename, out)
+
+def prepare_transcription_upload(wav_filename, audio_data, recording_state, logger=None):
+    """Return the (filename, content) to upload to Whisper.
+
+    When AUDIO_VAD_ENABLED is set, silence is trimmed from the decoded WAV first.
+    WHISPER_UPLOAD_FORMAT then picks the encoding: 'original' sends the recording
+    as captured (re-encoded only if silence was trimmed), while 'wav16k' and
+    'opus16k' downsample to Whisper's native 16 kHz mono.
+    """
+    config = get_config()
+    fmt = str(config.get('WHISPER_UPLOAD_FORMAT', 'opus16k')).lower()
+    original = ('recording.webm', audio_data)
+    if fmt not in UPLOAD_FORMATS:
+        if logger:
+            logger.warning(f"Unknown WHISPER_UPLOAD_FORMAT {fmt}, uploading the original recording")
+        return original
+    wav_path = os.path.join(config['RECORDINGS_DIR'], wav_filename)
+    samples = None
+    if config.get('AUDIO_VAD_ENABLED', True):
+        try:
+            samples, sample_rate, removed_seconds = trim_wav_file(wav_path, logger)
+            recording_state['silence_removed_seconds'] = round(removed_seconds, 2)
+            if fmt == 'original' and removed_seconds < MIN_TRIMMED_SECONDS:
+                return original
+        except Exception as e:
+            if logger:
+                logger.warning(f"Voice activity trimming failed, uploading the full recording: {str(e)}")
+            samples = None
+    try:
+        if samples is None:
+            if fmt == 'original':
+                return original
+            samples, sample_rate = read_wav_samples(wav_path)
+        start = time.perf_counter()
+        upload = encode_pcm_for_upload(samples, sample_rate, fmt)
+        recording_state['upload_bytes'] = len(upload[1])
+        if logger:
+            logger.info(f"Encoded Whisper upload as {fmt} in {(time.perf_counter() - start) * 1000:.0f} ms: "
+                        f"{len(upload[1])} bytes, {len(audio_data) - len(upload[1])} bytes smaller than the recording")
+        return upload
+    except Exception as e:
+        if logger:
+            logger.warning(f"Could not encode Whisper upload as {fmt}, uploading the original recording: {str(e)}")
+        return original
+
+def encode_audio_file(input_path, output_path, fmt):
+    """Encode an audio file to one of the ARCHIVE_FORMATS or PLAYBACK_FORMATS with ffmpeg."""
+    if fmt in ARCHIVE_FORMATS:
+        options = dict(ARCHIVE_FORMATS[fmt][1])
+        if options['acodec'] == 'libopus':
+            options['audio_bitrate'] = get_config().get('AUDIO_ARCHIVE_BITRATE', '24k')
+    elif fmt in PLAYBACK_FORMATS:
+        options = dict(PLAYBACK_FORMATS[fmt])
+    else:
+        raise ValueError(f"Unknown audio format: {fmt}")
+    stream = ffmpeg.input(input_path)
+    stream = ffmpeg.output(stream, output_path, ac=1, **options)
+    ffmpeg.run(stream, overwrite_output=True, quiet=True)
+    return output_path
+
+def archive_recording(wav_filename, audio_data, recording=None, logger=None):
+    """Store a processed recording in AUDIO_ARCHIVE_FORMAT and return the archived filename.
+
+    `wav` keeps the decoded WAV as before, `webm` keeps the original Opus/WebM
+    upload and `opus`/`flac` re-encode the WAV. The WAV is removed once the
+    archive has been written. On failure the WAV is kept and its name returned.
+    """
+    fmt = str(get_config().get('AUDIO_ARCHIVE_FORMAT', 'wav')).lower()
+    if fmt == 'wav':
+        return wav_filename
+    try:
+        if fmt not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown AUDIO_ARCHIVE_FORMAT: {fmt}")
+        recordings_dir = get_config()['RECORDINGS_DIR']
+        wav_path = os.path.join(recordings_dir, wav_filename)
+        archive_filename = os.path.splitext(wav_filename)[0] + ARCHIVE_FORMATS[fmt][0]
+        archive_path = os.path.join(recordings_dir, archive_filename)
+        if fmt == 'webm' and isinstance(recording, RecordingSpool):
+            # The spool already holds the original WebM; just keep it
+            recording.persist(archive_path)
+        elif fmt == 'webm':
+            with open(archive_path, 'wb') as f:
+                f.write(audio_data)
+        else:
+            encode_audio_file(wav_path, archive_path, fmt)
+        wav_size = os.path.getsize(wav_path)
+        archive_size = os.path.getsize(archive_path)
+        os.unlink(wav_path)
+        if logger:
+            logger.info(f"Archived recording as {archive_filename}: {archive_size} bytes, "
+                        f"{wav_size - archive_size} bytes smaller than WAV")
+        return archive_filename
+    except Exception as e:
+        if logger:
+            logger.warning(f"Could not archive recording as {fmt}, keeping WAV: {str(e)}")
+        return wav_filename
+
+def get_playback_file(filename, fmt, logger=None):
+    """Return the path of a playable copy of an archived recording.
+
+    The copy is transcoded on first request and cached under RECORDINGS_DIR/playback.
+    """
+    if fmt not in PLAYBACK_FORMATS:
+        raise ValueError(f"Unknown playback format: {fmt}")
+    recordings_dir = get_config()['RECORDINGS_DIR']
+    source_path = safe_join(recordings_dir, filename)
+    if source_path is None or not os.path.isfile(source_path):
+        raise FileNotFoundError(filename)
+    cache_dir = os.path.join(recordings_dir, 'playback')
+    os.makedirs(cache_dir, exist_ok=True)
+    cached_path = os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(filename))[0]}.{fmt}")
+    if not os.path.exists(cached_path) or os.path.getmtime(cached_path) < os.path.getmtime(source_path):
+        # Encode next to the cache entry and swap it in so a half-written file is never served
+        temp_path = f"{cached_path}.partial.{fmt}"
+        encode_audio_file(source_path, temp_path, fmt)
+        os.replace(temp_path, cached_path)
+        if logger:
+            logger.info(f"Cached {fmt} playback copy of {filename}")
+    return cached_path
+
+def remove_playback_files(filename):
+    """Delete any cached playback copies of an archived recording."""
+    cache_dir = os.path.join(get_config()['RECORDINGS_DIR'], 'playback')
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    for fmt in PLAYBACK_FORMATS:
         try:
-            os.unlink(temp_webm_path)
-        except:
+            os.unlink(os.path.join(cache_dir, f"{stem}.{fmt}"))
+        except OSError:
             pass
 
+def transcribe_recording(wav_filename, audio_data, audio_hash, dream_db, recording_state, logger=None):
+    """Return the transcription of a recording, using the cache in `dream_db` when possible.
+
+    Identical audio (same content hash) is only sent to Whisper once per WHISPER_MODEL.
+    """
+    model = get_config()['WHISPER_MODEL']
+    text = dream_db.get_cached_transcription(audio_hash, model)
+    if text is not None:
+        recording_state['transcription_cached'] = True
+        if logger:
+            logger.info(f"Using cached {model} transcription for audio {audio_hash[:12]}")
+        return text
+    # Transcribe the audio using OpenAI's Whisper API, uploading the
+    # recording straight from memory rather than via a temporary file
+    upload = prepare_transcription_upload(wav_filename, audio_data, recording_state, logger)
+    with timed_stage('whisper'), scheduler.slot('whisper'):
+        text = client.audio.transcriptions.create(model=model, file=upload).text
+    try:
+        dream_db.save_transcription(audio_hash, model, text)
+    except Exception as e:
+        if logger:
+            logger.warning(f"Could not cache transcription: {str(e)}")
+    return text
+
 def generate_video_prompt(transcription, luma_extend=False, logger=None, config=None):
     """Generate an enhanced video prompt from the transcription using GPT."""
     try:
         system_prompt = get_config()['GPT_SYSTEM_PROMPT_EXTEND'] if luma_extend else get_config()['GPT_SYSTEM_PROMPT']
-        response = client.chat.completions.create(
-            model=get_config()['GPT_MODEL'],
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"{transcription}"}
-            ],
-            temperature=float(get_config()['GPT_TEMPERATURE']),
-            max_tokens=int(get_config()['GPT_MAX_TOKENS'])
-        )
+        with timed_stage('gpt'), scheduler.slot('gpt'):
+            response = client.chat.completions.create(
+                model=get_config()['GPT_MODEL'],
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": f"{transcription}"}
+                ],
+                temperature=float(get_config()['GPT_TEMPERATURE']),
+                max_tokens=int(get_config()['GPT_MAX_TOKENS'])
+            )
         return response.choices[0].message.content.strip()
     except Exception as e:
         if logger:
             logger.error(f"Error generating video prompt: {str(e)}")
         return None
 
-def process_audio(sid, socketio, dream_db, recording_state, audio_chunks, logger = None):
-    """Process the recorded audio and generate video, then update state and emit events."""
+def transcribe_stage(job, recording, transcoder, dream_db, recording_state, logger=None):
+    """Decode, hash, transcribe and archive a recording, checkpointing each step to `job`."""
+    audio_data = b''
     try:
-        audio_data = b''.join(audio_chunks)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        wav_filename = f"recording_{timestamp}.wav"
-        wav_filename = save_wav_file(audio_data, wav_filename, logger)
-        # Create a temporary file for the audio
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-            temp_file.write(audio_data)
-            temp_file_path = temp_file.name
-        # Transcribe the audio using OpenAI's Whisper API
-        with open(temp_file_path, 'rb') as audio_file:
-            transcription = client.audio.transcriptions.create(
-                model=get_config()['WHISPER_MODEL'],
-                file=audio_file
-            )
+        if isinstance(recording, RecordingSpool) and 'recording_filename' not in job.data:
+            # Give the spool a stable name so an interrupted job can find it again
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            recording_filename = f"recording_{timestamp}.webm"
+            recording.move(os.path.join(get_config()['RECORDINGS_DIR'], recording_filename))
+            job.checkpoint('queued', recording_filename=recording_filename)
+        # Memory-map the spool rather than joining the chunks into a second copy
+        audio_data = read_recording(recording)
+        wav_filename = job.data.get('wav_filename')
+        if wav_filename is None or not os.path.exists(os.path.join(get_config()['RECORDINGS_DIR'], wav_filename)):
+            with timed_stage('wav_save'):
+                wav_filename = transcoder.finish() if transcoder else None
+                if wav_filename is None:
+                    wav_filename = f"{timestamped_name('recording')}.wav"
+                    wav_filename = save_wav_file(audio_data, wav_filename, logger)
+        audio_hash = job.data.get('audio_hash') or recording_hash(recording, audio_data)
+        job.checkpoint('transcribing', wav_filename=wav_filename, audio_hash=audio_hash)
+        recording_state['audio_hash'] = audio_hash
+        duplicates = dream_db.find_dreams_by_audio_hash(audio_hash)
+        if duplicates:
+            recording_state['duplicate_of'] = duplicates[0]['id']
+            if logger:
+                logger.warning(f"Recording {audio_hash[:12]} was already used for dream {duplicates[0]['id']}")
+        text = transcribe_recording(wav_filename, audio_data, audio_hash, dream_db, recording_state, logger)
+        # The WAV is only needed up to transcription; store it in the archive format
+        audio_filename = archive_recording(wav_filename, audio_data, recording, logger)
+        job.checkpoint('prompting', transcription=text, audio_filename=audio_filename)
+        return text
+    finally:
+        if hasattr(audio_data, 'close'):
+            audio_data.close()
+
+def stage_recorder(job, dream_db, socketio, sid=None, logger=None):
+    """Return a stage listener that stores a job's stage timings and optionally emits them.
+
+    With PIPELINE_STAGE_EVENTS set, each finished stage is also sent to the
+    client as a `pipeline_stage` event.
+    """
+    def record(stage, seconds, ok):
+        try:
+            dream_db.save_stage_timing(job.id, stage, seconds, ok)
+        except Exception as e:
+            if logger:
+                logger.warning(f"Could not save {stage} timing for job {job.id}: {str(e)}")
+        if logger:
+            logger.debug(f"Job {job.id} stage {stage} took {seconds:.3f}s{'' if ok else ' (failed)'}")
+        if get_config().get('PIPELINE_STAGE_EVENTS', False):
+            event = {'job_id': job.id, 'stage': stage, 'seconds': round(seconds, 3), 'ok': ok}
+            if sid:
+                socketio.emit('pipeline_stage', event, room=sid)
+            else:
+                socketio.emit('pipeline_stage', event)
+    return record
+
+def preview_emitter(socketio, recording_state, sid=None):
+    """on_preview callback for generate_video(): send a finished but still extending clip to the client."""
+    def emit(filename):
+        recording_state['preview_url'] = f"/media/video/{filename}"
+        event = {'url': recording_state['preview_url'], 'partial': True}
+        if sid:
+            socketio.emit('video_ready', event, room=sid)
+        else:
+            socketio.emit('video_ready', event)
+    return emit
+
+def process_audio(sid, socketio, dream_db, recording_state, recording, logger = None, transcoder=None, job=None,
+                  speculation=None):
+    """Process the recorded audio and generate video, then update state and emit events.
+
+    `recording` is the RecordingSpool the chunks were written to, or a list of chunks.
+    If a StreamingTranscoder was fed during recording its WAV is used directly.
+    Progress is checkpointed to a PipelineJob in the jobs table; pass `job` to
+    resume an interrupted one, skipping every stage that already finished.
+    Stage durations are stored with the job (see functions.timing).
+    A SpeculativeGeneration started during recording is adopted if it matches
+    the final transcription, skipping the GPT prompt and Luma create.
+    With LUMA_EXTEND, each finished segment is sent as a `video_ready` event
+    with `partial: True` while the next one renders.
+    """
+    started = time.perf_counter()
+    resumed = job is not None
+    try:
+        if job is None:
+            job = PipelineJob.create(dream_db, sid)
+        recording_state['job_id'] = job.id
+        set_job_context(sid, job.id)
+        set_stage_listener(stage_recorder(job, dream_db, socketio, sid, logger))
+        if 'transcription' in job.data:
+            text = job.data['transcription']
+        else:
+            text = transcribe_stage(job, recording, transcoder, dream_db, recording_state, logger)
         # Update the transcription in the global state
-        recording_state['transcription'] = transcription.text
+        recording_state['transcription'] = text
         # Emit the transcription
         if sid:
-            socketio.emit('transcription_update', {'text': transcription.text}, room=sid)
+            socketio.emit('transcription_update', {'text': text}, room=sid)
         else:
-            socketio.emit('transcription_update', {'text': transcription.text})
+            socketio.emit('transcription_update', {'text': text})
+        if speculation is not None and 'video_prompt' not in job.data:
+            recording_state['speculative'] = speculation.resolve(job, text)
         # Check if LUMA_EXTEND is set
-        luma_extend = str(get_config()['LUMA_EXTEND']).lower() in ('1', 'true', 'yes')
+        luma_extend = job.data.get('luma_extend')
+        if luma_extend is None:
+            luma_extend = str(get_config()['LUMA_EXTEND']).lower() in ('1', 'true', 'yes')
         # Generate video prompt
-        video_prompt = generate_video_prompt(transcription=transcription.text, luma_extend=luma_extend, logger=logger, config=get_config())
+        video_prompt = job.data.get('video_prompt')
         if not video_prompt:
-            raise Exception("Failed to generate video prompt")
+            video_prompt = generate_video_prompt(transcription=text, luma_extend=luma_extend, logger=logger, config=get_config())
+            if not video_prompt:
+                raise Exception("Failed to generate video prompt")
+            job.checkpoint('generating', video_prompt=video_prompt, luma_extend=luma_extend)
         recording_state['video_prompt'] = video_prompt
         if sid:
             socketio.emit('video_prompt_update', {'text': video_prompt}, room=sid)
         else:
             socketio.emit('video_prompt_update', {'text': video_prompt})
-        video_filename, thumb_filename = generate_video(prompt=video_prompt, luma_extend=luma_extend, logger=logger)
+        video_filename, thumb_filename = generate_video(prompt=video_prompt, luma_extend=luma_extend, logger=logger, job=job,
+                                                        on_preview=preview_emitter(socketio, recording_state, sid))
         # Save to database
         DreamData = None
         try:
@@ -113,12 +486,15 @@ def process_audio(sid, socketio, dream_db, recording_state, audio_chunks, logger
         dream_data = DreamData(
             user_prompt=recording_state['transcription'],
             generated_prompt=recording_state['video_prompt'],
-            audio_filename=wav_filename,
+            audio_filename=job.data['audio_filename'],
             video_filename=video_filename,
             thumb_filename=thumb_filename,
             status='completed',
+            audio_hash=job.data['audio_hash'],
         )
-        dream_db.save_dream(dream_data.model_dump())
+        with timed_stage('db_save'):
+            dream_id = dream_db.save_dream(dream_data.model_dump())
+        job.checkpoint('done', dream_id=dream_id)
         recording_state['status'] = 'complete'
         recording_state['video_url'] = f"/media/video/{video_filename}"
         # Emit the video ready event to trigger playback
@@ -126,19 +502,80 @@ def process_audio(sid, socketio, dream_db, recording_state, audio_chunks, logger
             socketio.emit('video_ready', {'url': recording_state['video_url']}, room=sid)
         else:
             socketio.emit('video_ready', {'url': recording_state['video_url']})
+        # HLS renditions for remote viewers follow once the dream is already playable
+        if hls_enabled():
+            package_in_background(video_filename, logger)
+        # A resumed job's total would include the downtime, so it isn't recorded
+        if not resumed:
+            stage_recorder(job, dream_db, socketio, sid, logger)('total', time.perf_counter() - started, True)
+        try:
+            dream_db.link_stage_timings(job.id, dream_id)
+        except Exception as e:
+            if logger:
+                logger.warning(f"Could not link stage timings to dream {dream_id}: {str(e)}")
         if logger:
             logger.info(f"Audio processed and video generated for SID: {sid}")
     except Exception as e:
         recording_state['status'] = 'error'
-        socketio.emit('error', {'message': str(e)})
+        if job is not None:
+            job.fail(e)
+        if sid:
+            socketio.emit('error', {'message': str(e)}, room=sid)
+        else:
+            socketio.emit('error', {'message': str(e)})
         if logger:
             logger.error(f"Error processing audio: {str(e)}")
     finally:
+        set_stage_listener(None)
+        if speculation is not None:
+            speculation.discard()
         # Clean up
-        audio_chunks = []
-        # Remove temporary file if it exists
-        if 'temp_file_path' in locals():
+        if job is not None and job.finished:
+            remove_preview_files(job.data.get('preview_filenames'))
+            recording_filename = job.data.get('recording_filename')
+            # A job resumed after transcription has no spool, but its WebM is still on disk
+            if recording_filename and recording is None and recording_filename != job.data.get('audio_filename'):
+                try:
+                    os.unlink(os.path.join(get_config()['RECORDINGS_DIR'], recording_filename))
+                except OSError:
+                    pass
+        if isinstance(recording, RecordingSpool):
+            recording.discard()
+
+def resume_jobs(socketio, dream_db, logger=None):
+    """Restart every unfinished job in the background; returns the greenlets.
+
+    Each job continues from its last checkpoint. Jobs that stopped before
+    transcription need their recording, which is kept under RECORDINGS_DIR
+    until the job has finished. Spools of recordings that were still being
+    captured belong to no job and are deleted, so call this before accepting
+    new recordings.
+    """
+    recordings_dir = get_config()['RECORDINGS_DIR']
+    for filename in os.listdir(recordings_dir) if os.path.isdir(recordings_dir) else []:
+        if filename.startswith('spool_'):
             try:
-                os.unlink(temp_file_path)
-            except:
-                pass
\ No newline at end of file
+                os.unlink(os.path.join(recordings_dir, filename))
+                if logger:
+                    logger.info(f"Removed stale recording spool {filename}")
+            except OSError:
+                pass
+    greenlets = []
+    for row in dream_db.get_unfinished_jobs():
+        job = PipelineJob.from_row(dream_db, row)
+        recording = None
+        if 'transcription' not in job.data:
+            path = os.path.join(recordings_dir, job.data.get('recording_filename') or '')
+            if not job.data.get('recording_filename') or not os.path.exists(path):
+                job.fail("Recording was lost before transcription")
+                if logger:
+                    logger.warning(f"Cannot resume job {job.id}: its recording is missing")
+                continue
+            recording = RecordingSpool.from_file(path)
+        if logger:
+            logger.info(f"Resuming job {job.id} at stage {job.state}")
+        recording_state = new_recording_state()
+        recording_state['status'] = 'processing'
+        greenlets.append(gevent.spawn(process_audio, job.session_key, socketio, dream_db, recording_state,
+                                      recording, logger, job=job))
+    return greenlets
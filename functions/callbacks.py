@@ -0,0 +1,20 @@
+import hmac
+
+from functions.config_loader import get_config
+
+# Generation states after which Luma sends no further callbacks
+FINAL_STATES = ('completed', 'succeeded', 'failed', 'error')
+
+def callbacks_enabled():
+    """True if Luma can reach this server: LUMA_CALLBACK_URL and LUMA_CALLBACK_SECRET are both set."""
+    config = get_config()
+    return bool(config.get('LUMA_CALLBACK_URL')) and bool(config.get('LUMA_CALLBACK_SECRET'))
+
+def callback_url():
+    """URL Luma posts generation updates to, carrying the shared secret."""
+    config = get_config()
+    return f"{config['LUMA_CALLBACK_URL'].rstrip('/')}/api/luma_callback/{config['LUMA_CALLBACK_SECRET']}"
+
+def valid_secret(secret):
+    expected = get_config().get('LUMA_CALLBACK_SECRET') or ''
+    return bool(expected) and hmac.compare_digest(str(secret), str(expected))
@@ -18,6 +18,7 @@ class DreamData(BaseModel):
     video_filename: str
     thumb_filename: Optional[str] = None
     status: Optional[str] = 'completed'
+    audio_hash: Optional[str] = None
 
 class DreamDB:
     def __init__(self, db_path=None):
@@ -45,9 +46,66 @@ class DreamDB:
                     video_filename TEXT NOT NULL,
                     thumb_filename TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    status TEXT
+                    status TEXT,
+                    audio_hash TEXT
                 )
             ''')
+            # Databases created before audio hashing lack the audio_hash column
+            cursor.execute("PRAGMA table_info(dreams)")
+            if 'audio_hash' not in {row[1] for row in cursor.fetchall()}:
+                cursor.execute('ALTER TABLE dreams ADD COLUMN audio_hash TEXT')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_dreams_audio_hash ON dreams (audio_hash)')
+            # Whisper results by recording content, so identical audio is only transcribed once
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS transcriptions (
+                    audio_hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (audio_hash, model)
+                )
+            ''')
+            # Dream generation jobs, with the outputs of each finished stage stored as JSON
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_key TEXT,
+                    state TEXT NOT NULL,
+                    data TEXT NOT NULL DEFAULT '{}',
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # How long each pipeline stage took, per job and (once saved) per dream
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS stage_timings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id INTEGER,
+                    dream_id INTEGER,
+                    stage TEXT NOT NULL,
+                    seconds REAL NOT NULL,
+                    ok INTEGER NOT NULL DEFAULT 1,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_stage_timings_job ON stage_timings (job_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_stage_timings_dream ON stage_timings (dream_id)')
+            # How long Luma took to render each generation, to time polling (see functions.polling)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS generation_times (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    model TEXT NOT NULL,
+                    duration TEXT NOT NULL,
+                    resolution TEXT NOT NULL,
+                    extend INTEGER NOT NULL DEFAULT 0,
+                    seconds REAL NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_generation_times_key ON generation_times (model, duration, resolution, extend)'
+            )
             conn.commit()
             # If the table did not exist before, initialize sample dreams
             if not table_exists:
@@ -118,15 +176,16 @@ class DreamDB:
             cursor.execute('''
                 INSERT INTO dreams (
                     user_prompt, generated_prompt, audio_filename, video_filename,
-                    thumb_filename, status
-                ) VALUES (?, ?, ?, ?, ?, ?)
+                    thumb_filename, status, audio_hash
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
             ''', (
                 dream_data['user_prompt'],
                 dream_data['generated_prompt'],
                 dream_data['audio_filename'],
                 dream_data['video_filename'],
                 dream_data.get('thumb_filename'),
-                dream_data.get('status', 'completed')
+                dream_data.get('status', 'completed'),
+                dream_data.get('audio_hash')
             ))
             conn.commit()
             return cursor.lastrowid
@@ -150,6 +209,129 @@ class DreamDB:
             cursor.execute('SELECT * FROM dreams ORDER BY created_at DESC')
             return [self._row_to_dict(row) for row in cursor.fetchall()]
     
+    def find_dreams_by_audio_hash(self, audio_hash):
+        """Get all dreams recorded from audio with the given content hash."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM dreams WHERE audio_hash = ? ORDER BY created_at', (audio_hash,))
+            return [self._row_to_dict(row) for row in cursor.fetchall()]
+
+    def get_cached_transcription(self, audio_hash, model):
+        """Get the cached transcription of a recording for a Whisper model, or None."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT text FROM transcriptions WHERE audio_hash = ? AND model = ?', (audio_hash, model))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    def save_transcription(self, audio_hash, model, text):
+        """Cache the transcription of a recording for a Whisper model."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO transcriptions (audio_hash, model, text) VALUES (?, ?, ?)
+            ''', (audio_hash, model, text))
+            conn.commit()
+
+    def create_job(self, session_key=None):
+        """Insert a new queued job and return its ID."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO jobs (session_key, state, data) VALUES (?, 'queued', '{}')", (session_key,)
+            )
+            conn.commit()
+            return cursor.lastrowid
+
+    def update_job(self, job_id, state, data, error=None):
+        """Store a job's state and checkpointed stage outputs."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE jobs SET state = ?, data = ?, error = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+            ''', (state, json.dumps(data), error, job_id))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def get_job(self, job_id):
+        """Get a single job by ID."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
+            row = cursor.fetchone()
+            return self._job_row_to_dict(row) if row else None
+
+    def get_unfinished_jobs(self):
+        """Get all jobs that are neither done nor failed, oldest first."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM jobs WHERE state NOT IN ('done', 'failed') ORDER BY id")
+            return [self._job_row_to_dict(row) for row in cursor.fetchall()]
+
+    def _job_row_to_dict(self, row):
+        """Convert a jobs row to a dictionary with its data decoded."""
+        job = dict(row)
+        job['data'] = json.loads(job['data'] or '{}')
+        return job
+
+    def save_stage_timing(self, job_id, stage, seconds, ok=True):
+        """Record how long a pipeline stage of a job took."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT INTO stage_timings (job_id, stage, seconds, ok) VALUES (?, ?, ?, ?)',
+                (job_id, stage, seconds, int(ok))
+            )
+            conn.commit()
+
+    def link_stage_timings(self, job_id, dream_id):
+        """Attach a job's stage timings to the dream it produced."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE stage_timings SET dream_id = ? WHERE job_id = ?', (dream_id, job_id))
+            conn.commit()
+
+    def get_stage_timings(self, dream_id):
+        """Get the stage timings of a dream in the order they were recorded."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT stage, seconds, ok, created_at FROM stage_timings WHERE dream_id = ? ORDER BY id', (dream_id,)
+            )
+            return [self._row_to_dict(row) for row in cursor.fetchall()]
+
+    def get_stage_durations(self, limit=10000):
+        """Get (stage, seconds) pairs of the most recent successful stages."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT stage, seconds FROM stage_timings WHERE ok = 1 ORDER BY id DESC LIMIT ?', (limit,))
+            return cursor.fetchall()
+
+    def save_generation_time(self, model, duration, resolution, extend, seconds):
+        """Record how long a Luma generation with these settings took to render."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT INTO generation_times (model, duration, resolution, extend, seconds) VALUES (?, ?, ?, ?, ?)',
+                (str(model), str(duration), str(resolution), int(extend), seconds)
+            )
+            conn.commit()
+
+    def get_generation_times(self, model, duration, resolution, extend, limit=50):
+        """Get the render times of the most recent Luma generations with these settings, newest first."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT seconds FROM generation_times WHERE model = ? AND duration = ? AND resolution = ? AND extend = ? '
+                'ORDER BY id DESC LIMIT ?',
+                (str(model), str(duration), str(resolution), int(extend), limit)
+            )
+            return [row[0] for row in cursor.fetchall()]
+
     def update_dream(self, dream_id, updates):
         """Update an existing dream."""
         if not updates:
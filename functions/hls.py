@@ -0,0 +1,122 @@
+import os
+import time
+import shutil
+import ffmpeg
+import gevent
+
+from functions.config_loader import get_config
+from functions.postprocess import executor
+from functions.scheduler import scheduler, get_job_context, set_job_context
+
+MASTER_PLAYLIST = 'master.m3u8'
+
+def hls_enabled():
+    return str(get_config().get('HLS_ENABLED', False)).lower() in ('1', 'true', 'yes')
+
+def renditions():
+    """[(height, bitrate)] from HLS_RENDITIONS, e.g. '720:2500k,360:800k', tallest first."""
+    parsed = []
+    for item in str(get_config().get('HLS_RENDITIONS', '720:2500k,360:800k')).split(','):
+        height, _, bitrate = item.strip().partition(':')
+        if not height or not bitrate:
+            raise ValueError(f"Invalid HLS rendition '{item}', expected <height>:<bitrate>")
+        parsed.append((int(height), bitrate.strip()))
+    return sorted(parsed, reverse=True)
+
+def bits_per_second(bitrate):
+    """'2500k' -> 2500000, as the BANDWIDTH of a master playlist entry."""
+    multiplier = {'k': 1000, 'm': 1000000}.get(bitrate[-1].lower(), 1)
+    return int(float(bitrate.rstrip('kKmM')) * multiplier)
+
+def hls_dir(video_filename):
+    """Directory holding the renditions of a video in HLS_DIR."""
+    return os.path.join(get_config().get('HLS_DIR', 'media/hls'), os.path.splitext(video_filename)[0])
+
+def playlist_path(video_filename):
+    """Master playlist of a packaged video, or None if it hasn't been packaged."""
+    path = os.path.join(hls_dir(video_filename), MASTER_PLAYLIST)
+    return path if os.path.exists(path) else None
+
+def playlist_url(video_filename):
+    """URL of a video's master playlist, or None if it hasn't been packaged."""
+    if not playlist_path(video_filename):
+        return None
+    return f"/media/hls/{os.path.splitext(video_filename)[0]}/{MASTER_PLAYLIST}"
+
+def remove_hls(video_filename):
+    shutil.rmtree(hls_dir(video_filename), ignore_errors=True)
+
+def package_hls(video_path, logger=None):
+    """Encode a processed video into HLS_RENDITIONS with a master playlist; returns the playlist path.
+
+    All renditions come from one decode, each scaled to its height (never
+    above the source's) with keyframes every HLS_SEGMENT_SECONDS, so a
+    player can switch between renditions at any segment boundary.
+    """
+    video_filename = os.path.basename(video_path)
+    final_dir = hls_dir(video_filename)
+    work_dir = f"{final_dir}.tmp"
+    shutil.rmtree(work_dir, ignore_errors=True)
+    info = next(s for s in ffmpeg.probe(video_path)['streams'] if s['codec_type'] == 'video')
+    width, height = int(info['width']), int(info['height'])
+    num, den = info.get('avg_frame_rate', '24/1').split('/')
+    fps = int(num) / int(den) if int(den) and int(num) else 24
+    segment = float(get_config().get('HLS_SEGMENT_SECONDS', 2))
+    targets = [(h, bitrate) for h, bitrate in renditions() if h <= height] or [(height, renditions()[-1][1])]
+    source = ffmpeg.input(video_path).video
+    branches = source.split() if len(targets) > 1 else None
+    outputs, entries = [], []
+    for index, (target_height, bitrate) in enumerate(targets):
+        name = f"{target_height}p"
+        os.makedirs(os.path.join(work_dir, name), exist_ok=True)
+        stream = branches[index] if branches is not None else source
+        stream = stream.filter('scale', -2, target_height)
+        outputs.append(ffmpeg.output(
+            stream, os.path.join(work_dir, name, 'index.m3u8'),
+            vcodec='libx264', preset='veryfast', pix_fmt='yuv420p',
+            g=max(1, round(fps * segment)), keyint_min=max(1, round(fps * segment)), sc_threshold=0,
+            format='hls', hls_time=segment, hls_playlist_type='vod',
+            hls_segment_filename=os.path.join(work_dir, name, 'segment_%03d.ts'),
+            **{'b:v': bitrate, 'maxrate': bitrate, 'bufsize': f"{bits_per_second(bitrate) * 2 // 1000}k"},
+        ))
+        scaled_width = round(width * target_height / height / 2) * 2
+        entries.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bits_per_second(bitrate)},RESOLUTION={scaled_width}x{target_height}\n"
+                       f"{name}/index.m3u8\n")
+    try:
+        executor.run(ffmpeg.merge_outputs(*outputs), 'package_hls', overwrite_output=True, capture_stderr=True)
+        with open(os.path.join(work_dir, MASTER_PLAYLIST), 'w') as f:
+            f.write('#EXTM3U\n#EXT-X-VERSION:3\n' + ''.join(entries))
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(work_dir, final_dir)
+    except Exception as e:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        if logger:
+            stderr = getattr(e, 'stderr', None)
+            logger.error(f"Error packaging HLS: {stderr.decode(errors='replace') if stderr else str(e)}")
+        raise
+    if logger:
+        logger.info(f"Packaged {len(targets)} HLS renditions of {video_filename}")
+    return os.path.join(final_dir, MASTER_PLAYLIST)
+
+def package_in_background(video_filename, logger=None):
+    """Package a finished video for HLS in a greenlet, after the dream is already playable as MP4.
+
+    Waits for the ffmpeg slot like any other post-processing; a failure
+    only means the video keeps being served as MP4.
+    """
+    owner, job_id = get_job_context()
+    video_path = os.path.join(get_config()['VIDEOS_DIR'], video_filename)
+
+    def run():
+        set_job_context(owner, job_id)
+        started = time.perf_counter()
+        try:
+            with scheduler.slot('ffmpeg'):
+                package_hls(video_path, logger)
+            if logger:
+                logger.info(f"HLS packaging of {video_filename} took {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            if logger:
+                logger.warning(f"Could not package {video_filename} for HLS: {str(e)}")
+
+    return gevent.spawn(run)
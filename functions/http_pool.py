@@ -0,0 +1,94 @@
+import importlib.util
+
+import httpx
+import requests
+
+from requests.adapters import HTTPAdapter
+from functions.config_loader import get_config
+
+# httpx only negotiates HTTP/2 when the optional h2 package is installed
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+# Requests and new connections per host made through httpx clients (requests' pools keep their own counts)
+_httpx_counts = {}
+
+_session = None
+
+def timeouts():
+    """(connect, read) timeouts in seconds from HTTP_CONNECT_TIMEOUT and HTTP_READ_TIMEOUT."""
+    config = get_config()
+    return float(config.get('HTTP_CONNECT_TIMEOUT', 5)), float(config.get('HTTP_READ_TIMEOUT', 120))
+
+def pool_size():
+    return int(get_config().get('HTTP_POOL_SIZE', 10))
+
+def session():
+    """The process-wide requests.Session; connections to each host are kept alive and reused."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size(), pool_maxsize=pool_size())
+        _session.mount('https://', adapter)
+        _session.mount('http://', adapter)
+    return _session
+
+def request(method, url, **kwargs):
+    """Send a request through the shared session, with the configured timeouts unless `timeout` is given."""
+    kwargs.setdefault('timeout', timeouts())
+    return session().request(method, url, **kwargs)
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
+
+def _count_request(request):
+    host = f"{request.url.scheme}://{request.url.netloc.decode('ascii')}"
+    counts = _httpx_counts.setdefault(host, {'requests': 0, 'connections': 0})
+    counts['requests'] += 1
+
+    def trace(event, info):
+        if event == 'connection.connect_tcp.complete':
+            counts['connections'] += 1
+
+    request.extensions['trace'] = trace
+
+def openai_http_client():
+    """httpx client for the OpenAI SDK: pooled keep-alive connections, HTTP/2 if HTTP2 is set and h2 is installed.
+
+    The SDK adopts the client's timeout, replacing its 10 minute default.
+    """
+    connect, read = timeouts()
+    http2 = HTTP2_AVAILABLE and str(get_config().get('HTTP2', True)).lower() in ('1', 'true', 'yes')
+    return httpx.Client(
+        http2=http2,
+        timeout=httpx.Timeout(read, connect=connect),
+        limits=httpx.Limits(max_keepalive_connections=pool_size()),
+        follow_redirects=True,
+        event_hooks={'request': [_count_request]},
+    )
+
+def connection_stats():
+    """Requests, new connections and reused connections per host since startup."""
+    totals = {}
+    for host, counts in _httpx_counts.items():
+        totals[host] = dict(counts)
+    if _session is not None:
+        for adapter in set(_session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                host = f"{key.key_scheme}://{key.key_host}:{key.key_port}"
+                counts = totals.setdefault(host, {'requests': 0, 'connections': 0})
+                counts['requests'] += pool.num_requests
+                counts['connections'] += pool.num_connections
+    for counts in totals.values():
+        counts['reused'] = max(0, counts['requests'] - counts['connections'])
+        counts['reuse_ratio'] = round(counts['reused'] / counts['requests'], 3) if counts['requests'] else 0.0
+    return totals
@@ -0,0 +1,68 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages in order; a job's state is the stage it is in (or about to start)
+JOB_STATES = [
+    'queued', 'transcribing', 'prompting', 'generating', 'downloading', 'post-processing', 'done', 'failed'
+]
+
+# States a job can't leave
+FINISHED_STATES = ('done', 'failed')
+
+class PipelineJob:
+    """A dream generation job whose stage outputs are checkpointed to the jobs table.
+
+    `data` holds the outputs of the stages completed so far (transcription,
+    video prompt, Luma generation id, ...). Stages skip work whose output is
+    already in `data`, so a job loaded after a restart carries on where it
+    stopped instead of starting over. Without a `dream_db` the job is only
+    kept in memory.
+    """
+
+    def __init__(self, dream_db=None, job_id=None, session_key=None, state='queued', data=None):
+        self.dream_db = dream_db
+        self.id = job_id
+        self.session_key = session_key
+        self.state = state
+        self.data = dict(data or {})
+        self.error = None
+
+    @classmethod
+    def create(cls, dream_db, session_key=None):
+        """Insert a new queued job and return it."""
+        job = cls(dream_db, session_key=session_key)
+        job.id = dream_db.create_job(session_key)
+        return job
+
+    @classmethod
+    def from_row(cls, dream_db, row):
+        """Build a job from a row returned by DreamDB.get_job()/get_unfinished_jobs()."""
+        return cls(dream_db, row['id'], row['session_key'], row['state'], row['data'])
+
+    @property
+    def finished(self):
+        return self.state in FINISHED_STATES
+
+    def checkpoint(self, state, **outputs):
+        """Record stage outputs and move the job to `state`."""
+        if state not in JOB_STATES:
+            raise ValueError(f"Unknown job state: {state}")
+        self.data.update(outputs)
+        self.state = state
+        self._save()
+
+    def fail(self, error):
+        """Mark the job as failed; it won't be resumed."""
+        self.state = 'failed'
+        self.error = str(error)
+        self._save()
+
+    def _save(self):
+        if self.dream_db is None:
+            return
+        try:
+            self.dream_db.update_job(self.id, self.state, self.data, self.error)
+        except Exception as e:
+            # A lost checkpoint only costs repeated work on resume; don't fail the dream
+            logger.error(f"Could not checkpoint job {self.id}: {str(e)}")
@@ -0,0 +1,105 @@
+import random
+import logging
+
+from collections import deque
+from functions.config_loader import get_config
+from functions.timing import percentile
+
+logger = logging.getLogger(__name__)
+
+# Render times needed before polling follows the history instead of LUMA_POLL_INTERVAL
+MIN_SAMPLES = 3
+
+# Percentiles of past render times bounding the window polled densely
+WINDOW_PERCENTILES = (5, 95)
+
+# Status checks spread across that window
+WINDOW_POLLS = 8
+
+def generation_key(extend=False):
+    """Settings a generation's render time depends on: (model, duration, resolution, extend)."""
+    config = get_config()
+    return (str(config['LUMA_MODEL']), str(config['LUMA_DURATION']), str(config['LUMA_RESOLUTION']), bool(extend))
+
+class GenerationTimes:
+    """Recent Luma render times per generation key, persisted to DreamDB when attached."""
+
+    def __init__(self, history=50):
+        self.history = history
+        self.samples = {}
+        self.dream_db = None
+
+    def attach(self, dream_db):
+        """Load and save render times through `dream_db`."""
+        self.dream_db = dream_db
+        self.samples = {}
+
+    def _samples(self, key):
+        if key not in self.samples:
+            loaded = []
+            if self.dream_db is not None:
+                try:
+                    loaded = self.dream_db.get_generation_times(*key, limit=self.history)
+                except Exception as e:
+                    logger.warning(f"Could not load generation times: {str(e)}")
+            self.samples[key] = deque(reversed(loaded), maxlen=self.history)
+        return self.samples[key]
+
+    def record(self, key, seconds):
+        """Add the render time of a finished generation."""
+        self._samples(key).append(seconds)
+        if self.dream_db is not None:
+            try:
+                self.dream_db.save_generation_time(*key, seconds)
+            except Exception as e:
+                logger.warning(f"Could not save generation time: {str(e)}")
+
+    def window(self, key):
+        """(early, late) render time of generations like `key`, or None without enough history."""
+        samples = sorted(self._samples(key))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return tuple(percentile(samples, pct) for pct in WINDOW_PERCENTILES)
+
+generation_times = GenerationTimes()
+
+def next_poll_delay(elapsed, window):
+    """Seconds to wait before the next status check of a generation `elapsed` seconds old.
+
+    Without a window this is LUMA_POLL_INTERVAL. Before the window opens the
+    wait runs to its start (at most LUMA_POLL_MAX_INTERVAL), inside it
+    WINDOW_POLLS checks are spread evenly, and an overdue generation is
+    checked every LUMA_POLL_INTERVAL. Waits inside and after the window are
+    never longer than LUMA_POLL_INTERVAL, nor shorter than LUMA_POLL_MIN_INTERVAL.
+    """
+    config = get_config()
+    interval = float(config['LUMA_POLL_INTERVAL'])
+    if window is None or str(config.get('LUMA_POLL_ADAPTIVE', True)).lower() not in ('1', 'true', 'yes'):
+        return interval
+    min_interval = min(float(config.get('LUMA_POLL_MIN_INTERVAL', 1)), interval)
+    max_interval = float(config.get('LUMA_POLL_MAX_INTERVAL', 30))
+    early, late = window
+    if elapsed < early:
+        delay = early - elapsed
+    elif elapsed <= late:
+        delay = min((late - early) / WINDOW_POLLS, interval)
+    else:
+        delay = interval
+    return min(max(delay, min_interval), max_interval)
+
+def backoff_delay(failures, retry_after=None):
+    """Wait after `failures` failed status checks in a row: exponential with jitter, or the server's Retry-After."""
+    config = get_config()
+    cap = float(config.get('LUMA_POLL_BACKOFF_MAX', 60))
+    if retry_after is not None:
+        return min(retry_after, cap)
+    delay = min(float(config['LUMA_POLL_INTERVAL']) * 2 ** (failures - 1), cap)
+    # Half fixed, half random, so jobs that failed together don't retry together
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def retry_after_seconds(response):
+    """Seconds from a response's Retry-After header, if it has one in seconds."""
+    try:
+        return max(0.0, float(response.headers.get('Retry-After')))
+    except (TypeError, ValueError, AttributeError):
+        return None
@@ -0,0 +1,101 @@
+import re
+import time
+import shutil
+import ffmpeg
+
+from collections import deque
+from contextlib import contextmanager
+from functions.config_loader import get_config
+from functions.scheduler import get_job_context
+
+# CPU seconds and peak memory ffmpeg prints when run with -benchmark
+BENCH_CPU = re.compile(r'bench: utime=([\d.]+)s stime=([\d.]+)s')
+BENCH_RSS = re.compile(r'bench: maxrss=(\d+)')
+
+def ffmpeg_usage(stderr):
+    """(CPU seconds, peak RSS in kB) from ffmpeg's -benchmark output, None for any it didn't report."""
+    text = stderr.decode(errors='replace') if isinstance(stderr, bytes) else str(stderr or '')
+    cpu = BENCH_CPU.findall(text)
+    rss = BENCH_RSS.findall(text)
+    return (round(float(cpu[-1][0]) + float(cpu[-1][1]), 3) if cpu else None), (int(rss[-1]) if rss else None)
+
+def thread_cap():
+    """FFMPEG_THREADS, or 0 to let ffmpeg pick."""
+    return int(get_config().get('FFMPEG_THREADS', 0))
+
+class PostProcessExecutor:
+    """Runs the ffmpeg post-processing jobs at low priority and keeps their CPU usage.
+
+    Jobs queue for the pipeline's 'ffmpeg' slot (PIPELINE_FFMPEG_CONCURRENCY)
+    before they get here. Each ffmpeg process runs under `nice -n FFMPEG_NICE`,
+    in the idle IO class (FFMPEG_IONICE_IDLE), pinned to FFMPEG_CPUS if set and
+    with at most FFMPEG_THREADS threads, so an encode leaves the kiosk UI,
+    Socket.IO and GPIO handling room to run.
+    """
+
+    def __init__(self, history=50):
+        self.running = []
+        self.finished = deque(maxlen=history)
+        self.total_cpu = 0.0
+
+    def command(self):
+        """ffmpeg command line prefix: the priority wrappers, then ffmpeg with -benchmark and the thread cap."""
+        config = get_config()
+        cmd = []
+        niceness = int(config.get('FFMPEG_NICE', 10))
+        if niceness and shutil.which('nice'):
+            cmd += ['nice', '-n', str(niceness)]
+        if config.get('FFMPEG_IONICE_IDLE', True) and shutil.which('ionice'):
+            cmd += ['ionice', '-c', '3']
+        cpus = str(config.get('FFMPEG_CPUS') or '').strip()
+        if cpus and shutil.which('taskset'):
+            cmd += ['taskset', '-c', cpus]
+        cmd += ['ffmpeg', '-benchmark']
+        threads = thread_cap()
+        if threads > 0:
+            # Decoding and filtering threads; the encoder's are capped in the output options
+            cmd += ['-threads', str(threads), '-filter_threads', str(threads)]
+        return cmd
+
+    @contextmanager
+    def job(self, name):
+        """Track an ffmpeg job while the block runs; the block records its stderr with job['stderr']."""
+        owner, job_id = get_job_context()
+        job = {'name': name, 'job_id': job_id, 'started': time.time(), 'stderr': None}
+        start = time.perf_counter()
+        self.running.append(job)
+        try:
+            yield job
+            job['ok'] = True
+        except BaseException:
+            job['ok'] = False
+            raise
+        finally:
+            self.running.remove(job)
+            job['wall_seconds'] = round(time.perf_counter() - start, 3)
+            job['cpu_seconds'], job['max_rss_kb'] = ffmpeg_usage(job.pop('stderr'))
+            self.total_cpu += job['cpu_seconds'] or 0.0
+            self.finished.append(job)
+
+    def run(self, stream, name, **kwargs):
+        """ffmpeg.run() through the executor; returns (stdout, stderr) like ffmpeg.run."""
+        with self.job(name) as job:
+            try:
+                out, err = ffmpeg.run(stream, cmd=self.command(), **kwargs) or (None, None)
+            except ffmpeg.Error as e:
+                job['stderr'] = e.stderr
+                raise
+            job['stderr'] = err
+            return out, err
+
+    def snapshot(self, queue=None):
+        """Jobs waiting for the ffmpeg slot in `queue` (a StageQueue), running and recently finished."""
+        now = time.time()
+        return {
+            'queue_depth': len(queue.waiting) if queue is not None else 0,
+            'running': [{'name': j['name'], 'job_id': j['job_id'], 'running': round(now - j['started'], 3)} for j in self.running],
+            'recent': list(self.finished),
+            'total_cpu_seconds': round(self.total_cpu, 3),
+        }
+
+executor = PostProcessExecutor()
@@ -0,0 +1,248 @@
+import os
+import mmap
+import hashlib
+import time
+import gevent
+
+from datetime import datetime
+from functions.config_loader import get_config
+
+class RecordingSpool:
+    """Append-only spool file that holds an in-progress recording on disk.
+
+    Incoming chunks are collected in a small in-memory buffer that is flushed to
+    the spool file whenever it reaches `buffer_size` bytes, so memory use stays
+    constant no matter how long the recording runs. The recording is capped at
+    `max_bytes` and `max_seconds` (0 disables either cap).
+    """
+
+    def __init__(self, directory=None, filename=None, buffer_size=None, preallocate=None,
+                 max_bytes=None, max_seconds=None, logger=None):
+        config = get_config()
+        if directory is None:
+            directory = config['RECORDINGS_DIR']
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            filename = f"spool_{timestamp}.webm"
+        if buffer_size is None:
+            buffer_size = config.get('RECORDING_SPOOL_BUFFER_BYTES', 65536)
+        if preallocate is None:
+            preallocate = config.get('RECORDING_SPOOL_PREALLOCATE_BYTES', 4194304)
+        if max_bytes is None:
+            max_bytes = config.get('RECORDING_MAX_BYTES', 20971520)
+        if max_seconds is None:
+            max_seconds = config.get('RECORDING_MAX_SECONDS', 300)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, filename)
+        self.buffer_size = int(buffer_size)
+        self.max_bytes = int(max_bytes)
+        self.max_seconds = float(max_seconds)
+        self.logger = logger
+        self.size = 0
+        self.started_at = time.monotonic()
+        self.dropped_chunks = 0
+        self.truncated_chunks = 0
+        self.dropped_bytes = 0
+        self.closed = False
+        self.persisted = False
+        # Hashed as chunks arrive so the content hash is ready when recording stops
+        self._sha256 = hashlib.sha256()
+        self._buffer = bytearray()
+        # Unbuffered: the spool does its own buffering
+        self._file = open(self.path, 'wb', buffering=0)
+        self._preallocate(int(preallocate))
+
+    @classmethod
+    def from_file(cls, path):
+        """Wrap a finished recording on disk, e.g. one left behind by an interrupted job."""
+        spool = cls.__new__(cls)
+        spool.path = path
+        spool.size = os.path.getsize(path)
+        spool.closed = True
+        spool.persisted = False
+        spool._sha256 = None
+        return spool
+
+    def _preallocate(self, size):
+        """Reserve disk blocks up front so appends don't fragment the SD card."""
+        if size <= 0 or not hasattr(os, 'posix_fallocate'):
+            return
+        try:
+            os.posix_fallocate(self._file.fileno(), 0, size)
+        except OSError as e:
+            if self.logger:
+                self.logger.warning(f"Could not preallocate recording spool {self.path}: {str(e)}")
+
+    @property
+    def elapsed(self):
+        """Seconds since the recording started."""
+        return time.monotonic() - self.started_at
+
+    @property
+    def limit_reason(self):
+        """'max_bytes' or 'max_seconds' once a cap has been reached, otherwise None."""
+        if self.max_bytes and self.size >= self.max_bytes:
+            return 'max_bytes'
+        if self.max_seconds and self.elapsed >= self.max_seconds:
+            return 'max_seconds'
+        return None
+
+    def write(self, chunk):
+        """Append a chunk to the recording and return the number of bytes kept.
+
+        Chunks arriving after a cap has been reached are dropped, and a chunk
+        that would cross `max_bytes` is truncated to fit.
+        """
+        if self.closed:
+            raise ValueError("Cannot write to a closed recording spool")
+        if self.limit_reason:
+            self.dropped_chunks += 1
+            self.dropped_bytes += len(chunk)
+            return 0
+        if self.max_bytes and self.size + len(chunk) > self.max_bytes:
+            kept = self.max_bytes - self.size
+            self.truncated_chunks += 1
+            self.dropped_bytes += len(chunk) - kept
+            chunk = chunk[:kept]
+        self._buffer += chunk
+        self._sha256.update(chunk)
+        self.size += len(chunk)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+        return len(chunk)
+
+    def hexdigest(self):
+        """SHA-256 of the recorded audio."""
+        return self._sha256.hexdigest()
+
+    def flush(self):
+        """Write the in-memory buffer to the spool file."""
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._buffer.clear()
+
+    def snapshot(self):
+        """Return the audio recorded so far, without stopping the recording."""
+        if not self.closed:
+            self.flush()
+        with open(self.path, 'rb') as f:
+            return f.read(self.size)
+
+    def close(self):
+        """Flush remaining data, trim the preallocated tail and return the spool path."""
+        if not self.closed:
+            self.flush()
+            self._file.truncate(self.size)
+            self._file.close()
+            self.closed = True
+        return self.path
+
+    def mmap(self):
+        """Close the spool and return a read-only memory map of the recording.
+
+        The mapping is backed by the spool file, so the kernel can page it in and
+        out instead of holding a second full copy of the recording on the heap.
+        """
+        self.close()
+        if self.size == 0:
+            return b''
+        with open(self.path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def move(self, filepath):
+        """Close the spool and move it to `filepath`; discard() still deletes it."""
+        self.close()
+        os.replace(self.path, filepath)
+        self.path = filepath
+        return filepath
+
+    def persist(self, filepath):
+        """Close the spool and move it to `filepath`, keeping it past discard()."""
+        self.move(filepath)
+        self.persisted = True
+        return filepath
+
+    def discard(self):
+        """Close and delete the spool file, unless it has been persisted."""
+        self.close()
+        if self.persisted:
+            return
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+def new_recording_state():
+    """Return the status dict for a fresh recording, as sent in `state_update` events."""
+    return {
+        'is_recording': False,
+        'status': 'ready',  # ready, recording, processing, generating, complete
+        'transcription': '',
+        'video_prompt': '',
+        'video_url': None
+    }
+
+class RecordingSession:
+    """One client's recording: its status, spool, transcoder and processing task.
+
+    Sessions are keyed by the client's device id, or its Socket.IO sid if it
+    didn't send one, so several clients can record and be processed at the same
+    time. Every recording gets its own state dict, so a processing task keeps
+    updating the recording it was started for even after a new one begins.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.state = new_recording_state()
+        self.spool = None
+        self.transcoder = None
+        self.watchdog = None
+        self.speculation = None
+        self.task = None
+
+    @property
+    def is_recording(self):
+        return self.state['is_recording']
+
+    def start(self, spool, transcoder=None):
+        """Begin a new recording into `spool`."""
+        self.state = new_recording_state()
+        self.state['is_recording'] = True
+        self.state['status'] = 'recording'
+        self.spool = spool
+        self.transcoder = transcoder
+
+    def stop(self):
+        """Mark the recording as finished and cancel its watchdog."""
+        self.state['is_recording'] = False
+        self.state['status'] = 'processing'
+        if self.watchdog is not None and self.watchdog is not gevent.getcurrent():
+            self.watchdog.kill(block=False)
+        self.watchdog = None
+
+    @property
+    def is_busy(self):
+        """True while recording or while the last recording is still being processed."""
+        return self.is_recording or (self.task is not None and not self.task.dead)
+
+def read_recording(recording):
+    """Return the recorded audio as a bytes-like object.
+
+    A RecordingSpool is memory-mapped; a plain list of chunks (as used by older
+    callers and tests) is joined.
+    """
+    if isinstance(recording, RecordingSpool):
+        return recording.mmap()
+    return b''.join(recording)
+
+def recording_hash(recording, audio_data=None):
+    """Return the SHA-256 hex digest of a recording's content.
+
+    A RecordingSpool has already hashed its chunks; anything else is hashed from
+    `audio_data`, or from its joined chunks.
+    """
+    if isinstance(recording, RecordingSpool) and recording._sha256 is not None:
+        return recording.hexdigest()
+    if audio_data is None:
+        audio_data = read_recording(recording)
+    return hashlib.sha256(audio_data).hexdigest()
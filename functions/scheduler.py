@@ -0,0 +1,151 @@
+import time
+import itertools
+
+from contextlib import contextmanager
+from gevent.event import Event
+from gevent.local import local
+from functions.config_loader import get_config
+
+# External stages and their default concurrency limits, overridden by PIPELINE_<STAGE>_CONCURRENCY
+STAGE_LIMITS = {
+    'whisper': 2,
+    'gpt': 2,
+    'luma_create': 2,
+    'luma_poll': 4,
+    'download': 2,
+    'ffmpeg': 1,
+}
+
+# Which job/session the current greenlet is working for
+_context = local()
+
+def set_job_context(owner=None, job_id=None):
+    """Tag the current greenlet's stage requests with the session and job they belong to."""
+    _context.owner = owner
+    _context.job_id = job_id
+
+def get_job_context():
+    """Return the (owner, job_id) set by set_job_context() for the current greenlet."""
+    return getattr(_context, 'owner', None), getattr(_context, 'job_id', None)
+
+class _Ticket:
+    def __init__(self, seq, owner, job_id):
+        self.seq = seq
+        self.owner = owner
+        self.job_id = job_id
+        self.queued_at = time.monotonic()
+        self.started_at = None
+        self.event = Event()
+
+    def describe(self, now):
+        info = {'owner': self.owner, 'job_id': self.job_id, 'waited': round((self.started_at or now) - self.queued_at, 3)}
+        if self.started_at is not None:
+            info['running'] = round(now - self.started_at, 3)
+        return info
+
+class StageQueue:
+    """Admits at most `limit` concurrent requests to one external stage.
+
+    Waiting requests are ordered fairly between owners (sessions): the owner
+    with the fewest requests running in this stage goes first, then the one
+    served least recently, then arrival order. A client that queues ten dreams
+    at once therefore doesn't make everyone else wait for all ten.
+    """
+
+    def __init__(self, name, default_limit):
+        self.name = name
+        self.default_limit = default_limit
+        self.active = []
+        self.waiting = []
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._seq = itertools.count()
+        self._served = itertools.count()
+        self._last_served = {}
+
+    @property
+    def limit(self):
+        """Current limit from the config (0 = unlimited), so it can be changed without a restart."""
+        return int(get_config().get(f"PIPELINE_{self.name.upper()}_CONCURRENCY", self.default_limit))
+
+    def _has_room(self):
+        limit = self.limit
+        return limit <= 0 or len(self.active) < limit
+
+    def _next(self):
+        running = {}
+        for ticket in self.active:
+            running[ticket.owner] = running.get(ticket.owner, 0) + 1
+        return min(self.waiting, key=lambda t: (running.get(t.owner, 0), self._last_served.get(t.owner, -1), t.seq))
+
+    def _grant(self):
+        while self.waiting and self._has_room():
+            ticket = self._next()
+            self.waiting.remove(ticket)
+            ticket.started_at = time.monotonic()
+            wait = ticket.started_at - ticket.queued_at
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._last_served[ticket.owner] = next(self._served)
+            self.active.append(ticket)
+            ticket.event.set()
+
+    def _release(self, ticket):
+        if ticket in self.active:
+            self.active.remove(ticket)
+            self.completed += 1
+        elif ticket in self.waiting:
+            self.waiting.remove(ticket)
+        self._grant()
+
+    @contextmanager
+    def slot(self, owner=None, job_id=None):
+        """Wait for a free slot in this stage and hold it for the duration of the block."""
+        ticket = _Ticket(next(self._seq), owner, job_id)
+        self.waiting.append(ticket)
+        self._grant()
+        try:
+            ticket.event.wait()
+            yield
+        finally:
+            self._release(ticket)
+
+    def snapshot(self):
+        now = time.monotonic()
+        started = self.completed + len(self.active)
+        return {
+            'limit': self.limit,
+            'active': [t.describe(now) for t in self.active],
+            'waiting': [t.describe(now) for t in sorted(self.waiting, key=lambda t: t.seq)],
+            'completed': self.completed,
+            'avg_wait': round(self.total_wait / started, 3) if started else 0.0,
+            'max_wait': round(self.max_wait, 3),
+        }
+
+class PipelineScheduler:
+    """Per-stage concurrency limits for the external calls a dream makes.
+
+    Jobs run as separate greenlets; each call to Whisper, GPT, Luma or ffmpeg
+    takes a slot in its stage first, so a burst of recordings queues up instead
+    of hitting rate limits or running several ffmpeg encodes on a Pi at once.
+    """
+
+    def __init__(self, limits=None):
+        self.stages = {name: StageQueue(name, limit) for name, limit in (limits or STAGE_LIMITS).items()}
+
+    @contextmanager
+    def slot(self, stage, owner=None, job_id=None):
+        """Hold a slot in `stage`; owner and job default to the current greenlet's job context."""
+        if stage not in self.stages:
+            raise ValueError(f"Unknown pipeline stage: {stage}")
+        if owner is None and job_id is None:
+            owner, job_id = get_job_context()
+        with self.stages[stage].slot(owner, job_id):
+            yield
+
+    def snapshot(self):
+        """Limits, running and waiting requests and wait times for every stage."""
+        return {name: queue.snapshot() for name, queue in self.stages.items()}
+
+scheduler = PipelineScheduler()
@@ -0,0 +1,195 @@
+import re
+import time
+import difflib
+import gevent
+
+from functions import audio
+from functions.config_loader import get_config
+from functions.http_pool import openai_http_client
+from functions.scheduler import scheduler, set_job_context
+from functions.video import create_generation, cancel_generation, extend_segments, split_prompts
+from openai import OpenAI
+
+_partial_clients = {}
+_warned_no_local_whisper = False
+
+def partial_whisper_client():
+    """Client for the Whisper server at SPECULATIVE_WHISPER_BASE_URL, or None if none is configured.
+
+    Partial transcriptions are never sent to OpenAI: each one re-uploads the
+    whole recording so far, which bills about N²/2 seconds of audio for an
+    N-second dream.
+    """
+    base_url = get_config().get('SPECULATIVE_WHISPER_BASE_URL') or ''
+    if not base_url:
+        return None
+    if base_url not in _partial_clients:
+        # Local Whisper-compatible servers accept any key
+        _partial_clients[base_url] = OpenAI(api_key=get_config().get('OPENAI_API_KEY') or 'local', base_url=base_url,
+                                           http_client=openai_http_client())
+    return _partial_clients[base_url]
+
+def transcript_words(text):
+    """Lower-cased words of a transcript, ignoring punctuation."""
+    return re.findall(r"[\w']+", (text or '').lower())
+
+def transcripts_match(a, b, ratio=0.9):
+    """True if two transcripts share at least `ratio` of their words, in order."""
+    words_a, words_b = transcript_words(a), transcript_words(b)
+    if not words_a or not words_b:
+        return False
+    return difflib.SequenceMatcher(None, words_a, words_b).ratio() >= ratio
+
+class SpeculativeGeneration:
+    """Starts the Luma generation while the user is still speaking.
+
+    Every SPECULATIVE_INTERVAL_SECONDS the audio recorded so far is
+    transcribed. Once the partial transcript has stayed the same for
+    SPECULATIVE_STABLE_SECONDS (the speaker has paused), a video prompt is
+    written for it and the Luma generation is created. When the recording is processed, resolve() adopts that
+    generation if the final transcript still matches the one it was started
+    from, and cancels it otherwise. A generation whose transcript changes
+    while recording continues is cancelled straight away, and at most
+    SPECULATIVE_MAX_GENERATIONS are started per recording.
+    """
+
+    def __init__(self, spool, owner=None, luma_extend=None, logger=None):
+        config = get_config()
+        if luma_extend is None:
+            luma_extend = str(config['LUMA_EXTEND']).lower() in ('1', 'true', 'yes')
+        self.spool = spool
+        self.owner = owner
+        self.luma_extend = luma_extend
+        self.logger = logger
+        self.interval = float(config.get('SPECULATIVE_INTERVAL_SECONDS', 1))
+        self.min_words = int(config.get('SPECULATIVE_MIN_WORDS', 3))
+        self.stable_seconds = float(config.get('SPECULATIVE_STABLE_SECONDS', 1.0))
+        self.match_ratio = float(config.get('SPECULATIVE_MATCH_RATIO', 0.9))
+        self.max_generations = int(config.get('SPECULATIVE_MAX_GENERATIONS', 2))
+        self.partial_transcript = None
+        self.unchanged_since = None
+        self.transcript = None
+        self.video_prompt = None
+        self.generation_id = None
+        self.generations = 0
+        self.cancelled = []
+        self.adopted = False
+        self.stopped = False
+        self.greenlet = None
+
+    def start(self):
+        """Start transcribing in the background; returns self.
+
+        Does nothing without a local Whisper server (see partial_whisper_client).
+        """
+        global _warned_no_local_whisper
+        if partial_whisper_client() is None:
+            if self.logger and not _warned_no_local_whisper:
+                self.logger.warning("SPECULATIVE_GENERATION needs SPECULATIVE_WHISPER_BASE_URL; not speculating")
+            _warned_no_local_whisper = True
+            return self
+        self.greenlet = gevent.spawn(self._run)
+        return self
+
+    def stop(self):
+        """Stop after the current step, e.g. when the recording ends.
+
+        A step that is already running still creates its generation: its
+        partial transcript is then close to the final one, so this overlaps
+        the GPT prompt and Luma create with the final transcription.
+        """
+        self.stopped = True
+
+    def finish(self, timeout=30):
+        """Stop and wait for a step in progress, so a generation being created isn't lost."""
+        self.stop()
+        if self.greenlet is not None and not self.greenlet.dead:
+            self.greenlet.join(timeout)
+            if not self.greenlet.dead:
+                self.greenlet.kill(block=False)
+
+    def _run(self):
+        set_job_context(self.owner)
+        while not self.stopped:
+            gevent.sleep(self.interval)
+            if self.stopped:
+                break
+            try:
+                self.step()
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning(f"Speculative generation step failed: {str(e)}")
+
+    def transcribe_partial(self):
+        """Transcribe the audio recorded so far."""
+        client = partial_whisper_client()
+        data = self.spool.snapshot()
+        if client is None or not data:
+            return ''
+        model = get_config().get('SPECULATIVE_WHISPER_MODEL') or get_config()['WHISPER_MODEL']
+        with scheduler.slot('whisper'):
+            return client.audio.transcriptions.create(model=model, file=('partial.webm', data)).text
+
+    def step(self):
+        """Transcribe the recording so far and start or cancel the speculative generation."""
+        taken = time.monotonic()
+        text = self.transcribe_partial()
+        if not transcript_words(text):
+            return
+        if self.generation_id and not transcripts_match(text, self.transcript, self.match_ratio):
+            if self.logger:
+                self.logger.info("Transcript changed after the speculative generation started, cancelling it")
+            self.cancel()
+        if self.partial_transcript is None or transcript_words(text) != transcript_words(self.partial_transcript):
+            self.partial_transcript = text
+            self.unchanged_since = taken
+        if self.generation_id or taken - self.unchanged_since < self.stable_seconds:
+            return
+        if len(transcript_words(text)) < self.min_words or self.generations >= self.max_generations:
+            return
+        video_prompt = audio.generate_video_prompt(text, luma_extend=self.luma_extend, logger=self.logger)
+        if not video_prompt:
+            return
+        initial_prompt = split_prompts(video_prompt, extend_segments(self.luma_extend))[0]
+        self.generation_id = create_generation(initial_prompt, logger=self.logger)
+        self.transcript = text
+        self.video_prompt = video_prompt
+        self.generations += 1
+        if self.logger:
+            self.logger.info(f"Started speculative generation {self.generation_id} from partial transcript: {text}")
+
+    def cancel(self):
+        """Cancel the speculative generation, if any."""
+        if self.generation_id:
+            cancel_generation(self.generation_id, self.logger)
+            self.cancelled.append(self.generation_id)
+        self.generation_id = None
+        self.transcript = None
+        self.video_prompt = None
+
+    def matches(self, transcription):
+        """True if there's a speculative generation started from this transcript."""
+        return self.generation_id is not None and transcripts_match(transcription, self.transcript, self.match_ratio)
+
+    def resolve(self, job, transcription):
+        """Adopt the speculative generation into `job` if it matches the final transcript, otherwise cancel it.
+
+        Returns True if it was adopted; the job then skips the GPT prompt and
+        Luma create stages.
+        """
+        self.finish()
+        if not self.matches(transcription):
+            self.cancel()
+            return False
+        job.checkpoint('generating', video_prompt=self.video_prompt, luma_extend=self.luma_extend,
+                       generation_id=self.generation_id)
+        self.adopted = True
+        if self.logger:
+            self.logger.info(f"Using speculative generation {self.generation_id}")
+        return True
+
+    def discard(self):
+        """Stop and cancel the speculative generation unless a job adopted it."""
+        self.finish()
+        if not self.adopted:
+            self.cancel()
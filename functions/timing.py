@@ -0,0 +1,70 @@
+import time
+
+from contextlib import contextmanager
+from gevent.local import local
+
+# Stages timed for every dream, in pipeline order; 'total' runs from the end of the recording to video_ready
+STAGES = (
+    'wav_save', 'whisper', 'gpt', 'luma_create', 'luma_poll', 'luma_wait', 'download', 'stream_video',
+    'process_video', 'process_thumbnail', 'process_preview', 'db_save', 'total',
+)
+
+# Upper bounds (seconds) of the histogram buckets reported by summarize_durations()
+HISTOGRAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+PERCENTILES = (50, 95, 99)
+
+# Where the current greenlet reports its stage timings
+_context = local()
+
+def set_stage_listener(listener):
+    """Send the current greenlet's stage timings to `listener(stage, seconds, ok)`; None stops reporting."""
+    _context.listener = listener
+
+def get_stage_listener():
+    """Return the current greenlet's stage listener, or None."""
+    return getattr(_context, 'listener', None)
+
+@contextmanager
+def timed_stage(stage):
+    """Time the block and report it to the current greenlet's stage listener, if any.
+
+    Stages that wait for a pipeline slot are timed from before the wait, so
+    queueing shows up in the stage it delays.
+    """
+    start = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        listener = get_stage_listener()
+        if listener is not None:
+            listener(stage, time.perf_counter() - start, ok)
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, int(-(-pct * len(sorted_values) // 100)) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+def summarize_durations(durations):
+    """Percentiles and a histogram per stage from (stage, seconds) pairs."""
+    by_stage = {}
+    for stage, seconds in durations:
+        by_stage.setdefault(stage, []).append(seconds)
+    summary = {}
+    for stage, values in by_stage.items():
+        values.sort()
+        buckets = {str(bound): 0 for bound in HISTOGRAM_BUCKETS}
+        buckets['inf'] = 0
+        for seconds in values:
+            bound = next((b for b in HISTOGRAM_BUCKETS if seconds <= b), None)
+            buckets['inf' if bound is None else str(bound)] += 1
+        summary[stage] = {
+            'count': len(values),
+            'mean': round(sum(values) / len(values), 3),
+            'max': round(values[-1], 3),
+            **{f"p{pct}": round(percentile(values, pct), 3) for pct in PERCENTILES},
+            'histogram': buckets,
+        }
+    return summary
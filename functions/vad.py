@@ -0,0 +1,92 @@
+import wave
+import numpy as np
+
+from functions.config_loader import get_config
+
+# Number of frames processed at once when measuring energy, to bound memory use
+ENERGY_BLOCK_FRAMES = 4096
+
+def frame_energies_db(samples, frame_length):
+    """Return the RMS level of each frame of 16-bit PCM samples in dBFS."""
+    n_frames = len(samples) // frame_length
+    energies = np.empty(n_frames, dtype=np.float32)
+    frames = samples[:n_frames * frame_length].reshape(n_frames, frame_length)
+    for start in range(0, n_frames, ENERGY_BLOCK_FRAMES):
+        block = frames[start:start + ENERGY_BLOCK_FRAMES].astype(np.float32) / 32768.0
+        rms = np.sqrt(np.mean(block * block, axis=1))
+        energies[start:start + ENERGY_BLOCK_FRAMES] = 20.0 * np.log10(np.maximum(rms, 1e-10))
+    return energies
+
+def _runs(mask):
+    """Return (start, end) pairs for each run of True values in a boolean array."""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(edges[0::2], edges[1::2]))
+
+def trim_silence(samples, sample_rate, threshold_db=-45.0, frame_ms=30, padding_ms=300, max_pause_ms=1500):
+    """Trim leading/trailing silence and shorten long pauses in 16-bit mono PCM.
+
+    Frames louder than `threshold_db` count as voiced and `padding_ms` of audio is
+    kept either side of them. Internal pauses longer than `max_pause_ms` are
+    shortened to that length (0 disables compaction). Returns the kept samples
+    and the number of seconds removed. Recordings with no voiced frames are
+    returned unchanged.
+    """
+    samples = np.asarray(samples, dtype=np.int16)
+    frame_length = max(1, int(sample_rate * frame_ms / 1000))
+    energies = frame_energies_db(samples, frame_length)
+    voiced = energies > threshold_db
+    if not voiced.any():
+        return samples, 0.0
+    # Keep some padding around speech so word onsets and tails aren't clipped
+    # mode='same' misaligns a kernel longer than the clip, so centre a full convolution by hand
+    pad = min(int(np.ceil(padding_ms / frame_ms)), len(voiced))
+    if pad:
+        counts = np.convolve(voiced.astype(np.int32), np.ones(2 * pad + 1, dtype=np.int32), mode='full')
+        voiced = counts[pad:pad + len(voiced)] > 0
+    keep = np.zeros(len(voiced), dtype=bool)
+    voiced_runs = _runs(voiced)
+    for start, end in voiced_runs:
+        keep[start:end] = True
+    # Keep up to max_pause_ms of each pause between voiced runs, split across both sides
+    max_pause = int(max_pause_ms / frame_ms) if max_pause_ms else None
+    for (_, prev_end), (next_start, _) in zip(voiced_runs, voiced_runs[1:]):
+        if max_pause is None or next_start - prev_end <= max_pause:
+            keep[prev_end:next_start] = True
+        else:
+            keep[prev_end:prev_end + max_pause // 2] = True
+            keep[next_start - (max_pause - max_pause // 2):next_start] = True
+    # Any partial frame at the end follows the last full frame
+    segments = []
+    for start, end in _runs(keep):
+        end_sample = len(samples) if end == len(keep) else end * frame_length
+        segments.append(samples[start * frame_length:end_sample])
+    trimmed = np.concatenate(segments)
+    removed_seconds = (len(samples) - len(trimmed)) / sample_rate
+    return trimmed, removed_seconds
+
+def read_wav_samples(wav_path):
+    """Return the samples and sample rate of a 16-bit mono WAV file."""
+    with wave.open(wav_path, 'rb') as wav:
+        if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+            raise ValueError("Expected 16-bit mono PCM")
+        return np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16), wav.getframerate()
+
+def trim_wav_file(wav_path, logger=None):
+    """Run trim_silence over a 16-bit mono WAV file using the AUDIO_VAD_* config.
+
+    Returns the kept samples, the sample rate and the seconds removed.
+    """
+    config = get_config()
+    samples, sample_rate = read_wav_samples(wav_path)
+    trimmed, removed_seconds = trim_silence(
+        samples,
+        sample_rate,
+        threshold_db=float(config.get('AUDIO_VAD_THRESHOLD_DB', -45.0)),
+        frame_ms=int(config.get('AUDIO_VAD_FRAME_MS', 30)),
+        padding_ms=int(config.get('AUDIO_VAD_PADDING_MS', 300)),
+        max_pause_ms=int(config.get('AUDIO_VAD_MAX_PAUSE_MS', 1500)),
+    )
+    if logger:
+        logger.info(f"Voice activity trimming removed {removed_seconds:.1f}s of {len(samples) / sample_rate:.1f}s")
+    return trimmed, sample_rate, removed_seconds
@@ -1,12 +1,87 @@
 import tempfile
-import requests
 import time
 import os
 import ffmpeg
 import shutil
+import gevent
 
 from datetime import datetime
+from gevent.event import AsyncResult, Event
+from requests import RequestException
+from requests.exceptions import ChunkedEncodingError, ConnectionError, Timeout
+from functions import http_pool
+from functions.callbacks import FINAL_STATES, callbacks_enabled, callback_url
 from functions.config_loader import get_config
+from functions.jobs import PipelineJob
+from functions.postprocess import executor, thread_cap
+from functions.polling import generation_key, generation_times, next_poll_delay, backoff_delay, retry_after_seconds
+from functions.scheduler import scheduler, get_job_context, set_job_context
+from functions.timing import timed_stage, get_stage_listener, set_stage_listener
+
+# Bytes read at a time when downloading a video, unless DOWNLOAD_CHUNK_SIZE is set
+DOWNLOAD_CHUNK_SIZE = 1048576
+
+# Seconds into the video the thumbnail is taken from
+THUMBNAIL_AT = 1
+
+# min(iw, ih) for the thumbnail crop, as an ffmpeg expression without commas
+SQUARE_SIDE = '(iw+ih-abs(iw-ih))/2'
+
+# Filters and output (encoder) options of each FFMPEG_PRESET, from the original,
+# most expensive chain down to copying the video as Luma made it
+FFMPEG_PRESETS = {
+    'full': {'filters': ('eq', 'vibrance', 'vaguedenoiser', 'bilateral', 'noise'), 'output': {}},
+    'balanced': {'filters': ('eq', 'vibrance', 'hqdn3d', 'noise'), 'output': {'preset': 'fast'}},
+    'fast': {'filters': ('eq', 'vibrance', 'noise'), 'output': {'preset': 'veryfast', 'threads': 2}},
+    'passthrough': {'filters': (), 'output': {'c': 'copy'}},
+}
+
+# MP4 muxer flags moving the index to the front of the file
+FASTSTART = '+faststart'
+
+# hqdn3d luma spatial strength standing in for vaguedenoiser and bilateral in the balanced preset
+HQDN3D_STRENGTH = 8
+
+def ffmpeg_preset(name=None):
+    """Settings of the named preset, FFMPEG_PRESET by default."""
+    name = name or get_config().get('FFMPEG_PRESET', 'full')
+    if name not in FFMPEG_PRESETS:
+        raise ValueError(f"Unknown FFMPEG_PRESET: {name} (expected one of {', '.join(FFMPEG_PRESETS)})")
+    return FFMPEG_PRESETS[name]
+
+def apply_filters(stream, preset=None):
+    """Add the preset's filters, configured by the FFMPEG_* settings, to an ffmpeg stream."""
+    filters = ffmpeg_preset(preset)['filters']
+    if 'eq' in filters:
+        stream = ffmpeg.filter(stream, 'eq', brightness=float(get_config()['FFMPEG_BRIGHTNESS']))
+    if 'vibrance' in filters:
+        stream = ffmpeg.filter(stream, 'vibrance', intensity=float(get_config()['FFMPEG_VIBRANCE']))
+    if 'vaguedenoiser' in filters:
+        stream = ffmpeg.filter(stream, 'vaguedenoiser', threshold=float(get_config()['FFMPEG_DENOISE_THRESHOLD']))
+    if 'bilateral' in filters:
+        stream = ffmpeg.filter(stream, 'bilateral', sigmaS=float(get_config()['FFMPEG_BILATERAL_SIGMA']))
+    if 'hqdn3d' in filters:
+        stream = ffmpeg.filter(stream, 'hqdn3d', luma_spatial=HQDN3D_STRENGTH)
+    if 'noise' in filters:
+        stream = ffmpeg.filter(stream, 'noise', all_strength=float(get_config()['FFMPEG_NOISE_STRENGTH']))
+    return stream
+
+def output_options(preset=None):
+    """The preset's MP4 output options, with its thread count capped at FFMPEG_THREADS.
+
+    The MP4 is always written fast-start: the index (moov atom) goes before
+    the media data, so a browser can start playing before it has the whole file.
+    """
+    options = dict(ffmpeg_preset(preset)['output'])
+    cap = thread_cap()
+    if cap > 0 and options.get('c') != 'copy':
+        options['threads'] = min(options.get('threads', cap), cap)
+    options['movflags'] = FASTSTART
+    return options
+
+def filtered_output(source, output_path, preset=None, **options):
+    """FFmpeg output writing `source` through the preset's filters and encoder options."""
+    return ffmpeg.output(apply_filters(source, preset), output_path, **output_options(preset), **options)
 
 def process_video(input_path, logger=None):
     """Process the video using FFmpeg with specific filters from environment variables."""
@@ -14,16 +89,10 @@ def process_video(input_path, logger=None):
         # Create a temporary file for the processed video
         with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_file:
             temp_path = temp_file.name
-        # Apply FFmpeg filters using environment variables
-        stream = ffmpeg.input(input_path)
-        stream = ffmpeg.filter(stream, 'eq', brightness=float(get_config()['FFMPEG_BRIGHTNESS']))
-        stream = ffmpeg.filter(stream, 'vibrance', intensity=float(get_config()['FFMPEG_VIBRANCE']))
-        stream = ffmpeg.filter(stream, 'vaguedenoiser', threshold=float(get_config()['FFMPEG_DENOISE_THRESHOLD']))
-        stream = ffmpeg.filter(stream, 'bilateral', sigmaS=float(get_config()['FFMPEG_BILATERAL_SIGMA']))
-        stream = ffmpeg.filter(stream, 'noise', all_strength=float(get_config()['FFMPEG_NOISE_STRENGTH']))
-        stream = ffmpeg.output(stream, temp_path)
+        # Apply the FFMPEG_PRESET filters using the FFMPEG_* settings
+        stream = filtered_output(ffmpeg.input(input_path), temp_path)
         # Run FFmpeg
-        ffmpeg.run(stream, overwrite_output=True, quiet=True)
+        executor.run(stream, 'process_video', overwrite_output=True, quiet=True)
         # Replace the original file with the processed one
         shutil.move(temp_path, input_path)
         if logger:
@@ -34,6 +103,23 @@ def process_video(input_path, logger=None):
             logger.error(f"Error processing video: {str(e)}")
         raise
 
+def timestamped_name(prefix):
+    """`<prefix>_<timestamp>`, plus `_job<id>` inside a job, for files that concurrent sessions create.
+
+    The timestamp has microseconds and the job id tells apart sessions that
+    finish at the same moment, so no two dreams share an output file.
+    """
+    name = f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+    _, job_id = get_job_context()
+    return name if job_id is None else f"{name}_job{job_id}"
+
+def thumbnail_destination():
+    """(filename, path) of a new thumbnail in THUMBS_DIR (see timestamped_name)."""
+    thumbs_dir = get_config()['THUMBS_DIR']
+    os.makedirs(thumbs_dir, exist_ok=True)
+    thumb_filename = f"{timestamped_name('thumb')}.png"
+    return thumb_filename, os.path.join(thumbs_dir, thumb_filename)
+
 def process_thumbnail(video_path, logger=None):
     """Create a square thumbnail from the video at 1 second in."""
     try:
@@ -47,13 +133,8 @@ def process_thumbnail(video_path, logger=None):
         # Calculate offsets to center the crop
         x_offset = (width - crop_size) // 2
         y_offset = (height - crop_size) // 2
-        # Create output directory if it doesn't exist
-        thumbs_dir = get_config()['THUMBS_DIR']
-        os.makedirs(thumbs_dir, exist_ok=True)
-        # Generate simple timestamp-based filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        thumb_filename = f"thumb_{timestamp}.png"
-        thumb_path = os.path.join(thumbs_dir, thumb_filename)
+        # Generate simple timestamp-based filename in THUMBS_DIR
+        thumb_filename, thumb_path = thumbnail_destination()
         # Log the FFmpeg command for debugging
         if logger:
             logger.info(f"Generating thumbnail for video: {video_path}")
@@ -61,12 +142,12 @@ def process_thumbnail(video_path, logger=None):
             logger.info(f"Output path: {thumb_path}")
             logger.info(f"Crop dimensions: {crop_size}x{crop_size} at offset ({x_offset}, {y_offset})")
         # Use FFmpeg to extract frame at 1 second and crop to square
-        stream = ffmpeg.input(video_path, ss=1)
+        stream = ffmpeg.input(video_path, ss=THUMBNAIL_AT)
         stream = ffmpeg.filter(stream, 'crop', crop_size, crop_size, x_offset, y_offset)
         stream = ffmpeg.output(stream, thumb_path, vframes=1)
         # Run FFmpeg with stderr capture
         try:
-            ffmpeg.run(stream, overwrite_output=True, capture_stderr=True)
+            executor.run(stream, 'process_thumbnail', overwrite_output=True, capture_stderr=True)
         except ffmpeg.Error as e:
             if logger:
                 logger.error(f"FFmpeg error: {e.stderr.decode()}")
@@ -79,145 +160,643 @@ def process_thumbnail(video_path, logger=None):
             logger.error(f"Error generating thumbnail: {str(e)}")
         raise
 
-def generate_video(prompt, filename=None, luma_extend=False, logger=None, config=None):
-    """Generate a video using Luma Labs API, with optional extension if LUMA_EXTEND is set."""
+def single_pass_outputs(source, video_path, thumb_path, preset=None, **video_options):
+    """FFmpeg outputs writing the filtered video and its thumbnail from one decode of `source`.
+
+    The filtered frames are split: one branch is encoded to `video_path`,
+    the other is trimmed to THUMBNAIL_AT seconds and centre-cropped to a
+    square for `thumb_path`. The crop side is min(iw, ih), written without
+    a comma so it survives the filter graph syntax, which saves the probe.
+    A preset without filters copies the video and only decodes it for the
+    thumbnail.
+    """
+    settings = ffmpeg_preset(preset)
+    if settings['filters']:
+        branches = apply_filters(source, preset).split()
+        video_branch, thumb_branch = branches[0], branches[1]
+    else:
+        video_branch, thumb_branch = source.video, source
+    video_out = ffmpeg.output(video_branch, video_path, **output_options(preset), **video_options)
+    thumb = thumb_branch.filter('trim', start=THUMBNAIL_AT).filter('crop', SQUARE_SIDE, SQUARE_SIDE)
+    thumb_out = ffmpeg.output(thumb, thumb_path, vframes=1)
+    return ffmpeg.merge_outputs(video_out, thumb_out)
+
+def process_video_and_thumbnail(input_path, logger=None):
+    """Filter the video in place and create its thumbnail with one FFmpeg run; returns the thumbnail filename."""
     try:
-        # If luma_extend, split the prompt into two parts
-        if luma_extend and '*****' in prompt:
-            initial_prompt, extension_prompt = [p.strip() for p in prompt.split('*****', 1)]
-        else:
-            initial_prompt = prompt
-            extension_prompt = 'Continue on with this video'  # fallback
-        # Step 1: Create the initial generation request
-        response = requests.post(
-            get_config()['LUMA_GENERATIONS_ENDPOINT'],
-            headers={
-                'accept': 'application/json',
-                'authorization': f"Bearer {get_config()['LUMALABS_API_KEY']}",
-                'content-type': 'application/json'
-            },
-            json={
-                'prompt': initial_prompt,
-                'model': get_config()['LUMA_MODEL'],
-                'resolution': get_config()['LUMA_RESOLUTION'],
-                'duration': get_config()['LUMA_DURATION'],
-                "aspect_ratio": get_config()['LUMA_ASPECT_RATIO'],
+        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_file:
+            temp_path = temp_file.name
+        thumb_filename, thumb_path = thumbnail_destination()
+        stream = single_pass_outputs(ffmpeg.input(input_path), temp_path, thumb_path)
+        try:
+            executor.run(stream, 'process_video_and_thumbnail', overwrite_output=True, capture_stderr=True)
+        except ffmpeg.Error as e:
+            if logger:
+                logger.error(f"FFmpeg error: {e.stderr.decode()}")
+            raise
+        if not os.path.exists(thumb_path):
+            raise RuntimeError(f"Video is shorter than {THUMBNAIL_AT}s, no frame for the thumbnail")
+        shutil.move(temp_path, input_path)
+        if logger:
+            logger.info(f"Processed video saved to {input_path}, thumbnail to {thumb_path}")
+        return thumb_filename
+    except Exception as e:
+        if logger:
+            logger.error(f"Error processing video: {str(e)}")
+        raise
+
+# Page size of the generations list, used to check several generations with one request
+LIST_PAGE_SIZE = 50
+
+# Seconds a finished generation's result is kept for a job that hasn't asked for it yet
+FINISHED_TTL = 3600
+
+def luma_headers(json_body=False):
+    """Headers for Luma API requests."""
+    headers = {
+        'accept': 'application/json',
+        'authorization': f"Bearer {get_config()['LUMALABS_API_KEY']}"
+    }
+    if json_body:
+        headers['content-type'] = 'application/json'
+    return headers
+
+def extend_segments(luma_extend=False):
+    """Number of chained Luma generations for one dream: 1, or LUMA_EXTEND_SEGMENTS (at least 2) when extending."""
+    if not luma_extend:
+        return 1
+    return max(2, int(get_config().get('LUMA_EXTEND_SEGMENTS', 2)))
+
+def split_prompts(prompt, segments=1):
+    """Split a prompt into one prompt per chained segment.
+
+    Extend prompts separate the parts with '*****'. Segments beyond the parts
+    given reuse the last part.
+    """
+    if segments == 1:
+        return [prompt]
+    if '*****' in prompt:
+        parts = [p.strip() for p in prompt.split('*****')]
+    else:
+        parts = [prompt, 'Continue on with this video']  # fallback
+    parts = parts[:segments]
+    while len(parts) < segments:
+        parts.append(parts[-1])
+    return parts
+
+def create_generation(prompt, extend_id=None, logger=None):
+    """Start a Luma generation, optionally extending generation `extend_id`, and return its ID."""
+    body = {
+        'prompt': prompt,
+        'model': get_config()['LUMA_MODEL'],
+        'resolution': get_config()['LUMA_RESOLUTION'],
+        'duration': get_config()['LUMA_DURATION'],
+        "aspect_ratio": get_config()['LUMA_ASPECT_RATIO'],
+    }
+    if extend_id:
+        body['keyframes'] = {
+            'frame0': {
+                'type': 'generation',
+                'id': extend_id
             }
-        )
-        if response.status_code not in [200, 201]:
-            raise Exception(f"Luma API error: {response.text}")
-        response_data = response.json()
+        }
+    if callbacks_enabled():
+        body['callback_url'] = callback_url()
+    with timed_stage('luma_create'), scheduler.slot('luma_create'):
+        response = http_pool.post(get_config()['LUMA_GENERATIONS_ENDPOINT'], headers=luma_headers(json_body=True), json=body)
+    if response.status_code not in [200, 201]:
+        raise Exception(f"Luma API error{' (extend)' if extend_id else ''}: {response.text}")
+    response_data = response.json()
+    if logger:
+        logger.info(f"{'Extend API' if extend_id else 'API'} response: {response_data}")
+    generation_id = response_data.get('id')
+    if not generation_id:
+        raise Exception(f"Failed to get {'extend ' if extend_id else ''}generation ID from response")
+    if logger:
+        logger.info(f"Started video {'extension' if extend_id else 'generation'} with ID: {generation_id}")
+    tracker.track(generation_id, generation_key(extend=bool(extend_id)), callback='callback_url' in body)
+    return generation_id
+
+def cancel_generation(generation_id, logger=None):
+    """Delete a Luma generation that is no longer wanted. Returns True if Luma accepted it."""
+    tracker.forget(generation_id)
+    try:
+        with scheduler.slot('luma_create'):
+            response = http_pool.delete(f"{get_config()['LUMA_API_URL']}/generations/{generation_id}", headers=luma_headers())
+        if response.status_code not in [200, 202, 204]:
+            if logger:
+                logger.warning(f"Could not cancel generation {generation_id}: {response.status_code} {response.text}")
+            return False
         if logger:
-            logger.info(f"API response: {response_data}")
-        generation_id = response_data.get('id')
-        if not generation_id:
-            raise Exception("Failed to get generation ID from response")
+            logger.info(f"Cancelled generation {generation_id}")
+        return True
+    except Exception as e:
         if logger:
-            logger.info(f"Started video generation with ID: {generation_id}")
-        def poll_for_completion(generation_id):
-            """Poll the Luma API for video generation completion."""
-            max_attempts = int(get_config()['LUMA_MAX_POLL_ATTEMPTS'])
-            poll_interval = float(get_config()['LUMA_POLL_INTERVAL'])
-            for attempt in range(max_attempts):
-                status_response = requests.get(
-                    f"{get_config()['LUMA_API_URL']}/generations/{generation_id}",
-                    headers={
-                        'accept': 'application/json',
-                        'authorization': f"Bearer {get_config()['LUMALABS_API_KEY']}"
-                    }
+            logger.warning(f"Could not cancel generation {generation_id}: {str(e)}")
+        return False
+
+def generation_result(status_data):
+    """Video URL of a completed generation's status, None while it is still running; raises if it failed."""
+    state = status_data.get('state')
+    if state in ['completed', 'succeeded']:
+        assets = status_data.get('assets') or {}
+        video_url = None
+        if isinstance(assets, dict):
+            video_url = (assets.get('video') or 
+                       assets.get('url') or 
+                       (assets.get('videos', {}) or {}).get('url'))
+        if not video_url and 'result' in status_data:
+            result = status_data.get('result', {})
+            if isinstance(result, dict):
+                video_url = result.get('url')
+        if not video_url:
+            raise Exception("Video URL not found in completed response")
+        return video_url
+    elif state in ['failed', 'error']:
+        error_msg = status_data.get('failure_reason') or status_data.get('error') or "Unknown error"
+        raise Exception(f"Video generation failed: {error_msg}")
+    return None
+
+class TrackedGeneration:
+    """A Luma generation the tracker checks, and the result its waiting jobs get."""
+
+    def __init__(self, generation_id, key=None, callback=False):
+        self.id = generation_id
+        self.key = key
+        self.callback = callback
+        self.started = time.time()
+        self.last_pending = self.started
+        self.state = None
+        self.checks = 0
+        self.failures = 0
+        self.logger = None
+        self.listener = None
+        self.result = AsyncResult()
+        if callback:
+            self.due = self.started + float(get_config().get('LUMA_CALLBACK_TIMEOUT', 300))
+        else:
+            window = generation_times.window(key) if key else None
+            # A generation with a known history isn't checked before it could be done
+            self.due = self.started + (next_poll_delay(0, window) if window else 0)
+
+class GenerationTracker:
+    """Owns every Luma generation this process is waiting on and checks them all from one greenlet.
+
+    Generations created with a callback URL are completed by deliver(), and
+    only checked once LUMA_CALLBACK_TIMEOUT passes without a callback. Others
+    are checked on the schedule of functions.polling; when several are due at
+    once, one request for the generations list covers them (LUMA_POLL_BATCH),
+    and only those missing from it are fetched one by one. Each status request
+    is reported as a 'luma_poll' stage to the jobs waiting on what it checked.
+    """
+
+    def __init__(self):
+        self.generations = {}
+        self.finished = {}
+        self.wakeup = Event()
+        self.poller = None
+
+    def track(self, generation_id, key=None, callback=False):
+        """Start tracking a generation, if it isn't already; returns its TrackedGeneration."""
+        now = time.time()
+        for finished_id, tracked in list(self.finished.items()):
+            if now - tracked.started > FINISHED_TTL:
+                del self.finished[finished_id]
+        tracked = self.generations.get(generation_id) or self.finished.get(generation_id)
+        if tracked is None:
+            tracked = self.generations[generation_id] = TrackedGeneration(generation_id, key, callback)
+            if self.poller is None or self.poller.dead:
+                self.poller = gevent.spawn(self._run)
+            self.wakeup.set()
+        return tracked
+
+    def wait(self, generation_id, logger=None):
+        """Block until the generation completes and return its video URL; raises if it fails or times out."""
+        tracked = self.track(generation_id)
+        tracked.logger = logger
+        tracked.listener = get_stage_listener()
+        try:
+            return tracked.result.get()
+        finally:
+            self.finished.pop(generation_id, None)
+
+    def deliver(self, status_data):
+        """Complete a generation from a Luma callback; returns False if it isn't tracked."""
+        tracked = self.generations.get(status_data.get('id'))
+        if tracked is None:
+            return False
+        if status_data.get('state') in FINAL_STATES:
+            self._finish(tracked, status_data, time.time())
+        return True
+
+    def forget(self, generation_id):
+        """Stop tracking a generation, e.g. one that was cancelled."""
+        self.generations.pop(generation_id, None)
+        self.finished.pop(generation_id, None)
+
+    def _done(self, tracked):
+        # Finished before anyone waited on it (e.g. a speculative generation), so keep the result
+        self.generations.pop(tracked.id, None)
+        self.finished[tracked.id] = tracked
+
+    def snapshot(self):
+        """In-flight generations with their age, last known state and checks so far."""
+        now = time.time()
+        return [{
+            'id': tracked.id,
+            'age': round(now - tracked.started, 1),
+            'state': tracked.state,
+            'checks': tracked.checks,
+            'callback': tracked.callback,
+            'next_check_in': round(max(0.0, tracked.due - now), 1),
+        } for tracked in self.generations.values()]
+
+    def _run(self):
+        while self.generations:
+            self.wakeup.clear()
+            now = time.time()
+            due = [tracked for tracked in self.generations.values() if tracked.due <= now]
+            if not due:
+                self.wakeup.wait(min(tracked.due for tracked in self.generations.values()) - now)
+                continue
+            try:
+                self._check(due)
+            except Exception as e:
+                # This greenlet is the only poller, so it must outlive any one bad check
+                for tracked in due:
+                    if tracked.id in self.generations and not tracked.result.ready():
+                        self._recover(tracked, e)
+
+    def _check(self, due):
+        for tracked in due:
+            if tracked.callback and not tracked.checks and tracked.logger:
+                tracked.logger.warning(f"No callback for generation {tracked.id}, polling instead")
+        unchecked = due
+        if len(due) > 1 and str(get_config().get('LUMA_POLL_BATCH', True)).lower() in ('1', 'true', 'yes'):
+            unchecked = self._check_list(due)
+        for tracked in unchecked:
+            self._check_one(tracked)
+
+    def _recover(self, tracked, error):
+        """Back off a generation whose check raised unexpectedly, or fail it if even that raises."""
+        try:
+            self._retry(tracked, f"Unexpected error checking generation {tracked.id}: {str(error)}")
+        except Exception as e:
+            self._done(tracked)
+            tracked.result.set_exception(e)
+
+    def _check_list(self, due):
+        """Check generations against the newest page of the generations list; returns those not on it.
+
+        If the list request itself fails, every due generation is backed off
+        instead, so a rate limit doesn't turn into one request per generation.
+        """
+        start = time.perf_counter()
+        ok = False
+        try:
+            with scheduler.slot('luma_poll'):
+                response = http_pool.get(
+                    f"{get_config()['LUMA_API_URL']}/generations",
+                    params={'limit': LIST_PAGE_SIZE},
+                    headers=luma_headers()
                 )
-                if status_response.status_code not in [200, 201]:
-                    if logger:
-                        logger.error(f"Status check failed with code {status_response.status_code}: {status_response.text}")
-                    time.sleep(poll_interval)
-                    continue
-                status_data = status_response.json()
-                if attempt == 0 or attempt % 10 == 0:
-                    if logger:
-                        logger.info(f"Full status response: {status_data}")
-                state = status_data.get('state')
-                if logger:
-                    logger.info(f"Generation state: {state} (attempt {attempt+1}/{max_attempts})")
-                if state in ['completed', 'succeeded']:
-                    assets = status_data.get('assets') or {}
-                    video_url = None
-                    if isinstance(assets, dict):
-                        video_url = (assets.get('video') or 
-                                   assets.get('url') or 
-                                   (assets.get('videos', {}) or {}).get('url'))
-                    if not video_url and 'result' in status_data:
-                        result = status_data.get('result', {})
-                        if isinstance(result, dict):
-                            video_url = result.get('url')
-                    if not video_url:
-                        raise Exception("Video URL not found in completed response")
-                    if logger:
-                        logger.info(f"Video generation completed: {video_url}")
-                    return video_url
-                elif state in ['failed', 'error']:
-                    error_msg = status_data.get('failure_reason') or status_data.get('error') or "Unknown error"
-                    raise Exception(f"Video generation failed: {error_msg}")
-                time.sleep(poll_interval)
-            raise Exception(f"Timed out waiting for video generation after {max_attempts} attempts")
-        # Step 2: If luma_extend is set, extend the video
-        if luma_extend:
-            if logger:
-                logger.info("LUMA_EXTEND is set. Requesting video extension.")
-            _ = poll_for_completion(generation_id)  # Wait for completion
-            extend_response = requests.post(
-                get_config()['LUMA_GENERATIONS_ENDPOINT'],
-                headers={
-                    'accept': 'application/json',
-                    'authorization': f"Bearer {get_config()['LUMALABS_API_KEY']}",
-                    'content-type': 'application/json'
-                },
-                json={
-                    'model': get_config()['LUMA_MODEL'],
-                    'resolution': get_config()['LUMA_RESOLUTION'],
-                    'duration': get_config()['LUMA_DURATION'],
-                    "aspect_ratio": get_config()['LUMA_ASPECT_RATIO'],
-                    'prompt': extension_prompt,
-                    'keyframes': {
-                        'frame0': {
-                            'type': 'generation',
-                            'id': generation_id
-                        }
-                    }
-                }
-            )
-            if extend_response.status_code not in [200, 201]:
-                raise Exception(f"Luma API error (extend): {extend_response.text}")
-            extend_data = extend_response.json()
-            if logger:
-                logger.info(f"Extend API response: {extend_data}")
-            extend_id = extend_data.get('id')
-            if not extend_id:
-                raise Exception("Failed to get extend generation ID from response")
+            if response.status_code != 200:
+                for tracked in due:
+                    self._retry(tracked, f"Generations list failed with code {response.status_code}: {response.text}",
+                                retry_after_seconds(response))
+                return []
+            listed = {g.get('id'): g for g in response.json().get('generations') or []}
+            ok = True
+        except (RequestException, ValueError, AttributeError) as e:
+            for tracked in due:
+                self._retry(tracked, f"Generations list failed: {str(e)}")
+            return []
+        finally:
+            self._report(due, start, ok)
+        checked = time.time()
+        for tracked in due:
+            if tracked.id in listed:
+                self._update(tracked, listed[tracked.id], checked)
+        return [tracked for tracked in due if tracked.id not in listed]
+
+    def _check_one(self, tracked):
+        start = time.perf_counter()
+        try:
+            with scheduler.slot('luma_poll'):
+                response = http_pool.get(
+                    f"{get_config()['LUMA_API_URL']}/generations/{tracked.id}",
+                    headers=luma_headers()
+                )
+        except RequestException as e:
+            self._report([tracked], start, False)
+            self._retry(tracked, f"Status check failed: {str(e)}")
+            return
+        self._report([tracked], start, response.status_code in [200, 201])
+        if response.status_code not in [200, 201]:
+            self._retry(tracked, f"Status check failed with code {response.status_code}: {response.text}",
+                        retry_after_seconds(response))
+            return
+        try:
+            self._update(tracked, response.json(), time.time())
+        except Exception as e:
+            self._retry(tracked, f"Status check failed: {str(e)}")
+
+    def _report(self, checked, start, ok):
+        """Record a status request as a 'luma_poll' stage of every job waiting on the generations it checked."""
+        seconds = time.perf_counter() - start
+        for tracked in checked:
+            if tracked.listener is not None:
+                tracked.listener('luma_poll', seconds, ok)
+
+    def _retry(self, tracked, message, retry_after=None):
+        """Back off after a failed status check."""
+        tracked.checks += 1
+        tracked.failures += 1
+        if tracked.logger:
+            tracked.logger.error(message)
+        if not self._out_of_checks(tracked):
+            tracked.due = time.time() + backoff_delay(tracked.failures, retry_after)
+
+    def _update(self, tracked, status_data, checked):
+        """Apply a status check: finish the generation or schedule its next check."""
+        tracked.checks += 1
+        tracked.failures = 0
+        if status_data.get('state') != tracked.state:
+            tracked.state = status_data.get('state')
+            if tracked.logger:
+                tracked.logger.info(f"Full status response: {status_data}")
+                tracked.logger.info(f"Generation state: {tracked.state} (check {tracked.checks})")
+        # It finished somewhere between the last two checks
+        if self._finish(tracked, status_data, (tracked.last_pending + checked) / 2):
+            return
+        tracked.last_pending = checked
+        if not self._out_of_checks(tracked):
+            window = generation_times.window(tracked.key) if tracked.key else None
+            tracked.due = checked + next_poll_delay(checked - tracked.started, window)
+
+    def _finish(self, tracked, status_data, finished_at):
+        """Hand a final status to the waiting jobs; returns False if the generation is still running."""
+        try:
+            video_url = generation_result(status_data)
+        except Exception as e:
+            self._done(tracked)
+            tracked.result.set_exception(e)
+            return True
+        if video_url is None:
+            return False
+        self._done(tracked)
+        if tracked.logger:
+            source = 'callback' if tracked.callback and not tracked.checks else f"{tracked.checks} status checks"
+            tracked.logger.info(f"Video generation completed, reported by {source}: {video_url}")
+        if tracked.key:
+            generation_times.record(tracked.key, finished_at - tracked.started)
+        tracked.result.set(video_url)
+        return True
+
+    def _out_of_checks(self, tracked):
+        if tracked.checks < int(get_config()['LUMA_MAX_POLL_ATTEMPTS']):
+            return False
+        self._done(tracked)
+        tracked.result.set_exception(Exception(f"Timed out waiting for video generation after {tracked.checks} attempts"))
+        return True
+
+tracker = GenerationTracker()
+
+def poll_generation(generation_id, logger=None):
+    """Wait for a generation to complete and return its video URL (see GenerationTracker)."""
+    with timed_stage('luma_wait'):
+        return tracker.wait(generation_id, logger)
+
+def video_destination(filename=None):
+    """(filename, path) of a downloaded video in VIDEOS_DIR, named by timestamped_name unless given."""
+    if filename is None:
+        filename = f"{timestamped_name('generated')}.mp4"
+    os.makedirs(get_config()['VIDEOS_DIR'], exist_ok=True)
+    return filename, os.path.join(get_config()['VIDEOS_DIR'], filename)
+
+def video_chunks(video_url, logger=None):
+    """Yield the body of `video_url` in DOWNLOAD_CHUNK_SIZE chunks.
+
+    If the connection drops or times out, the download resumes from the last
+    byte received with a Range request, up to DOWNLOAD_RETRIES times. A
+    server that ignores the Range header sends the whole file again, and the
+    bytes already yielded are skipped.
+    """
+    config = get_config()
+    chunk_size = int(config.get('DOWNLOAD_CHUNK_SIZE', DOWNLOAD_CHUNK_SIZE))
+    retries = int(config.get('DOWNLOAD_RETRIES', 3))
+    received = 0
+    failures = 0
+    while True:
+        headers = {'Range': f"bytes={received}-"} if received else None
+        try:
+            video_response = http_pool.get(video_url, stream=True, headers=headers)
+            video_response.raise_for_status()
+            skip = received if received and video_response.status_code != 206 else 0
+            for chunk in video_response.iter_content(chunk_size=chunk_size):
+                if skip:
+                    dropped = min(skip, len(chunk))
+                    chunk = chunk[dropped:]
+                    skip -= dropped
+                    if not chunk:
+                        continue
+                received += len(chunk)
+                yield chunk
+            return
+        except (ConnectionError, ChunkedEncodingError, Timeout) as e:
+            failures += 1
+            if failures > retries:
+                raise
             if logger:
-                logger.info(f"Started video extension with ID: {extend_id}")
-            video_url = poll_for_completion(extend_id)
-        else:
-            video_url = poll_for_completion(generation_id)
-        # Download the generated video
-        video_response = requests.get(video_url, stream=True)
-        video_response.raise_for_status()
-        if filename is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"generated_{timestamp}.mp4"
-        os.makedirs(get_config()['VIDEOS_DIR'], exist_ok=True)
-        video_path = os.path.join(get_config()['VIDEOS_DIR'], filename)
+                logger.warning(f"Video download interrupted after {received} bytes, resuming ({failures}/{retries}): {str(e)}")
+            gevent.sleep(backoff_delay(failures))
+
+def download_video(video_url, filename=None, logger=None):
+    """Download a generated video into VIDEOS_DIR and return its filename."""
+    filename, video_path = video_destination(filename)
+    with timed_stage('download'), scheduler.slot('download'):
         with open(video_path, 'wb') as f:
-            for chunk in video_response.iter_content(chunk_size=8192):
+            for chunk in video_chunks(video_url, logger):
                 f.write(chunk)
+    if logger:
+        logger.info(f"Saved video to {video_path}")
+    return filename
+
+def stream_process_video(video_url, filename=None, logger=None, thumbnail=False):
+    """Download a generated video straight into FFmpeg's filters; returns (filename, thumbnail filename).
+
+    The response body is piped to FFmpeg's stdin, so only the processed file
+    is written; it appears in VIDEOS_DIR under its final name once FFmpeg has
+    finished. With `thumbnail`, the same run creates the thumbnail (see
+    single_pass_outputs), otherwise the thumbnail filename is None. FFmpeg
+    can't read an MP4 from a pipe if its index (moov atom) comes after the
+    media data, in which case this raises ffmpeg.Error. A run that takes
+    longer than DOWNLOAD_STREAM_TIMEOUT seconds is killed and raises too.
+    """
+    filename, video_path = video_destination(filename)
+    part_path = f"{video_path}.part"
+    thumb_filename = thumb_path = None
+    source = ffmpeg.input('pipe:0')
+    if thumbnail:
+        thumb_filename, thumb_path = thumbnail_destination()
+        stream = single_pass_outputs(source, part_path, thumb_path, format='mp4')
+    else:
+        stream = filtered_output(source, part_path, format='mp4')
+    # stderr stays at info level for -benchmark's CPU figures
+    stream = stream.global_args('-hide_banner', '-nostats')
+    timeout = float(get_config().get('DOWNLOAD_STREAM_TIMEOUT', 600))
+    with timed_stage('stream_video'), scheduler.slot('download'), scheduler.slot('ffmpeg'), \
+            executor.job('stream_video') as ffmpeg_job:
+        process = ffmpeg.run_async(stream, cmd=executor.command(), pipe_stdin=True, pipe_stderr=True, overwrite_output=True)
+        # Read stderr while the body is written; if its pipe filled up, FFmpeg would stop reading stdin
+        stderr_reader = gevent.spawn(process.stderr.read)
+        try:
+            with gevent.Timeout(timeout or None, Exception(f"Streaming the video into FFmpeg took over {timeout:g}s")):
+                try:
+                    for chunk in video_chunks(video_url, logger):
+                        process.stdin.write(chunk)
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass  # FFmpeg gave up on the input; its exit status and stderr say why
+                process.wait()
+                stderr = stderr_reader.get()
+            ffmpeg_job['stderr'] = stderr
+            if process.returncode != 0:
+                raise ffmpeg.Error('ffmpeg', None, stderr)
+            os.replace(part_path, video_path)
+        except BaseException:
+            stderr_reader.kill(block=False)
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            for path in (part_path, thumb_path):
+                try:
+                    if path:
+                        os.unlink(path)
+                except OSError:
+                    pass
+            raise
+    if logger:
+        logger.info(f"Streamed and processed video saved to {video_path}")
+    return filename, thumb_filename
+
+def spawn_in_context(func, *args):
+    """Spawn a greenlet that keeps the current job context and stage listener."""
+    owner, job_id = get_job_context()
+    listener = get_stage_listener()
+
+    def run():
+        set_job_context(owner, job_id)
+        set_stage_listener(listener)
+        return func(*args)
+
+    return gevent.spawn(run)
+
+def preview_segment(video_url, index, job, on_preview, logger=None):
+    """Download and post-process a finished intermediate segment, then pass its filename to on_preview()."""
+    try:
+        filename = download_video(video_url, f"{timestamped_name('preview')}_{index}.mp4", logger)
+        job.checkpoint(job.state, preview_filenames=job.data.get('preview_filenames', []) + [filename])
+        with timed_stage('process_preview'), scheduler.slot('ffmpeg'):
+            process_video(os.path.join(get_config()['VIDEOS_DIR'], filename), logger)
+        on_preview(filename)
+    except Exception as e:
         if logger:
-            logger.info(f"Saved video to {video_path}")
-        # Post-process the video and generate a thumbnail
-        processed_video_path = process_video(video_path, logger)
-        if logger:
-            logger.info(f"Processed video saved to {processed_video_path}")
-        thumb_filename = process_thumbnail(processed_video_path, logger)
+            logger.warning(f"Could not prepare preview of segment {index}: {str(e)}")
+
+def remove_preview_files(filenames):
+    """Delete preview clips once the finished video has replaced them."""
+    for filename in filenames or []:
+        try:
+            os.unlink(os.path.join(get_config()['VIDEOS_DIR'], filename))
+        except OSError:
+            pass
+
+def generate_video(prompt, filename=None, luma_extend=False, logger=None, config=None, job=None, on_preview=None):
+    """Generate a video using Luma Labs API, with optional extension if LUMA_EXTEND is set.
+
+    With LUMA_EXTEND, LUMA_EXTEND_SEGMENTS generations are chained, each one
+    extending the previous one. While a segment's extension renders, the
+    finished segment is downloaded and post-processed in the background and
+    handed to `on_preview(filename)` (if LUMA_EXTEND_PREVIEW is set).
+
+    When a PipelineJob is given, each step's output (generation IDs, video URL,
+    downloaded file) is checkpointed to it, and steps that already have an
+    output are skipped. A resumed job keeps polling its existing generation
+    instead of paying for a new one.
+    """
+    if job is None:
+        job = PipelineJob()
+    previews = []
+    try:
+        prompts = split_prompts(prompt, extend_segments(luma_extend))
+        # Step 1: Create the initial generation request
+        generation_id = job.data.get('generation_id')
+        if generation_id:
+            if logger:
+                logger.info(f"Resuming video generation with ID: {generation_id}")
+        else:
+            generation_id = create_generation(prompts[0], logger=logger)
+            job.checkpoint('generating', generation_id=generation_id)
+        # Step 2: If luma_extend is set, chain the extensions
+        extend_ids = job.data.get('extend_ids')
+        if extend_ids is None:
+            # Jobs checkpointed before chains were supported store a single extend_id
+            extend_ids = [job.data['extend_id']] if job.data.get('extend_id') else []
+        segment_ids = [generation_id] + list(extend_ids)
+        preview = on_preview is not None and get_config().get('LUMA_EXTEND_PREVIEW', True)
+        while len(segment_ids) < len(prompts):
+            if logger:
+                logger.info(f"LUMA_EXTEND is set. Requesting video extension {len(segment_ids)} of {len(prompts) - 1}.")
+            segment_url = poll_generation(segment_ids[-1], logger)  # Wait for completion
+            if preview:
+                previews.append(spawn_in_context(preview_segment, segment_url, len(segment_ids), job, on_preview, logger))
+            extend_id = create_generation(prompts[len(segment_ids)], extend_id=segment_ids[-1], logger=logger)
+            segment_ids.append(extend_id)
+            job.checkpoint('generating', extend_ids=segment_ids[1:])
+        final_id = segment_ids[-1]
+        video_url = job.data.get('video_url')
+        if not video_url:
+            video_url = poll_generation(final_id, logger)
+            job.checkpoint('downloading', video_url=video_url)
+        # Download the generated video, straight into FFmpeg if DOWNLOAD_STREAM_TO_FFMPEG is set
+        filename = job.data.get('video_filename') or filename
+        single_pass = get_config().get('FFMPEG_SINGLE_PASS', True)
+        if not job.data.get('downloaded') and get_config().get('DOWNLOAD_STREAM_TO_FFMPEG', False):
+            try:
+                filename, thumb_filename = stream_process_video(video_url, filename, logger, thumbnail=single_pass)
+                outputs = {'thumb_filename': thumb_filename} if thumb_filename else {}
+                job.checkpoint('post-processing', video_filename=filename, downloaded=True, video_processed=True, **outputs)
+            except Exception as e:
+                if logger:
+                    logger.warning(f"Could not stream the video into FFmpeg, downloading it first: {str(e)}")
+        if not job.data.get('downloaded'):
+            filename = download_video(video_url, filename, logger)
+            job.checkpoint('post-processing', video_filename=filename, downloaded=True)
+        video_path = os.path.join(get_config()['VIDEOS_DIR'], filename)
+        # Post-process the video and generate a thumbnail. Filtering happens in
+        # place, so it is checkpointed on its own to avoid applying it twice.
+        # With FFMPEG_SINGLE_PASS both come from one decode of the video.
+        if not job.data.get('video_processed') and single_pass and not job.data.get('thumb_filename'):
+            with timed_stage('process_video'), scheduler.slot('ffmpeg'):
+                thumb_filename = process_video_and_thumbnail(video_path, logger)
+            job.checkpoint('post-processing', video_processed=True, thumb_filename=thumb_filename)
+        if not job.data.get('video_processed'):
+            with timed_stage('process_video'), scheduler.slot('ffmpeg'):
+                processed_video_path = process_video(video_path, logger)
+            if logger:
+                logger.info(f"Processed video saved to {processed_video_path}")
+            job.checkpoint('post-processing', video_processed=True)
+        thumb_filename = job.data.get('thumb_filename')
+        if not thumb_filename:
+            with timed_stage('process_thumbnail'), scheduler.slot('ffmpeg'):
+                thumb_filename = process_thumbnail(video_path, logger)
+            job.checkpoint('post-processing', thumb_filename=thumb_filename)
         return filename, thumb_filename
     except Exception as e:
         if logger:
             logger.error(f"Error generating video: {str(e)}")
         raise
+    finally:
+        # Don't leave a preview's ffmpeg running behind the finished video
+        gevent.joinall(previews)
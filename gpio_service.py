@@ -9,9 +9,9 @@ It detects different touch patterns and calls different endpoints.
 
 import time
 import logging
-import requests
 import argparse
 from enum import Enum
+from functions import http_pool
 from functions.config_loader import get_config
 import sys
 
@@ -300,7 +300,7 @@ def main():
                 draw_buttons()
                 print(f"Simulating single tap... (POST {single_tap_url})")
                 try:
-                    response = requests.post(single_tap_url)
+                    response = http_pool.post(single_tap_url)
                     print(f"Single tap response: {response.status_code} {response.text}")
                 except Exception as e:
                     print(f"Error sending single tap: {e}")
@@ -311,7 +311,7 @@ def main():
                 draw_buttons()
                 print(f"Simulating double tap... (POST {double_tap_url})")
                 try:
-                    response = requests.post(double_tap_url)
+                    response = http_pool.post(double_tap_url)
                     print(f"Double tap response: {response.status_code} {response.text}")
                 except Exception as e:
                     print(f"Error sending double tap: {e}")
@@ -322,7 +322,7 @@ def main():
                 draw_buttons()
                 print(f"Simulating triple tap... (POST {triple_tap_url})")
                 try:
-                    response = requests.post(triple_tap_url)
+                    response = http_pool.post(triple_tap_url)
                     print(f"Triple tap response: {response.status_code} {response.text}")
                 except Exception as e:
                     print(f"Error sending triple tap: {e}")
@@ -333,7 +333,7 @@ def main():
                 draw_buttons()
                 print(f"Simulating hold... (POST {hold_url})")
                 try:
-                    response = requests.post(hold_url)
+                    response = http_pool.post(hold_url)
                     print(f"Hold response: {response.status_code} {response.text}")
                 except Exception as e:
                     print(f"Error sending hold: {e}")
@@ -365,7 +365,7 @@ def main():
     def single_tap_callback():
         logger.info("Single tap detected, sending to server...")
         try:
-            response = requests.post(single_tap_url)
+            response = http_pool.post(single_tap_url)
             if response.status_code == 200:
                 logger.info("Single tap processed successfully")
             else:
@@ -378,7 +378,7 @@ def main():
     def double_tap_callback():
         logger.info("Double tap detected, sending to server...")
         try:
-            response = requests.post(double_tap_url)
+            response = http_pool.post(double_tap_url)
             if response.status_code == 200:
                 logger.info("Double tap processed successfully")
             else:
@@ -391,7 +391,7 @@ def main():
     def triple_tap_callback():
         logger.info("Triple tap detected, sending to server...")
         try:
-            response = requests.post(triple_tap_url)
+            response = http_pool.post(triple_tap_url)
             if response.status_code == 200:
                 logger.info("Triple tap processed successfully")
             else:
@@ -404,7 +404,7 @@ def main():
     def hold_callback():
         logger.info("Hold detected, sending to server...")
         try:
-            response = requests.post(hold_url)
+            response = http_pool.post(hold_url)
             if response.status_code == 200:
                 logger.info("Hold processed successfully")
             else:
@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import argparse
+
+# Ensure parent directory is in sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from socketio import packet
+from functions.audio import decode_audio_chunk
+
+# MediaRecorder settings used by static/js/recorder.js
+CHUNK_INTERVAL_MS = 100
+AUDIO_BITS_PER_SECOND = 128000
+
+def make_chunks(minutes=1.0, bitrate=AUDIO_BITS_PER_SECOND, interval_ms=CHUNK_INTERVAL_MS):
+    """Build a list of pseudo-random chunks matching one recording of the given length."""
+    chunk_size = int(bitrate / 8 * interval_ms / 1000)
+    count = int(minutes * 60 * 1000 / interval_ms)
+    return [os.urandom(chunk_size) for _ in range(count)]
+
+def encode_packets(chunks, encoding):
+    """Encode each chunk as the Socket.IO packets the browser would send."""
+    encoded = []
+    for chunk in chunks:
+        data = chunk if encoding == 'binary' else list(chunk)
+        pkt = packet.Packet(packet.EVENT, data=['stream_recording', {'data': data, 'timestamp': 0}], namespace='/')
+        encoded.append(pkt.encode())
+    return encoded
+
+def wire_bytes(encoded):
+    """Total number of bytes put on the wire for the encoded packets."""
+    total = 0
+    for parts in encoded:
+        parts = parts if isinstance(parts, list) else [parts]
+        for part in parts:
+            total += len(part.encode('utf-8') if isinstance(part, str) else part)
+    return total
+
+def ingest(encoded):
+    """Decode packets the way the server does and return the recovered audio size."""
+    received = 0
+    for parts in encoded:
+        parts = parts if isinstance(parts, list) else [parts]
+        pkt = packet.Packet(encoded_packet=parts[0])
+        for attachment in parts[1:]:
+            pkt.add_attachment(attachment)
+        received += len(decode_audio_chunk(pkt.data[1]))
+    return received
+
+def run(minutes=1.0, repeat=3):
+    chunks = make_chunks(minutes)
+    audio_bytes = sum(len(c) for c in chunks)
+    results = {}
+    for encoding in ('json', 'binary'):
+        encoded = encode_packets(chunks, encoding)
+        best_cpu = None
+        best_wall = None
+        for _ in range(repeat):
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+            received = ingest(encoded)
+            cpu = time.process_time() - cpu_start
+            wall = time.perf_counter() - wall_start
+            assert received == audio_bytes
+            best_cpu = cpu if best_cpu is None else min(best_cpu, cpu)
+            best_wall = wall if best_wall is None else min(best_wall, wall)
+        wire = wire_bytes(encoded)
+        results[encoding] = {
+            'wire_bytes_per_second': wire / (minutes * 60),
+            'overhead': wire / audio_bytes,
+            'cpu_seconds_per_minute': best_cpu / minutes,
+            'wall_seconds_per_minute': best_wall / minutes,
+        }
+    return audio_bytes, results
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare JSON int-list and binary audio ingest')
+    parser.add_argument('--minutes', type=float, default=1.0, help='Length of the simulated recording')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs per encoding (best is reported)')
+    args = parser.parse_args()
+    audio_bytes, results = run(args.minutes, args.repeat)
+    print(f"Simulated recording: {args.minutes:g} min, {audio_bytes} audio bytes "
+          f"({AUDIO_BITS_PER_SECOND // 1000} kbps, {CHUNK_INTERVAL_MS} ms chunks)")
+    print(f"{'encoding':<10}{'wire B/s':>14}{'overhead':>10}{'CPU s/min':>12}{'wall s/min':>12}")
+    for encoding, r in results.items():
+        print(f"{encoding:<10}{r['wire_bytes_per_second']:>14.0f}{r['overhead']:>9.2f}x"
+              f"{r['cpu_seconds_per_minute']:>12.4f}{r['wall_seconds_per_minute']:>12.4f}")
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,172 @@
+from gevent import monkey
+monkey.patch_all()
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import gevent
+
+from contextlib import contextmanager
+
+# Ensure parent directory is in sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from openai import OpenAI
+from functions import audio, video
+from functions.config_loader import get_config
+from functions.http_pool import openai_http_client
+from functions.jobs import PipelineJob
+from functions.polling import generation_times
+from functions.scheduler import PipelineScheduler, STAGE_LIMITS, set_job_context
+from scripts.fake_providers import create_app, start_server, provider_config
+
+# Stand-in for an ffmpeg encode: a separate process burning CPU, like the real one
+BUSY_LOOP = "import time\nend = time.process_time() + {seconds}\nwhile time.process_time() < end:\n    pass\n"
+
+class NoTranscriptionCache:
+    """Dream DB stand-in so every simulated job goes to the fake Whisper."""
+
+    def get_cached_transcription(self, audio_hash, model):
+        return None
+
+    def save_transcription(self, audio_hash, model, text):
+        pass
+
+class FakePostProcessing:
+    """Replaces the video post-processing functions with CPU-bound subprocesses and counts overlap."""
+
+    def __init__(self, video_seconds, thumb_seconds):
+        self.video_seconds = video_seconds
+        self.thumb_seconds = thumb_seconds
+        self.running = 0
+        self.peak = 0
+
+    def _burn(self, seconds):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            subprocess.run([sys.executable, '-c', BUSY_LOOP.format(seconds=seconds)], check=True)
+        finally:
+            self.running -= 1
+
+    def process_video(self, input_path, logger=None):
+        self._burn(self.video_seconds)
+        return input_path
+
+    def process_thumbnail(self, video_path, logger=None):
+        self._burn(self.thumb_seconds)
+        return 'thumb.png'
+
+    def process_video_and_thumbnail(self, input_path, logger=None):
+        # The thumbnail reuses the video's decoded frames
+        self._burn(self.video_seconds)
+        return 'thumb.png'
+
+def simulated_job(owner, index, payload):
+    """Run one dream through transcription, prompting, generation, download and post-processing."""
+    set_job_context(owner, index)
+    text = audio.transcribe_recording('benchmark.wav', payload, f"hash-{index}", NoTranscriptionCache(), {})
+    prompt = audio.generate_video_prompt(text)
+    video.generate_video(prompt, filename=f"benchmark_{index}.mp4", job=PipelineJob())
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+@contextmanager
+def fake_pipeline(app, post, config_updates=None):
+    """Point the pipeline at a fake provider `app` with simulated post-processing, restoring everything after."""
+    server, base_url = start_server(app)
+    saved = (audio.client, audio.scheduler, video.scheduler, video.process_video, video.process_thumbnail,
+             video.process_video_and_thumbnail, generation_times.samples, video.tracker)
+    config = get_config()
+    saved_config = dict(config)
+    try:
+        with tempfile.TemporaryDirectory() as media_dir:
+            overrides = provider_config(base_url)
+            audio.client = OpenAI(api_key='fake', base_url=overrides.pop('OPENAI_BASE_URL'), max_retries=0,
+                                  http_client=openai_http_client())
+            config.update(overrides)
+            config.update({
+                'VIDEOS_DIR': media_dir,
+                'LUMA_EXTEND': False,
+                'AUDIO_VAD_ENABLED': False,
+                'WHISPER_UPLOAD_FORMAT': 'original',
+            })
+            config.update(config_updates or {})
+            audio.scheduler = video.scheduler = PipelineScheduler()
+            # Each run learns Luma render times from scratch
+            generation_times.samples = {}
+            video.tracker = video.GenerationTracker()
+            video.process_video = post.process_video
+            video.process_thumbnail = post.process_thumbnail
+            video.process_video_and_thumbnail = post.process_video_and_thumbnail
+            yield base_url
+    finally:
+        (audio.client, audio.scheduler, video.scheduler, video.process_video, video.process_thumbnail,
+         video.process_video_and_thumbnail, generation_times.samples, video.tracker) = saved
+        config.clear()
+        config.update(saved_config)
+        server.stop()
+
+def run(jobs=12, limited=True, render_seconds=3.0, ffmpeg_seconds=1.0, late_delay=0.5, latency=None, batch=True):
+    """Run `jobs` dreams from one busy session plus one from a session that arrives `late_delay` later.
+
+    Returns latency percentiles, the late session's latency, the peak
+    number of concurrent requests each fake provider saw and the number of
+    Luma status requests (LUMA_POLL_BATCH is set from `batch`).
+    """
+    app = create_app(latency, render_seconds)
+    post = FakePostProcessing(ffmpeg_seconds, ffmpeg_seconds / 4)
+    config_updates = {'LUMA_POLL_INTERVAL': min(0.5, render_seconds / 4), 'LUMA_POLL_BATCH': batch}
+    for stage in STAGE_LIMITS:
+        key = f"PIPELINE_{stage.upper()}_CONCURRENCY"
+        config_updates[key] = get_config().get(key, STAGE_LIMITS[stage]) if limited else 0
+    with fake_pipeline(app, post, config_updates):
+        payload = bytes(48000)  # about 8 s of 48 kbps Opus
+        latencies = {}
+
+        def timed(owner, index, delay=0.0):
+            gevent.sleep(delay)
+            start = time.perf_counter()
+            simulated_job(owner, index, payload)
+            latencies[(owner, index)] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        greenlets = [gevent.spawn(timed, 'busy', i) for i in range(jobs)]
+        greenlets.append(gevent.spawn(timed, 'late', jobs, late_delay))
+        gevent.joinall(greenlets, raise_error=True)
+        wall = time.perf_counter() - start
+    busy = [v for (owner, _), v in latencies.items() if owner == 'busy']
+    peak = dict(app.stats.peak, ffmpeg=post.peak)
+    return {
+        'wall_seconds': wall,
+        'p50': percentile(busy, 50),
+        'p95': percentile(busy, 95),
+        'late': latencies[('late', jobs)],
+        'peak': peak,
+        'status_requests': app.stats.calls.get('luma_poll', 0) + app.stats.calls.get('luma_list', 0),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Run simulated dreams against fake providers with and without stage limits')
+    parser.add_argument('--jobs', type=int, default=12, help='Dreams queued at once by one session')
+    parser.add_argument('--render-seconds', type=float, default=3.0, help='Time for a fake Luma generation to complete')
+    parser.add_argument('--ffmpeg-seconds', type=float, default=1.0, help='CPU seconds per simulated video encode')
+    parser.add_argument('--no-batch', action='store_true', help='Check each generation on its own (LUMA_POLL_BATCH off)')
+    args = parser.parse_args()
+    print(f"{args.jobs} dreams from one session, then 1 from another; {os.cpu_count()} CPUs")
+    stages = list(STAGE_LIMITS)
+    print(f"{'mode':<10}{'wall s':>8}{'p50 s':>8}{'p95 s':>8}{'late s':>8}{'Luma checks':>13}"
+          f"  peak in flight ({', '.join(stages)})")
+    for limited in (False, True):
+        r = run(args.jobs, limited, args.render_seconds, args.ffmpeg_seconds, batch=not args.no_batch)
+        peaks = ' '.join(str(r['peak'].get(stage, 0)) for stage in stages)
+        print(f"{'limited' if limited else 'unlimited':<10}{r['wall_seconds']:>8.1f}{r['p50']:>8.1f}"
+              f"{r['p95']:>8.1f}{r['late']:>8.1f}{r['status_requests']:>13}  {peaks}")
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import random
+import argparse
+
+from contextlib import contextmanager
+
+# Ensure parent directory is in sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from functions.config_loader import get_config
+from functions.polling import GenerationTimes, next_poll_delay
+from functions.timing import percentile
+
+KEY = ('benchmark', '5s', '540p', False)
+
+@contextmanager
+def poll_config(interval, adaptive):
+    """Temporarily set the polling config, restoring it after."""
+    config = get_config()
+    saved = dict(config)
+    config.update({'LUMA_POLL_INTERVAL': interval, 'LUMA_POLL_ADAPTIVE': adaptive})
+    try:
+        yield
+    finally:
+        config.clear()
+        config.update(saved)
+
+def simulate(render_seconds, window):
+    """Poll a generation that renders in `render_seconds` the way the GenerationTracker does.
+
+    Returns (status checks, seconds between finishing and being seen finished,
+    render time the tracker would record).
+    """
+    elapsed = next_poll_delay(0, window) if window else 0
+    last_pending = 0
+    polls = 0
+    while True:
+        polls += 1
+        if elapsed >= render_seconds:
+            return polls, elapsed - render_seconds, (last_pending + elapsed) / 2
+        last_pending = elapsed
+        elapsed += next_poll_delay(elapsed, window)
+
+def run(dreams=200, mean=45.0, spread=8.0, interval=5.0, seed=1):
+    """Poll `dreams` simulated generations with the fixed interval and with learned polling."""
+    rng = random.Random(seed)
+    renders = [max(5.0, rng.gauss(mean, spread)) for _ in range(dreams)]
+    results = {}
+    for adaptive in (False, True):
+        history = GenerationTimes()
+        polls, lags = [], []
+        with poll_config(interval, adaptive):
+            for render_seconds in renders:
+                count, lag, recorded = simulate(render_seconds, history.window(KEY))
+                history.record(KEY, recorded)
+                polls.append(count)
+                lags.append(lag)
+        lags.sort()
+        results[adaptive] = {
+            'polls': sum(polls) / len(polls),
+            'lag_mean': sum(lags) / len(lags),
+            'lag_p95': percentile(lags, 95),
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare fixed-interval and learned polling of Luma generations')
+    parser.add_argument('--dreams', type=int, default=200)
+    parser.add_argument('--mean', type=float, default=45.0, help='Mean render time in seconds')
+    parser.add_argument('--spread', type=float, default=8.0, help='Standard deviation of render times')
+    parser.add_argument('--interval', type=float, default=5.0, help='LUMA_POLL_INTERVAL')
+    args = parser.parse_args()
+    results = run(args.dreams, args.mean, args.spread, args.interval)
+    print(f"{'polling':<10}{'checks/dream':>14}{'lag mean s':>12}{'lag p95 s':>11}")
+    for adaptive, r in results.items():
+        print(f"{'learned' if adaptive else 'fixed':<10}{r['polls']:>14.1f}{r['lag_mean']:>12.2f}{r['lag_p95']:>11.2f}")
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
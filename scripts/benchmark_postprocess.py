@@ -0,0 +1,157 @@
+import os
+import re
+import sys
+import glob
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+import ffmpeg
+
+from contextlib import contextmanager
+
+# Ensure parent directory is in sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from functions import video
+from functions.config_loader import get_config
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'dream_samples')
+
+def sample_clips():
+    return sorted(glob.glob(os.path.join(SAMPLES_DIR, '*.mp4')))
+
+def synthetic_clip(path, seconds=5, size='1280x720', rate=24):
+    """Write a test-pattern MP4 about the size of a Luma clip, for when there are no sample clips."""
+    stream = ffmpeg.input(f"testsrc2=size={size}:rate={rate}:duration={seconds}", f='lavfi')
+    stream = ffmpeg.output(stream, path, vcodec='libx264', pix_fmt='yuv420p')
+    ffmpeg.run(stream, overwrite_output=True, quiet=True)
+    return path
+
+def child_cpu_seconds():
+    """User plus system CPU seconds of finished child processes (the ffmpeg runs)."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def two_step(path):
+    video.process_video(path)
+    return video.process_thumbnail(path)
+
+def single_pass(path):
+    return video.process_video_and_thumbnail(path)
+
+MODES = {'two-step': two_step, 'single-pass': single_pass}
+
+@contextmanager
+def thumbs_in(directory):
+    """Temporarily write thumbnails to `directory`, restoring the config after."""
+    config = get_config()
+    saved = dict(config)
+    config['THUMBS_DIR'] = directory
+    try:
+        yield
+    finally:
+        config.clear()
+        config.update(saved)
+
+def run(clips, repeat=3, modes=MODES):
+    """Post-process copies of `clips` `repeat` times per mode; mean wall and ffmpeg CPU seconds per clip."""
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir, thumbs_in(work_dir):
+        for mode, process in modes.items():
+            wall = cpu = 0.0
+            for _ in range(repeat):
+                for clip in clips:
+                    path = os.path.join(work_dir, 'clip.mp4')
+                    shutil.copyfile(clip, path)
+                    start, start_cpu = time.perf_counter(), child_cpu_seconds()
+                    process(path)
+                    wall += time.perf_counter() - start
+                    cpu += child_cpu_seconds() - start_cpu
+            runs = repeat * len(clips)
+            results[mode] = {'wall': wall / runs, 'cpu': cpu / runs}
+    return results
+
+def run_ffmpeg(stream):
+    """Run an ffmpeg command; returns wall seconds, CPU seconds and peak RSS in bytes of that process alone."""
+    args = ffmpeg.compile(stream, overwrite_output=True)
+    start = time.perf_counter()
+    process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with {process.returncode}: {' '.join(args)}")
+    # ru_maxrss is in kilobytes on Linux
+    return wall, usage.ru_utime + usage.ru_stime, usage.ru_maxrss * 1024
+
+def frame_count(path):
+    info = next(s for s in ffmpeg.probe(path)['streams'] if s['codec_type'] == 'video')
+    if info.get('nb_frames'):
+        return int(info['nb_frames'])
+    num, den = info['avg_frame_rate'].split('/')
+    return round(float(info['duration']) * int(num) / int(den))
+
+def quality(path, reference):
+    """(SSIM, PSNR in dB) of `path` against `reference`."""
+    scores = []
+    for metric, pattern in (('ssim', r'All:([\d.]+)'), ('psnr', r'average:([\d.]+|inf)')):
+        stream = ffmpeg.filter([ffmpeg.input(path), ffmpeg.input(reference)], metric)
+        _, err = ffmpeg.run(ffmpeg.output(stream, '-', format='null'), capture_stderr=True)
+        scores.append(float(re.findall(pattern, err.decode())[-1]))
+    return tuple(scores)
+
+def run_presets(clips, presets=tuple(video.FFMPEG_PRESETS), reference='full'):
+    """Post-process every clip with each FFMPEG_PRESET and score it against the `reference` preset.
+
+    Returns per preset: frames per second, CPU seconds and peak RSS per
+    clip, and the mean SSIM and PSNR.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        outputs = {}
+        for preset in (reference,) + tuple(p for p in presets if p != reference):
+            frames = wall = cpu = peak = 0
+            for index, clip in enumerate(clips):
+                output = os.path.join(work_dir, f"{preset}_{index}.mp4")
+                outputs[preset, index] = output
+                clip_wall, clip_cpu, clip_peak = run_ffmpeg(video.filtered_output(ffmpeg.input(clip), output, preset))
+                frames += frame_count(clip)
+                wall += clip_wall
+                cpu += clip_cpu
+                peak = max(peak, clip_peak)
+            scores = [quality(outputs[preset, i], outputs[reference, i]) for i in range(len(clips))]
+            results[preset] = {
+                'fps': frames / wall if wall else 0.0,
+                'cpu': cpu / len(clips),
+                'peak_rss': peak,
+                'ssim': sum(s[0] for s in scores) / len(scores),
+                'psnr': sum(s[1] for s in scores) / len(scores),
+            }
+    return {preset: results[preset] for preset in presets if preset in results}
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the cost of video post-processing paths and presets')
+    parser.add_argument('clips', nargs='*', help='MP4 clips (default: dream_samples/*.mp4, or a synthetic clip)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--presets', action='store_true', help='Compare the FFMPEG_PRESET presets instead')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as clip_dir:
+        clips = args.clips or sample_clips() or [synthetic_clip(os.path.join(clip_dir, 'synthetic.mp4'))]
+        if args.presets:
+            results = run_presets(clips)
+        else:
+            results = run(clips, args.repeat)
+    if args.presets:
+        print(f"{'preset':<12}{'fps':>8}{'cpu s':>9}{'peak MB':>9}{'SSIM':>8}{'PSNR dB':>9}")
+        for preset, r in results.items():
+            print(f"{preset:<12}{r['fps']:>8.1f}{r['cpu']:>9.2f}{r['peak_rss'] / 1e6:>9.1f}{r['ssim']:>8.4f}{r['psnr']:>9.2f}")
+        return
+    print(f"{'mode':<12}{'wall s':>9}{'cpu s':>9}")
+    for mode, r in results.items():
+        print(f"{mode:<12}{r['wall']:>9.2f}{r['cpu']:>9.2f}")
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,117 @@
+from gevent import monkey
+monkey.patch_all()
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import gevent
+
+# Ensure parent directory is in sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from functions import audio, video
+from functions.jobs import PipelineJob
+from functions.recording import RecordingSpool
+from functions.speculative import SpeculativeGeneration
+from scripts.benchmark_pipeline import FakePostProcessing, NoTranscriptionCache, fake_pipeline
+from scripts.fake_providers import create_app, start_server
+
+DREAM_WORDS = ('I was walking through a forest where the trees were made of glass and every step '
+               'rang like a bell until the sky turned into the sea').split()
+WORDS_PER_SECOND = 2.5
+
+# Simulated recording: voiced and silent bytes stand in for speech and pauses
+BYTES_PER_SECOND = 16000
+CHUNK_SECONDS = 0.1
+VOICED, SILENT = b'v', b'.'
+
+# (speaking, seconds) segments of each simulated recording
+SCENARIOS = {
+    # Tells the dream in one go, then pauses before pressing stop
+    'steady': [(True, 10.0), (False, 3.0)],
+    # Pauses mid-dream, so the first speculative generation has to be cancelled
+    'long-pause': [(True, 4.0), (False, 4.0), (True, 6.0), (False, 3.0)],
+}
+
+def fake_transcribe(data):
+    """Transcript of a simulated recording: the words spoken in its voiced bytes."""
+    words = int(data.count(VOICED) / BYTES_PER_SECOND * WORDS_PER_SECOND)
+    return ' '.join(DREAM_WORDS[:words])
+
+def record(spool, segments):
+    """Write a simulated recording into `spool` in real time."""
+    chunk_bytes = int(BYTES_PER_SECOND * CHUNK_SECONDS)
+    for speaking, seconds in segments:
+        chunk = (VOICED if speaking else SILENT) * chunk_bytes
+        for _ in range(int(round(seconds / CHUNK_SECONDS))):
+            spool.write(chunk)
+            gevent.sleep(CHUNK_SECONDS)
+
+def run_once(segments, speculative, render_seconds=10.0, interval=1.0, partial_latency=0.3, ffmpeg_seconds=0.5,
+             latency=None):
+    """Record `segments`, then process the recording; returns time-to-video and Luma usage.
+
+    Partial transcripts come from a second fake server standing in for a
+    local Whisper (SPECULATIVE_WHISPER_BASE_URL) that answers in
+    `partial_latency` seconds.
+    """
+    app = create_app(latency, render_seconds, transcribe=fake_transcribe)
+    local_whisper = create_app({'whisper': partial_latency}, transcribe=fake_transcribe)
+    local_server, local_url = start_server(local_whisper)
+    post = FakePostProcessing(ffmpeg_seconds, ffmpeg_seconds / 4)
+    config_updates = {
+        'LUMA_POLL_INTERVAL': min(0.5, render_seconds / 4),
+        'SPECULATIVE_INTERVAL_SECONDS': interval,
+        'SPECULATIVE_WHISPER_BASE_URL': f"{local_url}/v1",
+    }
+    try:
+        with fake_pipeline(app, post, config_updates), tempfile.TemporaryDirectory() as spool_dir:
+            spool = RecordingSpool(directory=spool_dir, preallocate=0, max_bytes=0, max_seconds=0)
+            speculation = SpeculativeGeneration(spool, owner='benchmark').start() if speculative else None
+            record(spool, segments)
+            stopped = time.perf_counter()
+            # The same order as process_audio: final transcript, then adopt or cancel the speculation
+            if speculation is not None:
+                speculation.stop()
+            job = PipelineJob()
+            text = audio.transcribe_recording('benchmark.wav', spool.snapshot(), 'benchmark', NoTranscriptionCache(), {})
+            adopted = speculation.resolve(job, text) if speculation is not None else False
+            video_prompt = job.data.get('video_prompt') or audio.generate_video_prompt(text)
+            video.generate_video(video_prompt, filename='benchmark.mp4', job=job)
+            time_to_video = time.perf_counter() - stopped
+            spool.discard()
+    finally:
+        local_server.stop()
+    return {
+        'time_to_video': time_to_video,
+        'adopted': adopted,
+        'generations': app.stats.calls.get('luma_create', 0),
+        'cancelled': app.stats.calls.get('luma_delete', 0),
+        'partials': local_whisper.stats.calls.get('whisper', 0),
+    }
+
+def run(scenarios=SCENARIOS, render_seconds=10.0, interval=1.0, partial_latency=0.3, latency=None):
+    """Run each scenario through the serial and the speculative path."""
+    results = {}
+    for name, segments in scenarios.items():
+        for speculative in (False, True):
+            results[(name, speculative)] = run_once(segments, speculative, render_seconds, interval, partial_latency,
+                                                    latency=latency)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare time-to-video of the serial and the speculative pipeline')
+    parser.add_argument('--render-seconds', type=float, default=10.0, help='Time for a fake Luma generation to complete')
+    parser.add_argument('--interval', type=float, default=1.0, help='SPECULATIVE_INTERVAL_SECONDS')
+    parser.add_argument('--partial-latency', type=float, default=0.3, help='Response time of the local Whisper stand-in')
+    args = parser.parse_args()
+    results = run(render_seconds=args.render_seconds, interval=args.interval, partial_latency=args.partial_latency)
+    print(f"{'scenario':<12}{'mode':<13}{'time-to-video s':>16}{'adopted':>9}{'Luma creates':>14}{'cancelled':>11}{'partials':>10}")
+    for (name, speculative), r in results.items():
+        print(f"{name:<12}{'speculative' if speculative else 'serial':<13}{r['time_to_video']:>16.1f}"
+              f"{'yes' if r['adopted'] else 'no':>9}{r['generations']:>14}{r['cancelled']:>11}{r['partials']:>10}")
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+# Ensure parent directory is in sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from functions.vad import trim_silence
+
+SAMPLE_RATE = 44100
+
+def noise(seconds, level_db, rng, sample_rate=SAMPLE_RATE):
+    """Background noise at the given level in dBFS."""
+    return (rng.standard_normal(int(seconds * sample_rate)) * 32767 * 10 ** (level_db / 20)).astype(np.int16)
+
+def speech(seconds, rng, sample_rate=SAMPLE_RATE):
+    """A syllable-rate modulated harmonic tone standing in for speech."""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 140 + 40 * np.sin(2 * np.pi * 0.5 * t)
+    voice = np.sin(2 * np.pi * np.cumsum(pitch) / sample_rate) + 0.3 * np.sin(4 * np.pi * np.cumsum(pitch) / sample_rate)
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0.05, 1.0)
+    signal = voice * envelope * 0.25 + rng.standard_normal(len(t)) * 10 ** (-65 / 20)
+    return (signal * 32767).astype(np.int16)
+
+def make_recording(lead_seconds, speech_seconds, pause_seconds, tail_seconds, segments=2, seed=0):
+    """Silence, then `segments` stretches of speech separated by pauses, then silence."""
+    rng = np.random.default_rng(seed)
+    parts = [noise(lead_seconds, -65, rng)]
+    for i in range(segments):
+        if i:
+            parts.append(noise(pause_seconds, -65, rng))
+        parts.append(speech(speech_seconds, rng))
+    parts.append(noise(tail_seconds, -65, rng))
+    return np.concatenate(parts)
+
+def run(scenarios, repeat=3):
+    results = []
+    for name, samples in scenarios:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            trimmed, removed_seconds = trim_silence(samples, SAMPLE_RATE)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        duration = len(samples) / SAMPLE_RATE
+        results.append({
+            'name': name,
+            'duration': duration,
+            'kept': len(trimmed) / SAMPLE_RATE,
+            'removed': removed_seconds,
+            'seconds': best,
+            'realtime_factor': duration / best,
+        })
+    return results
+
+def default_scenarios():
+    return [
+        ('short, held button', make_recording(4, 6, 2, 4)),
+        ('long pauses', make_recording(2, 10, 8, 2, segments=4)),
+        ('10 minutes', make_recording(5, 55, 5, 5, segments=10)),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark voice activity trimming on synthetic PCM')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs per scenario (best is reported)')
+    args = parser.parse_args()
+    print(f"{'scenario':<20}{'length s':>10}{'kept s':>10}{'removed s':>11}{'time ms':>10}{'x realtime':>12}")
+    for r in run(default_scenarios(), args.repeat):
+        print(f"{r['name']:<20}{r['duration']:>10.1f}{r['kept']:>10.1f}{r['removed']:>11.1f}"
+              f"{r['seconds'] * 1000:>10.1f}{r['realtime_factor']:>12.0f}")
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import argparse
+import ffmpeg
+import numpy as np
+
+# Ensure parent directory is in sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from functions.audio import UPLOAD_FORMATS, encode_pcm_for_upload
+from scripts.benchmark_vad import SAMPLE_RATE, make_recording
+
+# Uplink speeds in Mbit/s, from a congested home Wi-Fi to a decent one
+LINK_SPEEDS_MBPS = (0.5, 1, 2, 5)
+
+# Bitrate of the WebM/Opus stream recorded by static/js/recorder.js
+BROWSER_BITRATE = '128k'
+
+def browser_recording(samples, sample_rate=SAMPLE_RATE):
+    """Encode PCM the way the browser's MediaRecorder would, giving the 'original' upload."""
+    stream = ffmpeg.input('pipe:0', format='s16le', ar=sample_rate, ac=1)
+    stream = ffmpeg.output(stream, 'pipe:1', format='webm', acodec='libopus', audio_bitrate=BROWSER_BITRATE)
+    out, _ = ffmpeg.run(stream, input=samples.tobytes(), capture_stdout=True, quiet=True)
+    return out
+
+def load_samples(path, sample_rate=SAMPLE_RATE):
+    """Decode any audio file ffmpeg can read to 16-bit mono PCM."""
+    stream = ffmpeg.input(path)
+    stream = ffmpeg.output(stream, 'pipe:1', format='s16le', acodec='pcm_s16le', ac=1, ar=sample_rate)
+    out, _ = ffmpeg.run(stream, capture_stdout=True, quiet=True)
+    return np.frombuffer(out, dtype=np.int16)
+
+def upload_seconds(size, mbps):
+    return size * 8 / (mbps * 1e6)
+
+def run(samples, sample_rate=SAMPLE_RATE, link_speeds=LINK_SPEEDS_MBPS, repeat=3):
+    original = browser_recording(samples, sample_rate)
+    results = [{'format': 'original', 'bytes': len(original), 'encode_seconds': 0.0, 'upload': ('recording.webm', original)}]
+    for fmt in UPLOAD_FORMATS:
+        if fmt == 'original':
+            continue
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            upload = encode_pcm_for_upload(samples, sample_rate, fmt)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results.append({'format': fmt, 'bytes': len(upload[1]), 'encode_seconds': best, 'upload': upload})
+    for r in results:
+        r['saved_bytes'] = len(original) - r['bytes']
+        # Time from stop to the upload finishing: encoding plus transfer
+        r['total_seconds'] = {mbps: r['encode_seconds'] + upload_seconds(r['bytes'], mbps) for mbps in link_speeds}
+        r['latency_saved'] = {mbps: upload_seconds(len(original), mbps) - r['total_seconds'][mbps] for mbps in link_speeds}
+    return results
+
+def transcribe(results):
+    """Send every upload to Whisper so the transcripts can be compared by eye."""
+    from functions.audio import client
+    from functions.config_loader import get_config
+    for r in results:
+        text = client.audio.transcriptions.create(model=get_config()['WHISPER_MODEL'], file=r['upload']).text
+        print(f"[{r['format']}] {text}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare Whisper upload size and upload time for each WHISPER_UPLOAD_FORMAT')
+    parser.add_argument('--input', help='Audio file to use (default: 60 s of synthetic speech)')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of encodes per format (best is reported)')
+    parser.add_argument('--transcribe', action='store_true', help='Also transcribe every upload with Whisper (uses the OpenAI API)')
+    args = parser.parse_args()
+    samples = load_samples(args.input) if args.input else make_recording(2, 12, 2, 2, segments=4)
+    results = run(samples, repeat=args.repeat)
+    print(f"Recording: {len(samples) / SAMPLE_RATE:.1f} s; upload + encode time in seconds at each uplink speed")
+    header = ''.join(f"{f'{mbps:g} Mbps':>11}" for mbps in LINK_SPEEDS_MBPS)
+    print(f"{'format':<10}{'bytes':>10}{'saved':>8}{'encode ms':>11}{header}")
+    for r in results:
+        saved = r['saved_bytes'] / results[0]['bytes'] * 100
+        times = ''.join(f"{r['total_seconds'][mbps]:>11.2f}" for mbps in LINK_SPEEDS_MBPS)
+        print(f"{r['format']:<10}{r['bytes']:>10}{saved:>7.0f}%{r['encode_seconds'] * 1000:>11.1f}{times}")
+    if args.transcribe:
+        transcribe(results)
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
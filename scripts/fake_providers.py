@@ -0,0 +1,191 @@
+import os
+import sys
+import time
+import uuid
+import argparse
+import gevent
+import requests
+
+from contextlib import contextmanager
+from flask import Flask, Response, jsonify, request
+from gevent.pywsgi import WSGIServer
+
+# Ensure parent directory is in sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Seconds each fake endpoint takes to answer, roughly what the real APIs take
+DEFAULT_LATENCY = {
+    'whisper': 1.5,
+    'gpt': 1.0,
+    'luma_create': 0.5,
+    'luma_poll': 0.2,
+    'download': 1.0,
+}
+
+DEFAULT_TRANSCRIPT = 'I was flying over a city made of glass and the streets were rivers.'
+
+DOWNLOAD_CHUNK = 65536
+
+class ProviderStats:
+    """Request counts and peak concurrency of each fake endpoint."""
+
+    def __init__(self):
+        self.calls = {}
+        self.in_flight = {}
+        self.peak = {}
+
+    @contextmanager
+    def track(self, endpoint):
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        self.in_flight[endpoint] = self.in_flight.get(endpoint, 0) + 1
+        self.peak[endpoint] = max(self.peak.get(endpoint, 0), self.in_flight[endpoint])
+        try:
+            yield
+        finally:
+            self.in_flight[endpoint] -= 1
+
+def send_callbacks(app, callback_url, generation_id, host_url, render_seconds):
+    """Post a generation's states to its callback_url like Luma does: dreaming now, completed once rendered."""
+    states = [(0, {'id': generation_id, 'state': 'dreaming'})]
+    states.append((render_seconds, {
+        'id': generation_id,
+        'state': 'completed',
+        'assets': {'video': f"{host_url}videos/{generation_id}.mp4"}
+    }))
+    for delay, payload in states:
+        gevent.sleep(delay)
+        if generation_id not in app.generations:
+            return  # deleted
+        with app.stats.track('luma_callback'):
+            try:
+                requests.post(callback_url, json=payload, timeout=5)
+            except requests.RequestException:
+                pass
+
+def create_app(latency=None, render_seconds=5.0, video_bytes=2097152, stats=None, transcribe=None, callbacks=True):
+    """Flask app answering the OpenAI and Luma requests the pipeline makes.
+
+    Handlers sleep with gevent, so one process can hold many slow requests open
+    at once, like the real providers. Luma generations complete
+    `render_seconds` after they are created. `transcribe(audio_bytes)` can
+    return the transcript for an upload; by default every upload gets the
+    same one. With `callbacks`, a generation created with a `callback_url`
+    also has its states posted there.
+    """
+    latency = dict(DEFAULT_LATENCY, **(latency or {}))
+    app = Flask(__name__)
+    app.stats = stats or ProviderStats()
+    generations = app.generations = {}
+
+    @app.route('/v1/audio/transcriptions', methods=['POST'])
+    def transcriptions():
+        with app.stats.track('whisper'):
+            upload = request.files.get('file')
+            data = upload.read() if upload else b''
+            gevent.sleep(latency['whisper'])
+            return jsonify({'text': transcribe(data) if transcribe else DEFAULT_TRANSCRIPT})
+
+    @app.route('/v1/chat/completions', methods=['POST'])
+    def chat_completions():
+        with app.stats.track('gpt'):
+            gevent.sleep(latency['gpt'])
+            return jsonify({
+                'id': f"chatcmpl-{uuid.uuid4().hex}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': request.get_json().get('model', 'gpt-4o-mini'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': 'A glass city seen from above, rivers for streets, dreamlike light.'},
+                    'finish_reason': 'stop'
+                }],
+                'usage': {'prompt_tokens': 50, 'completion_tokens': 20, 'total_tokens': 70}
+            })
+
+    @app.route('/dream-machine/v1/generations', methods=['POST'])
+    def create_generation():
+        with app.stats.track('luma_create'):
+            gevent.sleep(latency['luma_create'])
+            generation_id = str(uuid.uuid4())
+            generations[generation_id] = time.monotonic() + render_seconds
+            callback_url = (request.get_json(silent=True) or {}).get('callback_url')
+            if callbacks and callback_url:
+                gevent.spawn(send_callbacks, app, callback_url, generation_id, request.host_url, render_seconds)
+            return jsonify({'id': generation_id, 'state': 'queued'}), 201
+
+    @app.route('/dream-machine/v1/generations/<generation_id>', methods=['DELETE'])
+    def delete_generation(generation_id):
+        with app.stats.track('luma_delete'):
+            if generations.pop(generation_id, None) is None:
+                return jsonify({'detail': 'Generation not found'}), 404
+            return '', 204
+
+    def status(generation_id):
+        if time.monotonic() < generations[generation_id]:
+            return {'id': generation_id, 'state': 'dreaming'}
+        return {
+            'id': generation_id,
+            'state': 'completed',
+            'assets': {'video': f"{request.host_url}videos/{generation_id}.mp4"}
+        }
+
+    @app.route('/dream-machine/v1/generations')
+    def list_generations():
+        with app.stats.track('luma_list'):
+            gevent.sleep(latency['luma_poll'])
+            limit = request.args.get('limit', 10, type=int)
+            newest = list(reversed(generations))[:limit]
+            return jsonify({'generations': [status(g) for g in newest], 'count': len(newest)})
+
+    @app.route('/dream-machine/v1/generations/<generation_id>')
+    def get_generation(generation_id):
+        with app.stats.track('luma_poll'):
+            gevent.sleep(latency['luma_poll'])
+            if generation_id not in generations:
+                return jsonify({'detail': 'Generation not found'}), 404
+            return jsonify(status(generation_id))
+
+    @app.route('/videos/<generation_id>.mp4')
+    def download(generation_id):
+        chunks = max(1, video_bytes // DOWNLOAD_CHUNK)
+
+        def stream():
+            with app.stats.track('download'):
+                for _ in range(chunks):
+                    gevent.sleep(latency['download'] / chunks)
+                    yield bytes(DOWNLOAD_CHUNK)
+
+        return Response(stream(), mimetype='video/mp4', headers={'Content-Length': str(chunks * DOWNLOAD_CHUNK)})
+
+    return app
+
+def start_server(app, host='127.0.0.1', port=0):
+    """Serve `app` from a gevent server in the background; returns (server, base_url)."""
+    server = WSGIServer((host, port), app, log=None)
+    server.start()
+    return server, f"http://{host}:{server.server_port}"
+
+def provider_config(base_url):
+    """Config values that point the pipeline at a fake provider server."""
+    return {
+        'LUMA_API_URL': f"{base_url}/dream-machine/v1",
+        'LUMA_GENERATIONS_ENDPOINT': f"{base_url}/dream-machine/v1/generations",
+        'OPENAI_BASE_URL': f"{base_url}/v1",
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Run fake OpenAI and Luma APIs for local testing')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--render-seconds', type=float, default=5.0, help='Time for a Luma generation to complete')
+    parser.add_argument('--no-callbacks', action='store_true', help="Don't post generation states to callback_url")
+    args = parser.parse_args()
+    app = create_app(render_seconds=args.render_seconds, callbacks=not args.no_callbacks)
+    server, base_url = start_server(app, args.host, args.port)
+    print(f"Fake providers listening on {base_url}")
+    for key, value in provider_config(base_url).items():
+        print(f"  {key}={value}")
+    server.serve_forever()
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
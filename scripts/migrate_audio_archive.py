@@ -0,0 +1,69 @@
+import os
+import sys
+import argparse
+
+# Ensure parent directory is in sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from functions.config_loader import get_config
+from functions.dream_db import DreamDB
+from functions.audio import ARCHIVE_FORMATS, encode_audio_file
+
+def migrate(db, fmt, recordings_dir, dry_run=False):
+    """Re-encode every dream's WAV recording to `fmt` and point the dream at the new file.
+
+    Returns a list of (dream_id, wav_bytes, archive_bytes) for each migrated dream.
+    """
+    if fmt not in ARCHIVE_FORMATS or fmt == 'wav':
+        raise ValueError(f"Cannot migrate WAV recordings to format: {fmt}")
+    extension = ARCHIVE_FORMATS[fmt][0]
+    results = []
+    for dream in db.get_all_dreams():
+        wav_filename = dream.get('audio_filename')
+        if not wav_filename or not wav_filename.lower().endswith('.wav'):
+            continue
+        wav_path = os.path.join(recordings_dir, wav_filename)
+        if not os.path.exists(wav_path):
+            print(f"Dream {dream['id']}: {wav_filename} is missing, skipping")
+            continue
+        archive_filename = os.path.splitext(wav_filename)[0] + extension
+        archive_path = os.path.join(recordings_dir, archive_filename)
+        wav_bytes = os.path.getsize(wav_path)
+        if dry_run:
+            print(f"Dream {dream['id']}: would convert {wav_filename} ({wav_bytes} bytes) to {archive_filename}")
+            continue
+        encode_audio_file(wav_path, archive_path, fmt)
+        archive_bytes = os.path.getsize(archive_path)
+        db.update_dream(dream['id'], {'audio_filename': archive_filename})
+        os.remove(wav_path)
+        results.append((dream['id'], wav_bytes, archive_bytes))
+        print(f"Dream {dream['id']}: {wav_filename} -> {archive_filename}, "
+              f"{wav_bytes} -> {archive_bytes} bytes (saved {wav_bytes - archive_bytes})")
+    return results
+
+def print_summary(results):
+    if not results:
+        print("No WAV recordings migrated.")
+        return
+    wav_total = sum(r[1] for r in results)
+    archive_total = sum(r[2] for r in results)
+    saved = wav_total - archive_total
+    print(f"Migrated {len(results)} recordings: {wav_total} -> {archive_total} bytes, "
+          f"saved {saved} bytes ({saved // len(results)} per dream, {100 * saved / wav_total:.0f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert archived WAV recordings to a compressed format')
+    parser.add_argument('--format', default=None, choices=[f for f in ARCHIVE_FORMATS if f != 'wav'],
+                        help='Target format (default: AUDIO_ARCHIVE_FORMAT from the config)')
+    parser.add_argument('--dry-run', action='store_true', help='Only list the recordings that would be converted')
+    args = parser.parse_args()
+    fmt = args.format or str(get_config().get('AUDIO_ARCHIVE_FORMAT', 'wav')).lower()
+    if fmt == 'wav':
+        print("AUDIO_ARCHIVE_FORMAT is 'wav'; pass --format to choose a compressed format.")
+        sys.exit(1)
+    results = migrate(DreamDB(), fmt, get_config()['RECORDINGS_DIR'], dry_run=args.dry_run)
+    if not args.dry_run:
+        print_summary(results)
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import struct
+import argparse
+import ffmpeg
+
+# Ensure parent directory is in sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from functions.config_loader import get_config
+from functions.postprocess import executor
+from functions.video import FASTSTART
+
+def is_faststart(path):
+    """True if the MP4's index (moov box) comes before its media data (mdat box)."""
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return False
+            size, box = struct.unpack('>I4s', header)
+            if box == b'moov':
+                return True
+            if box == b'mdat':
+                return False
+            if size == 1:
+                size = struct.unpack('>Q', f.read(8))[0] - 8
+            elif size == 0:
+                return False  # Box runs to the end of the file
+            f.seek(size - 8, os.SEEK_CUR)
+
+def make_faststart(path):
+    """Rewrite an MP4 in place with its index first, copying the streams without re-encoding."""
+    temp_path = f"{path}.faststart"
+    stream = ffmpeg.output(ffmpeg.input(path), temp_path, format='mp4', c='copy', map=0, movflags=FASTSTART)
+    try:
+        executor.run(stream, 'faststart', overwrite_output=True, quiet=True)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def migrate(videos_dir, dry_run=False):
+    """Make every MP4 in `videos_dir` fast-start.
+
+    Returns a list of (filename, bytes, seconds) for each rewritten video.
+    """
+    results = []
+    for filename in sorted(os.listdir(videos_dir)):
+        path = os.path.join(videos_dir, filename)
+        if not filename.lower().endswith('.mp4') or not os.path.isfile(path):
+            continue
+        try:
+            if is_faststart(path):
+                continue
+        except (OSError, struct.error) as e:
+            print(f"{filename}: can't read MP4 boxes ({e}), skipping")
+            continue
+        size = os.path.getsize(path)
+        if dry_run:
+            print(f"{filename}: would rewrite {size} bytes")
+            continue
+        started = time.perf_counter()
+        try:
+            make_faststart(path)
+        except ffmpeg.Error as e:
+            print(f"{filename}: ffmpeg failed, left as is: {e.stderr.decode(errors='replace').strip()[-200:]}")
+            continue
+        seconds = time.perf_counter() - started
+        results.append((filename, size, seconds))
+        print(f"{filename}: rewrote {size} bytes in {seconds:.2f}s")
+    return results
+
+def print_summary(results):
+    if not results:
+        print("No videos needed rewriting.")
+        return
+    total_bytes = sum(r[1] for r in results)
+    total_seconds = sum(r[2] for r in results)
+    print(f"Rewrote {len(results)} videos: {total_bytes} bytes read and written again in {total_seconds:.1f}s "
+          f"({total_bytes / 1e6 / total_seconds if total_seconds else 0:.1f} MB/s)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Rewrite existing videos as fast-start MP4s (stream copy, no re-encode)')
+    parser.add_argument('--dry-run', action='store_true', help='Only list the videos that would be rewritten')
+    args = parser.parse_args()
+    results = migrate(get_config()['VIDEOS_DIR'], dry_run=args.dry_run)
+    if not args.dry_run:
+        print_summary(results)
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
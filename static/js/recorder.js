@@ -97,14 +97,16 @@ window.startRecording = async function() {
             if (event.data.size > 0) {
                 // Convert blob to array buffer before sending
                 event.data.arrayBuffer().then(buffer => {
+                    // The ArrayBuffer is sent as a Socket.IO binary attachment,
+                    // not as a JSON list of ints
                     const audioData = {
-                        data: Array.from(new Uint8Array(buffer)),
+                        data: buffer,
                         timestamp: Date.now()
                     };
                     // Emit through the global socket object
                     if (window.socket) {
                         window.socket.emit('stream_recording', audioData);
-                        // console.log('Sent audio_data chunk, size:', audioData.data.length);
+                        // console.log('Sent audio_data chunk, size:', buffer.byteLength);
                     }
                 });
             }
@@ -1,5 +1,15 @@
+// A per-tab device id lets the server keep this tab's recording session across reconnects
+function getDeviceId() {
+    let deviceId = sessionStorage.getItem('deviceId');
+    if (!deviceId) {
+        deviceId = Math.random().toString(36).slice(2) + Date.now().toString(36);
+        sessionStorage.setItem('deviceId', deviceId);
+    }
+    return deviceId;
+}
+
 // Make socket and DOM elements available globally
-window.socket = io();
+window.socket = io({ auth: { device_id: getDeviceId() } });
 window.statusDiv = document.getElementById('status');
 window.messageDiv = document.getElementById('message');
 window.transcriptionDiv = document.getElementById('transcription');
@@ -90,7 +100,8 @@ window.socket.on('video_ready', (data) => {
     window.videoContainer.style.display = 'block';
     window.generatedVideo.src = data.url;
     window.loadingDiv.style.display = 'none';
-    window.messageDiv.textContent = 'Dream generation complete';
+    // Partial clips are previews of an extended dream; the finished video follows
+    window.messageDiv.textContent = data.partial ? 'Dream preview (still extending)' : 'Dream generation complete';
     
     if (window.StateManager) {
         window.StateManager.updateState(window.StateManager.STATES.PLAYBACK);
@@ -137,6 +148,15 @@ window.socket.on('error', (data) => {
     }
 });
 
+window.socket.on('recording_limit', (data) => {
+    console.log('Received recording_limit:', data);
+    // The server has already stopped the recording at its size/duration cap;
+    // stop the microphone so no more chunks are sent
+    if (window.stopRecording) {
+        window.stopRecording();
+    }
+});
+
 window.socket.on('recording_state', (data) => {
     console.log('Received recording_state:', data);
     if (window.StateManager) {
@@ -163,11 +183,20 @@ window.socket.on('device_event', (data) => {
     }
 });
 
+// Use the HLS playlist where the browser plays HLS itself (Safari, iOS), so it can pick a rendition.
+// The Pi's Chromium has no native HLS, so the device itself always plays the MP4.
+function playableUrl(data) {
+    if (data.hls_url && window.generatedVideo.canPlayType('application/vnd.apple.mpegurl')) {
+        return data.hls_url;
+    }
+    return data.video_url;
+}
+
 window.socket.on('play_video', (data) => {
     console.log('Received play_video:', data);
     if (data.video_url) {
         window.videoContainer.style.display = 'block';
-        window.generatedVideo.src = data.video_url;
+        window.generatedVideo.src = playableUrl(data);
         window.generatedVideo.loop = data.loop || false;
         window.loadingDiv.style.display = 'none';
         
@@ -17,4 +17,33 @@ def socketio_client():
 def mock_dream_db(monkeypatch):
     mock_db = MagicMock()
     monkeypatch.setattr('dream_recorder.dream_db', mock_db)
-    return mock_db 
\ No newline at end of file
+    return mock_db
+
+@pytest.fixture(autouse=True)
+def recordings_dir(monkeypatch, tmp_path):
+    """Keep recording spools written during tests out of the real media directory."""
+    from functions.config_loader import get_config
+    path = tmp_path / 'audio'
+    monkeypatch.setitem(get_config(), 'RECORDINGS_DIR', str(path))
+    # Socket tests should not spawn real ffmpeg processes
+    monkeypatch.setitem(get_config(), 'AUDIO_STREAMING_TRANSCODE', False)
+    return path
+
+@pytest.fixture(autouse=True)
+def generation_times(monkeypatch):
+    """Start every test without learned Luma render times, and don't save new ones to the real database."""
+    from functions.polling import generation_times
+    monkeypatch.setattr(generation_times, 'dream_db', None)
+    monkeypatch.setattr(generation_times, 'samples', {})
+    return generation_times
+
+@pytest.fixture(autouse=True)
+def generation_tracker(monkeypatch):
+    """Give every test its own generation tracker, and stop its poller afterwards."""
+    from functions import video
+    tracker = video.GenerationTracker()
+    monkeypatch.setattr(video, 'tracker', tracker)
+    monkeypatch.setattr('dream_recorder.tracker', tracker)
+    yield tracker
+    if tracker.poller is not None:
+        tracker.poller.kill()
@@ -118,6 +118,30 @@ def test_delete_dream_removes_files(test_client, mocker, mock_dream_db, tmp_path
     mock_remove.assert_any_call(str(audio))
     assert mock_remove.call_count == 3
 
+def test_dream_playlist(test_client, mock_dream_db, mocker):
+    mock_dream_db.get_dream.return_value = {'id': 1, 'video_filename': 'dream1.mp4'}
+    mocker.patch('dream_recorder.playlist_url', return_value='/media/hls/dream1/master.m3u8')
+    resp = test_client.get('/api/dreams/1/playlist')
+    assert resp.status_code == 302 and resp.headers['Location'].endswith('/media/hls/dream1/master.m3u8')
+    # Not packaged (yet): fall back to the MP4
+    mocker.patch('dream_recorder.playlist_url', return_value=None)
+    resp = test_client.get('/api/dreams/1/playlist')
+    assert resp.headers['Location'].endswith('/media/video/dream1.mp4')
+    mock_dream_db.get_dream.return_value = None
+    assert test_client.get('/api/dreams/2/playlist').status_code == 404
+
+def test_serve_hls(test_client, mocker, tmp_path):
+    (tmp_path / 'dream1').mkdir()
+    (tmp_path / 'dream1' / 'master.m3u8').write_text('#EXTM3U\n')
+    (tmp_path / 'dream1' / 'segment_000.ts').write_bytes(b'ts')
+    mocker.patch('dream_recorder.get_config', return_value={'HLS_DIR': str(tmp_path)})
+    resp = test_client.get('/media/hls/dream1/master.m3u8')
+    assert resp.status_code == 200 and resp.mimetype == 'application/vnd.apple.mpegurl'
+    assert resp.cache_control.no_cache
+    resp = test_client.get('/media/hls/dream1/segment_000.ts')
+    assert resp.mimetype == 'video/mp2t' and resp.data == b'ts'
+    assert test_client.get('/media/hls/dream1/missing.ts').status_code == 404
+
 def test_404_page(test_client):
     resp = test_client.get('/nonexistent')
     assert resp.status_code == 404
@@ -126,4 +150,96 @@ def test_notify_config_reload_multiple_clients(test_client, mocker):
     mock_emit = mocker.patch('dream_recorder.socketio.emit')
     resp = test_client.post('/api/notify_config_reload')
     assert resp.status_code == 200
-    mock_emit.assert_any_call('reload_config') 
\ No newline at end of file
+    mock_emit.assert_any_call('reload_config')
+
+def test_serve_audio(test_client, recordings_dir):
+    recordings_dir.mkdir(parents=True, exist_ok=True)
+    (recordings_dir / 'rec.ogg').write_bytes(b'ogg')
+    resp = test_client.get('/media/audio/rec.ogg')
+    assert resp.status_code == 200
+    assert resp.data == b'ogg'
+
+def test_serve_audio_playback_format(test_client, mocker, tmp_path):
+    cached = tmp_path / 'rec.m4a'
+    cached.write_bytes(b'aac')
+    mock_get = mocker.patch('dream_recorder.get_playback_file', return_value=str(cached))
+    resp = test_client.get('/media/audio/rec.ogg?format=m4a')
+    assert resp.status_code == 200
+    assert resp.data == b'aac'
+    assert mock_get.call_args[0][:2] == ('rec.ogg', 'm4a')
+
+def test_serve_audio_bad_format(test_client, mocker):
+    mocker.patch('dream_recorder.get_playback_file', side_effect=ValueError('Unknown playback format: mp3'))
+    resp = test_client.get('/media/audio/rec.ogg?format=mp3')
+    assert resp.status_code == 400
+
+def test_serve_audio_not_found(test_client):
+    resp = test_client.get('/media/audio/missing.ogg')
+    assert resp.status_code == 404
+
+def test_recording_stats(test_client, mocker):
+    mocker.patch.dict('dream_recorder.recording_stats', {'limits_reached': 2, 'dropped_chunks': 5})
+    session = mocker.Mock(is_busy=True, is_recording=True, state={'status': 'recording'})
+    session.spool = mocker.Mock(size=100, elapsed=2.0, max_bytes=1000, max_seconds=300)
+    mocker.patch.dict('dream_recorder.recording_sessions', {'kiosk': session}, clear=True)
+    resp = test_client.get('/api/recording_stats')
+    assert resp.status_code == 200
+    assert resp.get_json()['limits_reached'] == 2
+    assert resp.get_json()['sessions'] == {
+        'kiosk': {'status': 'recording', 'bytes': 100, 'seconds': 2.0, 'max_bytes': 1000, 'max_seconds': 300}
+    }
+
+def test_pipeline_snapshot(test_client):
+    resp = test_client.get('/api/pipeline')
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert set(data) == {'whisper', 'gpt', 'luma_create', 'luma_poll', 'download', 'ffmpeg'}
+    assert data['ffmpeg']['active'] == []
+
+def test_luma_generations(test_client, generation_tracker, mocker):
+    generation_tracker.generations['gen-1'] = mocker.Mock(id='gen-1', started=0, state='dreaming', checks=2,
+                                                          callback=False, due=0)
+    resp = test_client.get('/api/luma_generations')
+    assert resp.status_code == 200
+    [generation] = resp.get_json()
+    assert generation['id'] == 'gen-1' and generation['state'] == 'dreaming' and generation['checks'] == 2
+    assert generation['age'] > 0
+
+def test_postprocess_stats(test_client, mocker):
+    snapshot = mocker.patch('dream_recorder.executor.snapshot', return_value={'queue_depth': 1, 'running': [], 'recent': [], 'total_cpu_seconds': 3.5})
+    resp = test_client.get('/api/postprocess')
+    assert resp.status_code == 200
+    assert resp.get_json()['queue_depth'] == 1
+    assert snapshot.call_args.args[0].name == 'ffmpeg'
+
+def test_http_stats(test_client, mocker):
+    mocker.patch('dream_recorder.connection_stats', return_value={
+        'https://api.lumalabs.ai:443': {'requests': 4, 'connections': 1, 'reused': 3, 'reuse_ratio': 0.75}
+    })
+    resp = test_client.get('/api/http_stats')
+    assert resp.status_code == 200
+    assert resp.get_json()['https://api.lumalabs.ai:443']['reused'] == 3
+
+def test_luma_callback(test_client, mocker):
+    mocker.patch('dream_recorder.valid_secret', side_effect=lambda secret: secret == 's3cret')
+    deliver = mocker.patch('dream_recorder.tracker.deliver', return_value=True)
+    assert test_client.post('/api/luma_callback/guess', json={'id': 'gen-1'}).status_code == 403
+    assert test_client.post('/api/luma_callback/s3cret', json={'state': 'completed'}).status_code == 400
+    resp = test_client.post('/api/luma_callback/s3cret', json={'id': 'gen-1', 'state': 'completed'})
+    assert resp.status_code == 200
+    assert resp.get_json()['delivered'] is True
+    deliver.assert_called_once_with({'id': 'gen-1', 'state': 'completed'})
+
+def test_stage_timings(test_client, mock_dream_db):
+    mock_dream_db.get_stage_durations.return_value = [('whisper', 1.0), ('whisper', 3.0)]
+    resp = test_client.get('/api/stage_timings?limit=50')
+    assert resp.status_code == 200
+    assert resp.get_json()['whisper']['p50'] == 1.0
+    mock_dream_db.get_stage_durations.assert_called_once_with(50)
+
+def test_dream_timings(test_client, mock_dream_db):
+    mock_dream_db.get_stage_timings.return_value = [{'stage': 'gpt', 'seconds': 0.5, 'ok': 1}]
+    resp = test_client.get('/api/dreams/3/timings')
+    assert resp.get_json() == [{'stage': 'gpt', 'seconds': 0.5, 'ok': 1}]
+    mock_dream_db.get_stage_timings.side_effect = Exception('db error')
+    assert test_client.get('/api/dreams/3/timings').status_code == 500
@@ -1,5 +1,6 @@
 import io
 import os
+import re
 import tempfile
 import pytest
 from unittest import mock
@@ -26,6 +27,13 @@ def mock_config(monkeypatch):
 def mock_logger():
     return mock.Mock()
 
+def make_fake_db():
+    """A mock DreamDB with an empty transcription cache and no earlier dreams."""
+    fake_db = mock.Mock()
+    fake_db.get_cached_transcription.return_value = None
+    fake_db.find_dreams_by_audio_hash.return_value = []
+    return fake_db
+
 def test_create_wav_file(mock_config):
     buf = io.BytesIO()
     wav = audio.create_wav_file(buf)
@@ -80,7 +88,7 @@ def test_process_audio_no_sid(monkeypatch, mock_config, mock_logger):
     monkeypatch.setattr(audio.client.audio.transcriptions, 'create', lambda **kwargs: fake_transcription)
     monkeypatch.setattr(audio, 'generate_video_prompt', lambda *a, **k: 'video prompt')
     monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: ('video.mp4', 'thumb.png'))
-    fake_db = mock.Mock()
+    fake_db = make_fake_db()
     fake_socketio = mock.Mock()
     recording_state = {}
     audio_chunks = [b'audio']
@@ -95,7 +103,7 @@ def test_process_audio_finally_cleanup(monkeypatch, mock_config, mock_logger):
     monkeypatch.setattr(audio.client.audio.transcriptions, 'create', lambda **kwargs: fake_transcription)
     monkeypatch.setattr(audio, 'generate_video_prompt', lambda *a, **k: 'video prompt')
     monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: ('video.mp4', 'thumb.png'))
-    fake_db = mock.Mock()
+    fake_db = make_fake_db()
     fake_socketio = mock.Mock()
     recording_state = {}
     audio_chunks = [b'audio']
@@ -123,7 +131,7 @@ def test_process_audio_finally_cleanup_unlink_error(monkeypatch, mock_config, mo
     monkeypatch.setattr(audio.client.audio.transcriptions, 'create', lambda **kwargs: fake_transcription)
     monkeypatch.setattr(audio, 'generate_video_prompt', lambda *a, **k: 'video prompt')
     monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: ('video.mp4', 'thumb.png'))
-    fake_db = mock.Mock()
+    fake_db = make_fake_db()
     fake_socketio = mock.Mock()
     recording_state = {}
     audio_chunks = [b'audio']
@@ -140,7 +148,7 @@ def test_process_audio_emit_else_branches(monkeypatch, mock_config, mock_logger)
     monkeypatch.setattr(audio.client.audio.transcriptions, 'create', lambda **kwargs: fake_transcription)
     monkeypatch.setattr(audio, 'generate_video_prompt', lambda *a, **k: 'video prompt')
     monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: ('video.mp4', 'thumb.png'))
-    fake_db = mock.Mock()
+    fake_db = make_fake_db()
     fake_socketio = mock.Mock()
     recording_state = {}
     audio_chunks = [b'audio']
@@ -159,7 +167,7 @@ def test_process_audio_exception_and_finally(monkeypatch, mock_config, mock_logg
     monkeypatch.setattr(audio.client.audio.transcriptions, 'create', raise_exc)
     monkeypatch.setattr(audio, 'generate_video_prompt', lambda *a, **k: 'video prompt')
     monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: ('video.mp4', 'thumb.png'))
-    fake_db = mock.Mock()
+    fake_db = make_fake_db()
     fake_socketio = mock.Mock()
     recording_state = {}
     audio_chunks = [b'audio']
@@ -167,7 +175,7 @@ def test_process_audio_exception_and_finally(monkeypatch, mock_config, mock_logg
     monkeypatch.setattr(audio.os, 'unlink', lambda path: (_ for _ in ()).throw(Exception('fail unlink')))
     audio.process_audio('sid', fake_socketio, fake_db, recording_state, audio_chunks, logger=mock_logger)
     # Should emit error and not crash
-    fake_socketio.emit.assert_any_call('error', {'message': 'fail'}) 
+    fake_socketio.emit.assert_any_call('error', {'message': 'fail'}, room='sid')
 
 def test_process_audio_emit_sid_and_no_sid(monkeypatch, mock_config, mock_logger):
     # Patch dependencies
@@ -176,7 +184,7 @@ def test_process_audio_emit_sid_and_no_sid(monkeypatch, mock_config, mock_logger
     monkeypatch.setattr(audio.client.audio.transcriptions, 'create', lambda **kwargs: fake_transcription)
     monkeypatch.setattr(audio, 'generate_video_prompt', lambda *a, **k: 'video prompt')
     monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: ('video.mp4', 'thumb.png'))
-    fake_db = mock.Mock()
+    fake_db = make_fake_db()
     fake_socketio = mock.Mock()
     recording_state = {}
     audio_chunks = [b'audio']
@@ -187,4 +195,472 @@ def test_process_audio_emit_sid_and_no_sid(monkeypatch, mock_config, mock_logger
     # Check that emit was called with and without room
     calls = [c for c in fake_socketio.emit.call_args_list]
     assert any('room' in c[1] for c in calls)  # with sid
-    assert any('room' not in c[1] for c in calls)  # without sid 
\ No newline at end of file
+    assert any('room' not in c[1] for c in calls)  # without sid 
+
+def test_decode_audio_chunk_binary():
+    assert audio.decode_audio_chunk({'data': b'\x01\x02'}) == b'\x01\x02'
+    assert audio.decode_audio_chunk({'data': memoryview(b'\x03')}) == b'\x03'
+    assert audio.decode_audio_chunk(bytearray(b'\x04')) == b'\x04'
+
+def test_decode_audio_chunk_int_list_fallback():
+    assert audio.decode_audio_chunk({'data': [1, 2, 255]}) == b'\x01\x02\xff'
+
+def test_decode_audio_chunk_invalid():
+    with pytest.raises(TypeError):
+        audio.decode_audio_chunk({'data': object()})
+
+def test_save_wav_file_pipes_audio_to_ffmpeg(monkeypatch, mock_config, mock_logger):
+    calls = {}
+    monkeypatch.setattr(audio.ffmpeg, 'input', lambda x: calls.setdefault('input', x))
+    monkeypatch.setattr(audio.ffmpeg, 'output', lambda x, y, **kwargs: (x, y))
+    monkeypatch.setattr(audio.ffmpeg, 'run', lambda *a, **k: calls.update(run_kwargs=k))
+    audio.save_wav_file(b'webm-bytes', filename='pipe.wav', logger=mock_logger)
+    assert calls['input'] == 'pipe:0'
+    assert calls['run_kwargs']['input'] == b'webm-bytes'
+
+def test_process_audio_uploads_from_memory(monkeypatch, mock_config, mock_logger):
+    monkeypatch.setattr(audio, 'save_wav_file', lambda *a, **k: 'file.wav')
+    uploads = []
+    def fake_create(**kwargs):
+        uploads.append(kwargs['file'])
+        return mock.Mock(text='hello world')
+    monkeypatch.setattr(audio.client.audio.transcriptions, 'create', fake_create)
+    monkeypatch.setattr(audio, 'generate_video_prompt', lambda *a, **k: 'video prompt')
+    monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: ('video.mp4', 'thumb.png'))
+    audio.process_audio('sid', mock.Mock(), make_fake_db(), {}, [b'ab', b'cd'], logger=mock_logger)
+    assert uploads == [('recording.webm', b'abcd')]
+
+def test_process_audio_uses_cached_transcription(monkeypatch, mock_config, mock_logger):
+    import hashlib
+    monkeypatch.setattr(audio, 'save_wav_file', lambda *a, **k: 'file.wav')
+    def fail_create(**kwargs): raise AssertionError('Whisper should not be called')
+    monkeypatch.setattr(audio.client.audio.transcriptions, 'create', fail_create)
+    monkeypatch.setattr(audio, 'generate_video_prompt', lambda *a, **k: 'video prompt')
+    monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: ('video.mp4', 'thumb.png'))
+    fake_db = make_fake_db()
+    fake_db.get_cached_transcription.return_value = 'cached dream'
+    fake_db.find_dreams_by_audio_hash.return_value = [{'id': 7}]
+    recording_state = {}
+    audio.process_audio('sid', mock.Mock(), fake_db, recording_state, [b'ab', b'cd'], logger=mock_logger)
+    audio_hash = hashlib.sha256(b'abcd').hexdigest()
+    fake_db.get_cached_transcription.assert_called_once_with(audio_hash, 'whisper-1')
+    assert recording_state['transcription'] == 'cached dream'
+    assert recording_state['transcription_cached'] is True
+    assert recording_state['duplicate_of'] == 7
+    assert fake_db.save_dream.call_args[0][0]['audio_hash'] == audio_hash
+
+def test_transcribe_recording_caches_result(monkeypatch, mock_config, mock_logger):
+    monkeypatch.setattr(audio, 'prepare_transcription_upload', lambda *a, **k: ('recording.webm', b'abcd'))
+    monkeypatch.setattr(audio.client.audio.transcriptions, 'create', lambda **kwargs: mock.Mock(text='fresh'))
+    fake_db = make_fake_db()
+    assert audio.transcribe_recording('file.wav', b'abcd', 'hash', fake_db, {}, mock_logger) == 'fresh'
+    fake_db.save_transcription.assert_called_once_with('hash', 'whisper-1', 'fresh')
+
+class FakeProcess:
+    def __init__(self, returncode=0, stderr=b''):
+        self.stdin = io.BytesIO()
+        self.returncode = None
+        self._returncode = returncode
+        self._stderr = stderr
+        self.killed = False
+    def communicate(self):
+        self.returncode = self._returncode
+        return None, self._stderr
+    def kill(self):
+        self.killed = True
+    def wait(self):
+        return self.returncode
+
+def test_streaming_transcoder_feeds_ffmpeg(monkeypatch, mock_config, mock_logger):
+    process = FakeProcess()
+    monkeypatch.setattr(audio.ffmpeg, 'run_async', lambda *a, **k: process)
+    transcoder = audio.StreamingTranscoder(filename='stream.wav', logger=mock_logger)
+    transcoder.write(b'ab')
+    transcoder.write(b'cd')
+    assert process.stdin.getvalue() == b'abcd'
+    assert transcoder.finish() == 'stream.wav'
+    assert transcoder.ready_seconds is not None
+
+def test_streaming_transcoder_failure_returns_none(monkeypatch, mock_config, mock_logger):
+    process = FakeProcess(returncode=1, stderr=b'bad input')
+    monkeypatch.setattr(audio.ffmpeg, 'run_async', lambda *a, **k: process)
+    transcoder = audio.StreamingTranscoder(filename='stream.wav', logger=mock_logger)
+    process.stdin.close()
+    transcoder.write(b'ab')
+    assert transcoder.failed
+    assert transcoder.finish() is None
+    assert process.killed
+    mock_logger.warning.assert_called()
+
+def test_streaming_transcoder_default_name_has_microseconds(monkeypatch, mock_config, mock_logger):
+    monkeypatch.setattr(audio.ffmpeg, 'run_async', lambda *a, **k: FakeProcess())
+    transcoder = audio.StreamingTranscoder(logger=mock_logger)
+    assert re.fullmatch(r'recording_\d{8}_\d{6}_\d{6}\.wav', transcoder.filename)
+
+def test_process_audio_fallback_wav_name_includes_job_id(monkeypatch, mock_config, mock_logger):
+    names = []
+    monkeypatch.setattr(audio, 'save_wav_file', lambda data, filename, logger=None: names.append(filename) or filename)
+    monkeypatch.setattr(audio.client.audio.transcriptions, 'create', lambda **kwargs: mock.Mock(text='hello world'))
+    monkeypatch.setattr(audio, 'generate_video_prompt', lambda *a, **k: 'video prompt')
+    monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: ('video.mp4', 'thumb.png'))
+    fake_db = make_fake_db()
+    fake_db.create_job.return_value = 12
+    audio.process_audio('sid', mock.Mock(), fake_db, {}, [b'audio'], logger=mock_logger)
+    assert len(names) == 1 and names[0].endswith('_job12.wav')
+
+def test_start_streaming_transcoder_disabled(monkeypatch, mock_logger):
+    monkeypatch.setattr(audio, 'get_config', lambda: {'AUDIO_STREAMING_TRANSCODE': False})
+    assert audio.start_streaming_transcoder(mock_logger) is None
+
+def test_start_streaming_transcoder_missing_ffmpeg(monkeypatch, mock_config, mock_logger):
+    def raise_exc(*a, **k): raise FileNotFoundError('ffmpeg')
+    monkeypatch.setattr(audio.ffmpeg, 'run_async', raise_exc)
+    assert audio.start_streaming_transcoder(mock_logger) is None
+    mock_logger.warning.assert_called()
+
+def test_process_audio_uses_streaming_transcoder(monkeypatch, mock_config, mock_logger):
+    def fail_save(*a, **k): raise AssertionError('save_wav_file should not be called')
+    monkeypatch.setattr(audio, 'save_wav_file', fail_save)
+    monkeypatch.setattr(audio.client.audio.transcriptions, 'create', lambda **kwargs: mock.Mock(text='hello world'))
+    monkeypatch.setattr(audio, 'generate_video_prompt', lambda *a, **k: 'video prompt')
+    monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: ('video.mp4', 'thumb.png'))
+    fake_db = make_fake_db()
+    transcoder = mock.Mock()
+    transcoder.finish.return_value = 'streamed.wav'
+    recording_state = {}
+    audio.process_audio('sid', mock.Mock(), fake_db, recording_state, [b'a'], logger=mock_logger, transcoder=transcoder)
+    assert recording_state['status'] == 'complete'
+    assert fake_db.save_dream.call_args[0][0]['audio_filename'] == 'streamed.wav'
+
+def test_process_audio_falls_back_when_transcoder_fails(monkeypatch, mock_config, mock_logger):
+    monkeypatch.setattr(audio, 'save_wav_file', lambda *a, **k: 'fallback.wav')
+    monkeypatch.setattr(audio.client.audio.transcriptions, 'create', lambda **kwargs: mock.Mock(text='hello world'))
+    monkeypatch.setattr(audio, 'generate_video_prompt', lambda *a, **k: 'video prompt')
+    monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: ('video.mp4', 'thumb.png'))
+    fake_db = make_fake_db()
+    transcoder = mock.Mock()
+    transcoder.finish.return_value = None
+    audio.process_audio('sid', mock.Mock(), fake_db, {}, [b'a'], logger=mock_logger, transcoder=transcoder)
+    assert fake_db.save_dream.call_args[0][0]['audio_filename'] == 'fallback.wav'
+
+def test_prepare_transcription_upload_trims_silence(monkeypatch, mock_config, mock_logger):
+    import numpy as np
+    monkeypatch.setattr(audio, 'trim_wav_file', lambda path, logger=None: (np.zeros(10, dtype=np.int16), 16000, 3.0))
+    monkeypatch.setattr(audio, 'encode_pcm_for_upload', lambda samples, rate, fmt: ('recording.webm', b'trimmed'))
+    state = {}
+    upload = audio.prepare_transcription_upload('file.wav', b'original', state, mock_logger)
+    assert upload == ('recording.webm', b'trimmed')
+    assert state['silence_removed_seconds'] == 3.0
+    assert state['upload_bytes'] == 7
+
+def test_prepare_transcription_upload_keeps_original_when_little_removed(monkeypatch, mock_config, mock_logger):
+    import numpy as np
+    monkeypatch.setattr(audio, 'get_config', lambda: {'RECORDINGS_DIR': '/tmp', 'WHISPER_UPLOAD_FORMAT': 'original'})
+    monkeypatch.setattr(audio, 'trim_wav_file', lambda path, logger=None: (np.zeros(10, dtype=np.int16), 16000, 0.1))
+    upload = audio.prepare_transcription_upload('file.wav', b'original', {}, mock_logger)
+    assert upload == ('recording.webm', b'original')
+
+def test_prepare_transcription_upload_falls_back_on_error(monkeypatch, mock_config, mock_logger):
+    def raise_exc(*a, **k): raise Exception('bad wav')
+    monkeypatch.setattr(audio, 'trim_wav_file', raise_exc)
+    monkeypatch.setattr(audio, 'read_wav_samples', raise_exc)
+    upload = audio.prepare_transcription_upload('file.wav', b'original', {}, mock_logger)
+    assert upload == ('recording.webm', b'original')
+    mock_logger.warning.assert_called()
+
+def test_prepare_transcription_upload_disabled(monkeypatch, mock_logger):
+    monkeypatch.setattr(audio, 'get_config', lambda: {'AUDIO_VAD_ENABLED': False, 'WHISPER_UPLOAD_FORMAT': 'original',
+                                                      'RECORDINGS_DIR': '/tmp'})
+    upload = audio.prepare_transcription_upload('file.wav', b'original', {}, mock_logger)
+    assert upload == ('recording.webm', b'original')
+
+def test_prepare_transcription_upload_downsamples_without_vad(monkeypatch, mock_logger):
+    import numpy as np
+    monkeypatch.setattr(audio, 'get_config', lambda: {'AUDIO_VAD_ENABLED': False, 'WHISPER_UPLOAD_FORMAT': 'wav16k',
+                                                      'RECORDINGS_DIR': '/tmp'})
+    monkeypatch.setattr(audio, 'read_wav_samples', lambda path: (np.zeros(10, dtype=np.int16), 44100))
+    calls = []
+    def fake_encode(samples, rate, fmt):
+        calls.append((rate, fmt))
+        return ('recording.wav', b'small')
+    monkeypatch.setattr(audio, 'encode_pcm_for_upload', fake_encode)
+    upload = audio.prepare_transcription_upload('file.wav', b'original recording', {}, mock_logger)
+    assert upload == ('recording.wav', b'small')
+    assert calls == [(44100, 'wav16k')]
+
+def test_prepare_transcription_upload_unknown_format(monkeypatch, mock_logger):
+    monkeypatch.setattr(audio, 'get_config', lambda: {'WHISPER_UPLOAD_FORMAT': 'mp3', 'RECORDINGS_DIR': '/tmp'})
+    upload = audio.prepare_transcription_upload('file.wav', b'original', {}, mock_logger)
+    assert upload == ('recording.webm', b'original')
+    mock_logger.warning.assert_called()
+
+def test_encode_pcm_for_upload_options(monkeypatch):
+    import numpy as np
+    captured = {}
+    def fake_run(stream, input=None, **kwargs):
+        captured['args'] = stream.get_args()
+        return b'encoded', b''
+    monkeypatch.setattr(audio.ffmpeg, 'run', fake_run)
+    upload = audio.encode_pcm_for_upload(np.zeros(10, dtype=np.int16), 44100, 'opus16k')
+    assert upload == ('recording.webm', b'encoded')
+    assert '-ar' in captured['args'] and '16000' in captured['args']
+    assert 'libopus' in captured['args']
+
+def test_archive_recording_wav_is_noop(monkeypatch, tmp_path, mock_logger):
+    monkeypatch.setattr(audio, 'get_config', lambda: {'RECORDINGS_DIR': str(tmp_path)})
+    (tmp_path / 'rec.wav').write_bytes(b'wav')
+    assert audio.archive_recording('rec.wav', b'webm', logger=mock_logger) == 'rec.wav'
+    assert (tmp_path / 'rec.wav').exists()
+
+def test_archive_recording_webm_keeps_spool(monkeypatch, tmp_path, mock_logger):
+    from functions.recording import RecordingSpool
+    monkeypatch.setattr(audio, 'get_config', lambda: {'RECORDINGS_DIR': str(tmp_path), 'AUDIO_ARCHIVE_FORMAT': 'webm'})
+    (tmp_path / 'rec.wav').write_bytes(b'w' * 100)
+    spool = RecordingSpool(directory=str(tmp_path), preallocate=0)
+    spool.write(b'webm audio')
+    assert audio.archive_recording('rec.wav', b'webm audio', spool, mock_logger) == 'rec.webm'
+    assert (tmp_path / 'rec.webm').read_bytes() == b'webm audio'
+    assert not (tmp_path / 'rec.wav').exists()
+    spool.discard()
+    assert (tmp_path / 'rec.webm').exists()
+
+def test_archive_recording_webm_without_spool(monkeypatch, tmp_path, mock_logger):
+    monkeypatch.setattr(audio, 'get_config', lambda: {'RECORDINGS_DIR': str(tmp_path), 'AUDIO_ARCHIVE_FORMAT': 'webm'})
+    (tmp_path / 'rec.wav').write_bytes(b'w' * 100)
+    assert audio.archive_recording('rec.wav', b'webm audio', [b'webm audio'], mock_logger) == 'rec.webm'
+    assert (tmp_path / 'rec.webm').read_bytes() == b'webm audio'
+
+def test_archive_recording_flac_encodes_wav(monkeypatch, tmp_path, mock_logger):
+    monkeypatch.setattr(audio, 'get_config', lambda: {'RECORDINGS_DIR': str(tmp_path), 'AUDIO_ARCHIVE_FORMAT': 'flac'})
+    (tmp_path / 'rec.wav').write_bytes(b'w' * 100)
+    calls = []
+    def fake_encode(src, dst, fmt):
+        calls.append((src, dst, fmt))
+        with open(dst, 'wb') as f:
+            f.write(b'f' * 40)
+    monkeypatch.setattr(audio, 'encode_audio_file', fake_encode)
+    assert audio.archive_recording('rec.wav', b'webm', logger=mock_logger) == 'rec.flac'
+    assert calls == [(str(tmp_path / 'rec.wav'), str(tmp_path / 'rec.flac'), 'flac')]
+    assert not (tmp_path / 'rec.wav').exists()
+    assert '60 bytes smaller' in mock_logger.info.call_args[0][0]
+
+def test_archive_recording_failure_keeps_wav(monkeypatch, tmp_path, mock_logger):
+    monkeypatch.setattr(audio, 'get_config', lambda: {'RECORDINGS_DIR': str(tmp_path), 'AUDIO_ARCHIVE_FORMAT': 'opus'})
+    (tmp_path / 'rec.wav').write_bytes(b'w' * 100)
+    def raise_exc(*a, **k): raise Exception('ffmpeg failed')
+    monkeypatch.setattr(audio, 'encode_audio_file', raise_exc)
+    assert audio.archive_recording('rec.wav', b'webm', logger=mock_logger) == 'rec.wav'
+    assert (tmp_path / 'rec.wav').exists()
+    mock_logger.warning.assert_called()
+
+def test_encode_audio_file_unknown_format():
+    with pytest.raises(ValueError):
+        audio.encode_audio_file('in.wav', 'out.mp3', 'mp3')
+
+def test_get_playback_file_caches(monkeypatch, tmp_path, mock_logger):
+    monkeypatch.setattr(audio, 'get_config', lambda: {'RECORDINGS_DIR': str(tmp_path)})
+    (tmp_path / 'rec.ogg').write_bytes(b'ogg')
+    calls = []
+    def fake_encode(src, dst, fmt):
+        calls.append(fmt)
+        with open(dst, 'wb') as f:
+            f.write(b'aac')
+    monkeypatch.setattr(audio, 'encode_audio_file', fake_encode)
+    path = audio.get_playback_file('rec.ogg', 'm4a', mock_logger)
+    assert path == str(tmp_path / 'playback' / 'rec.m4a')
+    assert audio.get_playback_file('rec.ogg', 'm4a', mock_logger) == path
+    assert calls == ['m4a']
+    audio.remove_playback_files('rec.ogg')
+    assert not os.path.exists(path)
+
+def test_get_playback_file_rejects_bad_requests(monkeypatch, tmp_path):
+    monkeypatch.setattr(audio, 'get_config', lambda: {'RECORDINGS_DIR': str(tmp_path)})
+    with pytest.raises(ValueError):
+        audio.get_playback_file('rec.ogg', 'mp3')
+    with pytest.raises(FileNotFoundError):
+        audio.get_playback_file('../secret.ogg', 'm4a')
+    with pytest.raises(FileNotFoundError):
+        audio.get_playback_file('missing.ogg', 'm4a')
+
+def test_process_audio_resumes_job_after_transcription(monkeypatch, mock_config, mock_logger):
+    from functions.jobs import PipelineJob
+    def fail(*a, **k): raise AssertionError('finished stage should be skipped')
+    monkeypatch.setattr(audio, 'transcribe_stage', fail)
+    monkeypatch.setattr(audio, 'generate_video_prompt', fail)
+    calls = []
+    def fake_generate_video(**kwargs):
+        calls.append(kwargs['job'])
+        return ('video.mp4', 'thumb.png')
+    monkeypatch.setattr(audio, 'generate_video', fake_generate_video)
+    fake_db = make_fake_db()
+    fake_db.save_dream.return_value = 5
+    job = PipelineJob(fake_db, 1, 'kiosk', 'generating', {
+        'transcription': 'a dream', 'audio_filename': 'a.ogg', 'audio_hash': 'abc',
+        'video_prompt': 'prompt', 'luma_extend': False, 'generation_id': 'genid'
+    })
+    recording_state = {}
+    fake_socketio = mock.Mock()
+    audio.process_audio('kiosk', fake_socketio, fake_db, recording_state, None, logger=mock_logger, job=job)
+    assert recording_state['status'] == 'complete'
+    assert calls == [job]
+    assert fake_db.save_dream.call_args[0][0]['audio_filename'] == 'a.ogg'
+    assert job.state == 'done' and job.data['dream_id'] == 5
+    fake_socketio.emit.assert_any_call('transcription_update', {'text': 'a dream'}, room='kiosk')
+
+def test_process_audio_packages_hls_after_video_ready(monkeypatch, mock_config, mock_logger):
+    from functions.jobs import PipelineJob
+    monkeypatch.setattr(audio, 'generate_video', lambda **kwargs: ('video.mp4', 'thumb.png'))
+    monkeypatch.setattr(audio, 'hls_enabled', lambda: True)
+    packaged = []
+    fake_socketio = mock.Mock()
+    def package(video_filename, logger=None):
+        # The dream is already playable as MP4
+        fake_socketio.emit.assert_any_call('video_ready', {'url': '/media/video/video.mp4'}, room='kiosk')
+        packaged.append(video_filename)
+    monkeypatch.setattr(audio, 'package_in_background', package)
+    job = PipelineJob(make_fake_db(), 1, 'kiosk', 'generating', {
+        'transcription': 'a dream', 'audio_filename': 'a.ogg', 'audio_hash': 'abc',
+        'video_prompt': 'prompt', 'luma_extend': False, 'generation_id': 'genid'
+    })
+    audio.process_audio('kiosk', fake_socketio, job.dream_db, {}, None, logger=mock_logger, job=job)
+    assert packaged == ['video.mp4']
+
+def test_process_audio_marks_job_failed(monkeypatch, mock_config, mock_logger):
+    monkeypatch.setattr(audio, 'save_wav_file', lambda *a, **k: 'file.wav')
+    def raise_exc(**kwargs): raise Exception('whisper down')
+    monkeypatch.setattr(audio.client.audio.transcriptions, 'create', raise_exc)
+    fake_db = make_fake_db()
+    fake_db.create_job.return_value = 9
+    audio.process_audio('sid', mock.Mock(), fake_db, {}, [b'audio'], logger=mock_logger)
+    assert fake_db.update_job.call_args[0][0] == 9
+    assert fake_db.update_job.call_args[0][1] == 'failed'
+    assert fake_db.update_job.call_args[0][3] == 'whisper down'
+
+def test_process_audio_moves_spool_for_resume(monkeypatch, tmp_path, mock_logger):
+    from functions.recording import RecordingSpool
+    config = {'RECORDINGS_DIR': str(tmp_path), 'WHISPER_MODEL': 'whisper-1', 'LUMA_EXTEND': '0', 'AUDIO_VAD_ENABLED': False,
+              'WHISPER_UPLOAD_FORMAT': 'original'}
+    monkeypatch.setattr(audio, 'get_config', lambda: config)
+    def save_wav(audio_data, filename, logger=None):
+        (tmp_path / filename).write_bytes(b'wav')
+        return filename
+    monkeypatch.setattr(audio, 'save_wav_file', save_wav)
+    def raise_exc(**kwargs): raise Exception('interrupted')
+    monkeypatch.setattr(audio.client.audio.transcriptions, 'create', raise_exc)
+    spool = RecordingSpool(directory=str(tmp_path), preallocate=0)
+    spool.write(b'webm')
+    fake_db = make_fake_db()
+    checkpoints = []
+    fake_db.update_job.side_effect = lambda job_id, state, data, error=None: checkpoints.append((state, dict(data)))
+    audio.process_audio('sid', mock.Mock(), fake_db, {}, spool, logger=mock_logger)
+    assert checkpoints[0][0] == 'queued'
+    assert checkpoints[0][1]['recording_filename'].startswith('recording_')
+    assert spool.path == str(tmp_path / checkpoints[0][1]['recording_filename'])
+
+def test_resume_jobs(monkeypatch, tmp_path, mock_logger):
+    monkeypatch.setattr(audio, 'get_config', lambda: {'RECORDINGS_DIR': str(tmp_path)})
+    (tmp_path / 'recording_1.webm').write_bytes(b'webm')
+    (tmp_path / 'spool_20260101_000000_000000.webm').write_bytes(b'crashed')
+    fake_db = make_fake_db()
+    fake_db.get_unfinished_jobs.return_value = [
+        {'id': 1, 'session_key': 'kiosk', 'state': 'generating', 'data': {'transcription': 'a dream'}},
+        {'id': 2, 'session_key': 'phone', 'state': 'transcribing', 'data': {'recording_filename': 'recording_1.webm'}},
+        {'id': 3, 'session_key': None, 'state': 'queued', 'data': {'recording_filename': 'missing.webm'}},
+    ]
+    spawned = []
+    monkeypatch.setattr(audio.gevent, 'spawn', lambda *a, **k: spawned.append((a, k)))
+    greenlets = audio.resume_jobs(mock.Mock(), fake_db, mock_logger)
+    assert len(greenlets) == 2
+    assert spawned[0][0][1] == 'kiosk' and spawned[0][0][5] is None
+    assert spawned[0][1]['job'].data['transcription'] == 'a dream'
+    assert spawned[1][0][5].path == str(tmp_path / 'recording_1.webm')
+    fake_db.update_job.assert_called_once_with(3, 'failed', {'recording_filename': 'missing.webm'},
+                                               'Recording was lost before transcription')
+    # A spool left by a recording in progress during the crash belongs to no job
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['recording_1.webm']
+
+def test_resumed_job_removes_its_recording_when_finished(monkeypatch, tmp_path, mock_logger):
+    config = {'RECORDINGS_DIR': str(tmp_path), 'LUMA_EXTEND': '0'}
+    monkeypatch.setattr(audio, 'get_config', lambda: config)
+    monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: ('video.mp4', 'thumb.png'))
+    (tmp_path / 'recording_1.webm').write_bytes(b'webm')
+    job = audio.PipelineJob.from_row(make_fake_db(), {
+        'id': 1, 'session_key': 'kiosk', 'state': 'generating',
+        'data': {'recording_filename': 'recording_1.webm', 'transcription': 'a dream', 'video_prompt': 'a video'},
+    })
+    audio.process_audio('kiosk', mock.Mock(), job.dream_db, {}, None, logger=mock_logger, job=job)
+    assert job.finished
+    assert not (tmp_path / 'recording_1.webm').exists()
+
+def test_process_audio_records_stage_timings(monkeypatch, mock_config, mock_logger):
+    monkeypatch.setattr(audio, 'save_wav_file', lambda *a, **k: 'file.wav')
+    monkeypatch.setattr(audio.client.audio.transcriptions, 'create', lambda **kwargs: mock.Mock(text='hello world'))
+    monkeypatch.setattr(audio, 'generate_video_prompt', lambda *a, **k: 'video prompt')
+    monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: ('video.mp4', 'thumb.png'))
+    fake_db = make_fake_db()
+    fake_db.create_job.return_value = 3
+    fake_db.save_dream.return_value = 9
+    fake_socketio = mock.Mock()
+    audio.process_audio('sid', fake_socketio, fake_db, {}, [b'ab'], logger=mock_logger)
+    stages = [c.args[1] for c in fake_db.save_stage_timing.call_args_list]
+    assert stages == ['wav_save', 'whisper', 'db_save', 'total']
+    assert all(c.args[0] == 3 and c.args[3] is True for c in fake_db.save_stage_timing.call_args_list)
+    fake_db.link_stage_timings.assert_called_once_with(3, 9)
+    # Stage events are off unless PIPELINE_STAGE_EVENTS is set
+    assert 'pipeline_stage' not in [c.args[0] for c in fake_socketio.emit.call_args_list]
+
+def test_stage_recorder_emits_events(monkeypatch, mock_logger):
+    monkeypatch.setattr(audio, 'get_config', lambda: {'PIPELINE_STAGE_EVENTS': True})
+    fake_db = make_fake_db()
+    fake_db.save_stage_timing.side_effect = Exception('locked')
+    fake_socketio = mock.Mock()
+    record = audio.stage_recorder(mock.Mock(id=4), fake_db, fake_socketio, 'sid', mock_logger)
+    record('gpt', 0.12345, True)
+    fake_socketio.emit.assert_called_once_with(
+        'pipeline_stage', {'job_id': 4, 'stage': 'gpt', 'seconds': 0.123, 'ok': True}, room='sid'
+    )
+    mock_logger.warning.assert_called()
+
+def test_process_audio_adopts_speculative_generation(monkeypatch, mock_config, mock_logger):
+    monkeypatch.setattr(audio, 'save_wav_file', lambda *a, **k: 'file.wav')
+    monkeypatch.setattr(audio.client.audio.transcriptions, 'create', lambda **kwargs: mock.Mock(text='hello world'))
+    def fail_prompt(*a, **k): raise AssertionError('GPT should not be called')
+    monkeypatch.setattr(audio, 'generate_video_prompt', fail_prompt)
+    jobs = []
+    monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: jobs.append(k['job']) or ('video.mp4', 'thumb.png'))
+    def resolve(job, text):
+        job.data.update(video_prompt='speculative prompt', luma_extend=False, generation_id='gen-1')
+        return True
+    speculation = mock.Mock(resolve=mock.Mock(side_effect=resolve))
+    recording_state = {}
+    audio.process_audio('sid', mock.Mock(), make_fake_db(), recording_state, [b'ab'], logger=mock_logger,
+                        speculation=speculation)
+    speculation.resolve.assert_called_once()
+    assert speculation.resolve.call_args.args[1] == 'hello world'
+    assert recording_state['speculative'] is True
+    assert recording_state['video_prompt'] == 'speculative prompt'
+    assert jobs[0].data['generation_id'] == 'gen-1'
+    speculation.discard.assert_called_once()
+
+def test_process_audio_emits_partial_previews(monkeypatch, mock_config, mock_logger):
+    monkeypatch.setattr(audio, 'save_wav_file', lambda *a, **k: 'file.wav')
+    monkeypatch.setattr(audio.client.audio.transcriptions, 'create', lambda **kwargs: mock.Mock(text='hello world'))
+    monkeypatch.setattr(audio, 'generate_video_prompt', lambda *a, **k: 'one ***** two')
+    def fake_generate_video(prompt, luma_extend, logger, job, on_preview):
+        job.checkpoint('generating', preview_filenames=['preview_1.mp4'])
+        on_preview('preview_1.mp4')
+        return 'video.mp4', 'thumb.png'
+    monkeypatch.setattr(audio, 'generate_video', fake_generate_video)
+    removed = []
+    monkeypatch.setattr(audio, 'remove_preview_files', removed.append)
+    fake_socketio = mock.Mock()
+    recording_state = {}
+    audio.process_audio('sid', fake_socketio, make_fake_db(), recording_state, [b'audio'], logger=mock_logger)
+    ready = [c for c in fake_socketio.emit.call_args_list if c[0][0] == 'video_ready']
+    assert [c[0][1] for c in ready] == [
+        {'url': '/media/video/preview_1.mp4', 'partial': True},
+        {'url': '/media/video/video.mp4'},
+    ]
+    assert all(c[1] == {'room': 'sid'} for c in ready)
+    assert recording_state['preview_url'] == '/media/video/preview_1.mp4'
+    assert removed == [['preview_1.mp4']]
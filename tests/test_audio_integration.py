@@ -23,6 +23,13 @@ def mock_config(monkeypatch):
 def mock_logger():
     return mock.Mock()
 
+def make_fake_db():
+    """A mock DreamDB with an empty transcription cache and no earlier dreams."""
+    fake_db = mock.Mock()
+    fake_db.get_cached_transcription.return_value = None
+    fake_db.find_dreams_by_audio_hash.return_value = []
+    return fake_db
+
 def test_generate_video_prompt_success(monkeypatch, mock_config, mock_logger):
     fake_response = mock.Mock()
     fake_response.choices = [mock.Mock(message=mock.Mock(content='Generated prompt'))]
@@ -49,7 +56,7 @@ def test_process_audio_success(monkeypatch, mock_config, mock_logger):
     # Patch generate_video
     monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: ('video.mp4', 'thumb.png'))
     # Patch dream_db
-    fake_db = mock.Mock()
+    fake_db = make_fake_db()
     # Patch socketio
     fake_socketio = mock.Mock()
     recording_state = {}
@@ -69,13 +76,13 @@ def test_process_audio_error(monkeypatch, mock_config, mock_logger):
     # Patch save_wav_file to raise
     def raise_exc(*a, **k): raise Exception('fail')
     monkeypatch.setattr(audio, 'save_wav_file', raise_exc)
-    fake_db = mock.Mock()
+    fake_db = make_fake_db()
     fake_socketio = mock.Mock()
     recording_state = {}
     audio_chunks = [b'audio']
     audio.process_audio('sid', fake_socketio, fake_db, recording_state, audio_chunks, logger=mock_logger)
     assert recording_state['status'] == 'error'
-    fake_socketio.emit.assert_any_call('error', {'message': 'fail'})
+    fake_socketio.emit.assert_any_call('error', {'message': 'fail'}, room='sid')
     mock_logger.error.assert_called()
 
 def test_process_audio_finally_clears_chunks(monkeypatch, mock_config, mock_logger):
@@ -88,7 +95,7 @@ def test_process_audio_finally_clears_chunks(monkeypatch, mock_config, mock_logg
     monkeypatch.setattr(audio, 'generate_video_prompt', lambda *a, **k: 'video prompt')
     # Patch generate_video
     monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: ('video.mp4', 'thumb.png'))
-    fake_db = mock.Mock()
+    fake_db = make_fake_db()
     fake_socketio = mock.Mock()
     recording_state = {}
     audio_chunks = [b'audio']
@@ -109,7 +116,7 @@ def test_process_audio_finally_unlink_exception(monkeypatch, mock_config, mock_l
     monkeypatch.setattr(audio, 'generate_video', lambda *a, **k: ('video.mp4', 'thumb.png'))
     # Patch os.unlink to raise
     monkeypatch.setattr(audio.os, 'unlink', lambda path: (_ for _ in ()).throw(Exception('fail')))
-    fake_db = mock.Mock()
+    fake_db = make_fake_db()
     fake_socketio = mock.Mock()
     recording_state = {}
     audio_chunks = [b'audio']
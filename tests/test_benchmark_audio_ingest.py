@@ -0,0 +1,14 @@
+import scripts.benchmark_audio_ingest as bench
+
+def test_make_chunks_matches_bitrate():
+    chunks = bench.make_chunks(minutes=0.01)
+    assert len(chunks) == 6
+    assert all(len(c) == 1600 for c in chunks)
+
+def test_run_reports_both_encodings():
+    audio_bytes, results = bench.run(minutes=0.01, repeat=1)
+    assert audio_bytes == 6 * 1600
+    assert set(results) == {'json', 'binary'}
+    # Binary attachments carry the audio with only packet framing on top
+    assert results['binary']['overhead'] < results['json']['overhead']
+    assert results['binary']['wire_bytes_per_second'] < results['json']['wire_bytes_per_second']
@@ -0,0 +1,45 @@
+import requests
+import scripts.benchmark_pipeline as bench
+from scripts.fake_providers import create_app, start_server, provider_config
+
+FAST = {'whisper': 0.01, 'gpt': 0.01, 'luma_create': 0.01, 'luma_poll': 0.01, 'download': 0.01}
+
+def test_fake_luma_generation_completes():
+    server, base_url = start_server(create_app(FAST, render_seconds=0.05, video_bytes=65536))
+    try:
+        config = provider_config(base_url)
+        created = requests.post(config['LUMA_GENERATIONS_ENDPOINT'], json={'prompt': 'a dream'})
+        assert created.status_code == 201
+        generation_id = created.json()['id']
+        status = requests.get(f"{config['LUMA_API_URL']}/generations/{generation_id}").json()
+        assert status['state'] == 'dreaming'
+        bench.gevent.sleep(0.06)
+        status = requests.get(f"{config['LUMA_API_URL']}/generations/{generation_id}").json()
+        assert status['state'] == 'completed'
+        assert len(requests.get(status['assets']['video']).content) == 65536
+        assert requests.get(f"{config['LUMA_API_URL']}/generations/missing").status_code == 404
+        listed = requests.get(f"{config['LUMA_API_URL']}/generations", params={'limit': 5}).json()
+        assert [g['id'] for g in listed['generations']] == [generation_id]
+    finally:
+        server.stop()
+
+def test_percentile():
+    assert bench.percentile([3, 1, 2], 50) == 2
+    assert bench.percentile([3, 1, 2], 100) == 3
+
+def test_run_respects_stage_limits():
+    result = bench.run(jobs=3, limited=True, render_seconds=0.05, ffmpeg_seconds=0.01, late_delay=0.01, latency=FAST)
+    assert result['peak']['ffmpeg'] == 1
+    assert result['peak']['whisper'] <= 2
+    assert result['late'] > 0
+
+def test_run_unlimited():
+    result = bench.run(jobs=3, limited=False, render_seconds=0.05, ffmpeg_seconds=0.01, late_delay=0.0, latency=FAST)
+    assert result['peak']['whisper'] == 4
+
+def test_run_checks_generations_with_one_poller():
+    result = bench.run(jobs=3, limited=False, render_seconds=0.05, ffmpeg_seconds=0.01, late_delay=0.0, latency=FAST)
+    # Checks go through the list endpoint or per-generation GETs, never both at once
+    assert result['peak'].get('luma_poll', 0) <= 1
+    assert result['peak'].get('luma_list', 0) <= 1
+    assert result['status_requests'] > 0
@@ -0,0 +1,12 @@
+import scripts.benchmark_polling as bench
+
+def test_simulate_fixed_interval():
+    with bench.poll_config(5.0, False):
+        polls, lag, recorded = bench.simulate(12.0, None)
+    assert (polls, lag, recorded) == (4, 3.0, 12.5)
+
+def test_learned_polling_needs_fewer_checks():
+    results = bench.run(dreams=40, mean=45.0, spread=5.0, interval=5.0)
+    fixed, learned = results[False], results[True]
+    assert learned['polls'] < fixed['polls']
+    assert learned['lag_mean'] < fixed['lag_mean']
@@ -0,0 +1,82 @@
+import os
+import sys
+import pytest
+import subprocess
+import scripts.benchmark_postprocess as bench
+
+@pytest.fixture
+def mock_video_config(monkeypatch):
+    monkeypatch.setattr(bench.video, 'get_config', lambda: {
+        'FFMPEG_BRIGHTNESS': 0.1,
+        'FFMPEG_VIBRANCE': 0.2,
+        'FFMPEG_DENOISE_THRESHOLD': 0.3,
+        'FFMPEG_BILATERAL_SIGMA': 0.4,
+        'FFMPEG_NOISE_STRENGTH': 0.5,
+    })
+
+def test_run_times_each_mode_per_clip(tmp_path):
+    clips = []
+    for name in ('a.mp4', 'b.mp4'):
+        clip = tmp_path / name
+        clip.write_bytes(name.encode())
+        clips.append(str(clip))
+    seen = []
+    modes = {'first': lambda path: seen.append(('first', open(path, 'rb').read())),
+             'second': lambda path: seen.append(('second', open(path, 'rb').read()))}
+    results = bench.run(clips, repeat=2, modes=modes)
+    assert list(results) == ['first', 'second']
+    assert all(r['wall'] >= 0 and r['cpu'] >= 0 for r in results.values())
+    # Every run starts from a fresh copy of the clip
+    assert seen == [('first', b'a.mp4'), ('first', b'b.mp4')] * 2 + [('second', b'a.mp4'), ('second', b'b.mp4')] * 2
+
+def test_thumbs_in_restores_config(tmp_path):
+    config = bench.get_config()
+    before = config.get('THUMBS_DIR')
+    with bench.thumbs_in(str(tmp_path)):
+        assert config['THUMBS_DIR'] == str(tmp_path)
+    assert config.get('THUMBS_DIR') == before
+
+def test_child_cpu_seconds_counts_subprocesses():
+    before = bench.child_cpu_seconds()
+    subprocess.run([sys.executable, '-c', 'sum(range(3000000))'], check=True)
+    assert bench.child_cpu_seconds() > before
+
+def test_run_ffmpeg_measures_the_process(monkeypatch):
+    monkeypatch.setattr(bench.ffmpeg, 'compile', lambda stream, **k: [sys.executable, '-c', 'sum(range(3000000))'])
+    wall, cpu, peak_rss = bench.run_ffmpeg(None)
+    assert wall > 0 and cpu > 0 and peak_rss > 1000000
+
+def test_run_ffmpeg_raises_on_failure(monkeypatch):
+    monkeypatch.setattr(bench.ffmpeg, 'compile', lambda stream, **k: [sys.executable, '-c', 'raise SystemExit(3)'])
+    try:
+        bench.run_ffmpeg(None)
+    except RuntimeError as e:
+        assert 'exited with 3' in str(e)
+    else:
+        raise AssertionError('expected RuntimeError')
+
+def test_quality_parses_ssim_and_psnr(monkeypatch):
+    logs = iter([b'[Parsed_ssim_0] SSIM Y:0.95 U:0.97 V:0.97 All:0.957123 (13.7)\n',
+                 b'[Parsed_psnr_0] PSNR y:33.1 u:38.2 v:38.0 average:34.512 min:30.1 max:40.2\n'])
+    monkeypatch.setattr(bench.ffmpeg, 'run', lambda stream, **k: (None, next(logs)))
+    assert bench.quality('a.mp4', 'b.mp4') == (0.957123, 34.512)
+
+def test_run_presets_scores_against_full(monkeypatch, mock_video_config):
+    runs = []
+    def fake_run_ffmpeg(stream):
+        runs.append(stream.get_args())
+        return 2.0, 1.5, 50000000
+    monkeypatch.setattr(bench, 'run_ffmpeg', fake_run_ffmpeg)
+    monkeypatch.setattr(bench, 'frame_count', lambda path: 120)
+    compared = []
+    def fake_quality(path, reference):
+        compared.append((os.path.basename(path), os.path.basename(reference)))
+        return (1.0, float('inf')) if path == reference else (0.9, 30.0)
+    monkeypatch.setattr(bench, 'quality', fake_quality)
+    results = bench.run_presets(['clip.mp4'], presets=('fast', 'full'))
+    assert list(results) == ['fast', 'full']
+    # The reference is encoded first so the others can be scored against it
+    assert 'vaguedenoiser' in runs[0][runs[0].index('-filter_complex') + 1]
+    assert '-preset' in runs[1] and 'veryfast' in runs[1]
+    assert compared == [('full_0.mp4', 'full_0.mp4'), ('fast_0.mp4', 'full_0.mp4')]
+    assert results['fast'] == {'fps': 60.0, 'cpu': 1.5, 'peak_rss': 50000000, 'ssim': 0.9, 'psnr': 30.0}
@@ -0,0 +1,20 @@
+import scripts.benchmark_speculative as bench
+
+FAST = {'whisper': 0.01, 'gpt': 0.01, 'luma_create': 0.01, 'luma_poll': 0.01, 'download': 0.01}
+
+def test_fake_transcribe_counts_voiced_bytes():
+    one_word = int(bench.BYTES_PER_SECOND / bench.WORDS_PER_SECOND)
+    assert bench.fake_transcribe(bench.VOICED * one_word * 3 + bench.SILENT * 1000) == 'I was walking'
+    assert bench.fake_transcribe(b'') == ''
+
+def test_speculative_run_adopts_generation():
+    segments = [(True, 1.6), (False, 1.5)]
+    serial = bench.run_once(segments, False, render_seconds=0.05, interval=0.05, partial_latency=0.01,
+                            ffmpeg_seconds=0.01, latency=FAST)
+    assert serial['adopted'] is False
+    assert serial['partials'] == 0
+    result = bench.run_once(segments, True, render_seconds=0.05, interval=0.05, partial_latency=0.01,
+                            ffmpeg_seconds=0.01, latency=FAST)
+    assert result['adopted'] is True
+    assert result['generations'] == 1
+    assert result['partials'] > 1
@@ -0,0 +1,10 @@
+import scripts.benchmark_vad as bench
+
+def test_make_recording_length():
+    samples = bench.make_recording(1, 2, 1, 1, segments=2)
+    assert len(samples) == 7 * bench.SAMPLE_RATE
+
+def test_run_reports_removed_silence():
+    results = bench.run([('test', bench.make_recording(2, 1, 0.5, 2))], repeat=1)
+    assert results[0]['removed'] > 3
+    assert results[0]['kept'] < results[0]['duration']
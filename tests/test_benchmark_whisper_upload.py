@@ -0,0 +1,15 @@
+import numpy as np
+import pytest
+import scripts.benchmark_whisper_upload as bench
+
+def test_upload_seconds():
+    assert bench.upload_seconds(125000, 1) == pytest.approx(1.0)
+
+def test_run_reports_savings(monkeypatch):
+    monkeypatch.setattr(bench, 'browser_recording', lambda samples, rate=None: b'x' * 1000)
+    monkeypatch.setattr(bench, 'encode_pcm_for_upload', lambda samples, rate, fmt: ('recording', b'x' * 250))
+    results = bench.run(np.zeros(100, dtype=np.int16), link_speeds=(1,), repeat=1)
+    assert [r['format'] for r in results] == ['original', 'wav16k', 'opus16k']
+    assert results[0]['saved_bytes'] == 0
+    assert results[2]['saved_bytes'] == 750
+    assert results[2]['latency_saved'][1] == pytest.approx(0.006, abs=0.001)
@@ -0,0 +1,68 @@
+import pytest
+import dream_recorder
+from functions import callbacks, video
+from functions.config_loader import get_config
+from scripts.fake_providers import create_app, start_server, provider_config
+
+FAST = {'whisper': 0.01, 'gpt': 0.01, 'luma_create': 0.01, 'luma_poll': 0.01, 'download': 0.01}
+
+@pytest.fixture
+def callback_config(monkeypatch):
+    monkeypatch.setitem(get_config(), 'LUMA_CALLBACK_URL', 'https://dreams.example.com/')
+    monkeypatch.setitem(get_config(), 'LUMA_CALLBACK_SECRET', 's3cret')
+
+def test_callback_url(callback_config):
+    assert callbacks.callbacks_enabled()
+    assert callbacks.callback_url() == 'https://dreams.example.com/api/luma_callback/s3cret'
+    assert callbacks.valid_secret('s3cret')
+    assert not callbacks.valid_secret('guess')
+
+def test_callbacks_need_url_and_secret(monkeypatch):
+    monkeypatch.setitem(get_config(), 'LUMA_CALLBACK_URL', 'https://dreams.example.com')
+    monkeypatch.setitem(get_config(), 'LUMA_CALLBACK_SECRET', '')
+    assert not callbacks.callbacks_enabled()
+    assert not callbacks.valid_secret('')
+
+def test_only_final_states_wake_the_waiter(monkeypatch, generation_tracker):
+    monkeypatch.setitem(get_config(), 'LUMA_CALLBACK_TIMEOUT', 60)
+    assert generation_tracker.deliver({'id': 'gen-1', 'state': 'completed'}) is False
+    tracked = generation_tracker.track('gen-1', callback=True)
+    assert generation_tracker.deliver({'id': 'gen-1', 'state': 'dreaming'}) is True
+    assert not tracked.result.ready()
+    generation_tracker.deliver({'id': 'gen-1', 'state': 'completed', 'assets': {'video': 'v.mp4'}})
+    assert video.poll_generation('gen-1') == 'v.mp4'
+    assert generation_tracker.snapshot() == []
+
+@pytest.fixture
+def servers(monkeypatch):
+    """Fake Luma server plus this app served over HTTP, so callbacks take the real route."""
+    started = []
+    def start(callbacks=True):
+        luma = create_app(FAST, render_seconds=0.2, video_bytes=65536, callbacks=callbacks)
+        luma_server, luma_url = start_server(luma)
+        recorder_server, recorder_url = start_server(dream_recorder.app)
+        started.extend([luma_server, recorder_server])
+        for key, value in provider_config(luma_url).items():
+            monkeypatch.setitem(get_config(), key, value)
+        monkeypatch.setitem(get_config(), 'LUMA_CALLBACK_URL', recorder_url)
+        monkeypatch.setitem(get_config(), 'LUMA_CALLBACK_SECRET', 's3cret')
+        monkeypatch.setitem(get_config(), 'LUMA_POLL_INTERVAL', 0.05)
+        monkeypatch.setitem(get_config(), 'LUMA_CALLBACK_TIMEOUT', 5)
+        return luma
+    yield start
+    for server in started:
+        server.stop()
+
+def test_callback_completes_generation_without_polling(servers):
+    luma = servers()
+    generation_id = video.create_generation('a dream')
+    assert video.poll_generation(generation_id).endswith(f"/videos/{generation_id}.mp4")
+    assert luma.stats.calls.get('luma_poll', 0) == 0
+    assert luma.stats.calls['luma_callback'] == 2
+
+def test_polls_when_no_callback_arrives(servers, monkeypatch):
+    luma = servers(callbacks=False)
+    monkeypatch.setitem(get_config(), 'LUMA_CALLBACK_TIMEOUT', 0.05)
+    generation_id = video.create_generation('a dream')
+    assert video.poll_generation(generation_id).endswith(f"/videos/{generation_id}.mp4")
+    assert luma.stats.calls['luma_poll'] > 0
@@ -119,4 +119,60 @@ def test_update_dream_outer_exception(dream_db, caplog):
     with caplog.at_level('ERROR'):
         with pytest.raises(RuntimeError):
             dream_db.update_dream(dream_id, BadUpdates())
-    assert "Error updating dream" in caplog.text 
\ No newline at end of file
+    assert "Error updating dream" in caplog.text
+
+def test_transcription_cache(dream_db):
+    assert dream_db.get_cached_transcription('abc', 'whisper-1') is None
+    dream_db.save_transcription('abc', 'whisper-1', 'a dream')
+    assert dream_db.get_cached_transcription('abc', 'whisper-1') == 'a dream'
+    assert dream_db.get_cached_transcription('abc', 'other-model') is None
+
+def test_find_dreams_by_audio_hash(dream_db):
+    data = DreamData(
+        user_prompt='u', generated_prompt='g', audio_filename='a', video_filename='v', audio_hash='abc'
+    ).model_dump()
+    dream_id = dream_db.save_dream(data)
+    assert [d['id'] for d in dream_db.find_dreams_by_audio_hash('abc')] == [dream_id]
+    assert dream_db.find_dreams_by_audio_hash('def') == []
+
+def test_audio_hash_column_added_to_old_database(temp_db_path):
+    import sqlite3
+    with sqlite3.connect(temp_db_path) as conn:
+        conn.execute('''
+            CREATE TABLE dreams (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_prompt TEXT NOT NULL,
+                generated_prompt TEXT NOT NULL,
+                audio_filename TEXT NOT NULL,
+                video_filename TEXT NOT NULL,
+                thumb_filename TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                status TEXT
+            )
+        ''')
+    db = DreamDB(db_path=temp_db_path)
+    data = DreamData(
+        user_prompt='u', generated_prompt='g', audio_filename='a', video_filename='v', audio_hash='abc'
+    ).model_dump()
+    dream_id = db.save_dream(data)
+    assert db.get_dream(dream_id)['audio_hash'] == 'abc'
+
+def test_stage_timings_are_linked_to_the_dream(dream_db):
+    dream_db.save_stage_timing(5, 'whisper', 1.5)
+    dream_db.save_stage_timing(5, 'gpt', 0.5, ok=False)
+    dream_db.save_stage_timing(6, 'whisper', 2.0)
+    dream_db.link_stage_timings(5, 42)
+    timings = dream_db.get_stage_timings(42)
+    assert [(t['stage'], t['seconds'], t['ok']) for t in timings] == [('whisper', 1.5, 1), ('gpt', 0.5, 0)]
+    # Failed stages are left out of the durations used for percentiles
+    assert sorted(dream_db.get_stage_durations()) == [('whisper', 1.5), ('whisper', 2.0)]
+    assert dream_db.get_stage_durations(limit=1) == [('whisper', 2.0)]
+
+def test_generation_times_by_settings(dream_db):
+    dream_db.save_generation_time('ray-flash-2', '5s', '540p', False, 40.0)
+    dream_db.save_generation_time('ray-flash-2', '5s', '540p', True, 55.0)
+    dream_db.save_generation_time('ray-flash-2', '5s', '540p', False, 42.0)
+    dream_db.save_generation_time('ray-2', '5s', '540p', False, 90.0)
+    assert dream_db.get_generation_times('ray-flash-2', '5s', '540p', False) == [42.0, 40.0]
+    assert dream_db.get_generation_times('ray-flash-2', '5s', '540p', True) == [55.0]
+    assert dream_db.get_generation_times('ray-flash-2', '5s', '540p', False, limit=1) == [42.0]
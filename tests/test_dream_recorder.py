@@ -62,8 +62,12 @@ def test_handle_audio_data_error(monkeypatch, mocker):
     emitted = []
     monkeypatch.setattr(dream_recorder, 'emit', lambda name, data=None: emitted.append((name, data)))
     # Simulate error in bytes(data['data'])
-    dream_recorder.recording_state['is_recording'] = True
-    dream_recorder.handle_audio_data({'data': object()})
+    session = dream_recorder.RecordingSession('sid')
+    session.state['is_recording'] = True
+    monkeypatch.setattr(dream_recorder, 'get_session', lambda sid: session)
+    with dream_recorder.app.test_request_context():
+        dream_recorder.request.sid = 'sid'
+        dream_recorder.handle_audio_data({'data': object()})
     assert any('Error handling audio data' in msg for msg in logs)
     assert any(name == 'error' for name, _ in emitted)
 
@@ -77,8 +81,10 @@ def test_handle_stop_recording_error(monkeypatch, mocker):
         def error(self, msg): pass
     monkeypatch.setattr(dream_recorder, 'logger', FakeLogger())
     # Set not recording
-    dream_recorder.recording_state['is_recording'] = False
-    dream_recorder.handle_stop_recording()
+    monkeypatch.setattr(dream_recorder, 'get_session', lambda sid: dream_recorder.RecordingSession(sid))
+    with dream_recorder.app.test_request_context():
+        dream_recorder.request.sid = 'sid'
+        dream_recorder.handle_stop_recording()
     assert any('Stop recording event received, but not currently recording.' in msg for msg in logs)
 
 def test_handle_show_previous_dream_error(monkeypatch, mocker):
@@ -195,4 +201,30 @@ def test_serve_thumbnail_error(test_client, mocker):
     mocker.patch('functions.config_loader.get_config', return_value={'THUMBS_DIR': 'thumbs'})
     resp = test_client.get('/media/thumbs/missingthumb.jpg')
     assert resp.status_code == 404
-    assert b'Thumbnail not found' in resp.data 
\ No newline at end of file
+    assert b'Thumbnail not found' in resp.data
+
+def test_enforce_recording_limit_stops_abandoned_recording(monkeypatch, mocker):
+    import dream_recorder
+    spool = mocker.Mock(limit_reason='max_seconds', size=10, elapsed=300.0,
+                        dropped_chunks=0, truncated_chunks=0, dropped_bytes=0)
+    session = dream_recorder.RecordingSession('device-1')
+    session.start(spool)
+    monkeypatch.setattr(dream_recorder, 'recording_stats', dict(dream_recorder.recording_stats, limits_reached=0))
+    mock_spawn = mocker.patch('dream_recorder.gevent.spawn')
+    emitted = []
+    monkeypatch.setattr(dream_recorder.socketio, 'emit', lambda name, data=None, room=None: emitted.append((name, data, room)))
+    dream_recorder.enforce_recording_limit(session, spool)
+    assert session.state['status'] == 'processing'
+    assert dream_recorder.recording_stats['limits_reached'] == 1
+    assert emitted[0][0] == 'recording_limit' and emitted[0][2] == 'device-1'
+    assert mock_spawn.call_args[0][1] == 'device-1'
+    assert mock_spawn.call_args[0][5] is spool
+
+def test_enforce_recording_limit_ignores_finished_recording(monkeypatch, mocker):
+    import dream_recorder
+    spool = mocker.Mock(limit_reason='max_seconds')
+    session = dream_recorder.RecordingSession('device-1')
+    session.start(mocker.Mock())
+    mock_finalize = mocker.patch('dream_recorder.finalize_recording')
+    dream_recorder.enforce_recording_limit(session, spool)
+    mock_finalize.assert_not_called()
@@ -177,8 +177,8 @@ def test_main_retry_and_exit(monkeypatch, mock_config, mock_gpio):
 
 def test_main_callback_error_handling(monkeypatch, mock_config, mock_gpio):
     import gpio_service
-    # Patch requests.post to raise
-    monkeypatch.setattr(gpio_service.requests, 'post', lambda *a, **kw: (_ for _ in ()).throw(Exception('fail')))
+    # Patch http_pool.post to raise
+    monkeypatch.setattr(gpio_service.http_pool, 'post', lambda *a, **kw: (_ for _ in ()).throw(Exception('fail')))
     # Patch logger to record errors
     error_logs = []
     class FakeLogger:
@@ -210,14 +210,14 @@ def test_main_callback_error_handling(monkeypatch, mock_config, mock_gpio):
     def single_tap_callback():
         gpio_service.logger.info("Single tap detected, sending to server...")
         try:
-            gpio_service.requests.post(single_tap_url)
+            gpio_service.http_pool.post(single_tap_url)
         except Exception as e:
             if gpio_service.logger:
                 gpio_service.logger.error(f"Error sending single tap: {str(e)}")
     def double_tap_callback():
         gpio_service.logger.info("Double tap detected, sending to server...")
         try:
-            gpio_service.requests.post(double_tap_url)
+            gpio_service.http_pool.post(double_tap_url)
         except Exception as e:
             if gpio_service.logger:
                 gpio_service.logger.error(f"Error sending double tap: {str(e)}")
@@ -237,11 +237,11 @@ def test_main_cli_test_mode(monkeypatch, mock_config, mock_gpio):
     inputs = iter(['s', 'd', 'q'])
     monkeypatch.setattr(builtins, 'input', lambda _: next(inputs))
 
-    # Patch requests.post to simulate successful responses
+    # Patch http_pool.post to simulate successful responses
     class FakeResponse:
         status_code = 200
         text = 'ok'
-    monkeypatch.setattr(gpio_service.requests, 'post', lambda *a, **kw: FakeResponse())
+    monkeypatch.setattr(gpio_service.http_pool, 'post', lambda *a, **kw: FakeResponse())
 
     # Patch print to suppress output
     monkeypatch.setattr(builtins, 'print', lambda *a, **kw: None)
@@ -333,7 +333,7 @@ def test_main_cli_test_mode_errors(monkeypatch, mock_config, mock_gpio):
         elif call_count['count'] == 4:
             return FakeResponse(400)  # double tap non-200
         return FakeResponse(200)
-    monkeypatch.setattr(gpio_service.requests, 'post', fake_post)
+    monkeypatch.setattr(gpio_service.http_pool, 'post', fake_post)
 
     # Patch print to record output
     printed = []
@@ -380,8 +380,8 @@ def test_main_cli_test_mode_unknown_command(monkeypatch, mock_config, mock_gpio)
     inputs = iter(['x', 'q'])
     monkeypatch.setattr(builtins, 'input', lambda _: next(inputs))
 
-    # Patch requests.post to avoid real calls
-    monkeypatch.setattr(gpio_service.requests, 'post', lambda *a, **kw: None)
+    # Patch http_pool.post to avoid real calls
+    monkeypatch.setattr(gpio_service.http_pool, 'post', lambda *a, **kw: None)
 
     # Patch print to record output
     printed = []
@@ -453,8 +453,8 @@ def test_main_keyboardinterrupt_and_exception(monkeypatch, mock_config, mock_gpi
     gpio_service.argparse.ArgumentParser.return_value = fake_parser
     # Patch time.sleep to no-op
     monkeypatch.setattr('time.sleep', lambda s: None)
-    # Patch requests.post to avoid real calls
-    monkeypatch.setattr(gpio_service.requests, 'post', lambda *a, **kw: None)
+    # Patch http_pool.post to avoid real calls
+    monkeypatch.setattr(gpio_service.http_pool, 'post', lambda *a, **kw: None)
     # Test KeyboardInterrupt
     cleanup_called = {}
     monkeypatch.setattr(gpio_service, 'GPIOController', FakeController)
@@ -0,0 +1,90 @@
+import os
+import pytest
+from unittest import mock
+from functions import hls
+
+@pytest.fixture
+def config(monkeypatch, tmp_path):
+    config = {
+        'HLS_ENABLED': True,
+        'HLS_DIR': str(tmp_path / 'hls'),
+        'HLS_RENDITIONS': '360:800k, 720:2500k',
+        'HLS_SEGMENT_SECONDS': 2,
+        'VIDEOS_DIR': str(tmp_path),
+    }
+    monkeypatch.setattr(hls, 'get_config', lambda: config)
+    return config
+
+@pytest.fixture
+def probe(monkeypatch):
+    info = {'codec_type': 'video', 'width': 1280, 'height': 720, 'avg_frame_rate': '24/1'}
+    monkeypatch.setattr(hls.ffmpeg, 'probe', lambda path: {'streams': [info]})
+    return info
+
+def test_renditions(config):
+    assert hls.renditions() == [(720, '2500k'), (360, '800k')]
+    config['HLS_RENDITIONS'] = '720'
+    with pytest.raises(ValueError):
+        hls.renditions()
+
+def test_bits_per_second():
+    assert hls.bits_per_second('2500k') == 2500000
+    assert hls.bits_per_second('1.5M') == 1500000
+    assert hls.bits_per_second('640000') == 640000
+
+def test_package_hls_encodes_renditions_from_one_decode(config, probe, monkeypatch, tmp_path):
+    commands = []
+    monkeypatch.setattr(hls.executor, 'run', lambda stream, name, **k: commands.append(stream.get_args()))
+    playlist = hls.package_hls(str(tmp_path / 'dream.mp4'))
+    assert playlist == str(tmp_path / 'hls' / 'dream' / 'master.m3u8')
+    [args] = commands
+    assert args.count('-i') == 1
+    graph = args[args.index('-filter_complex') + 1]
+    assert 'split=2' in graph and 'scale=-2:720' in graph and 'scale=-2:360' in graph
+    # Keyframes every segment, at the same frames in every rendition
+    assert args.count('48') >= 2 and args.count('-sc_threshold') == 2
+    with open(playlist) as f:
+        master = f.read()
+    assert master.startswith('#EXTM3U\n')
+    assert 'BANDWIDTH=2500000,RESOLUTION=1280x720\n720p/index.m3u8' in master
+    assert 'BANDWIDTH=800000,RESOLUTION=640x360\n360p/index.m3u8' in master
+    assert not os.path.exists(str(tmp_path / 'hls' / 'dream.tmp'))
+    assert hls.playlist_url('dream.mp4') == '/media/hls/dream/master.m3u8'
+
+def test_package_hls_never_upscales(config, probe, monkeypatch, tmp_path):
+    probe.update({'width': 960, 'height': 540})
+    commands = []
+    monkeypatch.setattr(hls.executor, 'run', lambda stream, name, **k: commands.append(stream.get_args()))
+    with open(hls.package_hls(str(tmp_path / 'dream.mp4'))) as f:
+        master = f.read()
+    assert '720p' not in master and 'RESOLUTION=640x360' in master
+    assert 'split' not in commands[0][commands[0].index('-filter_complex') + 1]
+
+def test_package_hls_failure_keeps_previous_package(config, probe, monkeypatch, tmp_path):
+    monkeypatch.setattr(hls.executor, 'run', lambda stream, name, **k: None)
+    hls.package_hls(str(tmp_path / 'dream.mp4'))
+    def fail(stream, name, **kwargs):
+        raise hls.ffmpeg.Error('ffmpeg', b'', b'Unknown encoder libx264')
+    monkeypatch.setattr(hls.executor, 'run', fail)
+    logger = mock.Mock()
+    with pytest.raises(hls.ffmpeg.Error):
+        hls.package_hls(str(tmp_path / 'dream.mp4'), logger)
+    assert 'Unknown encoder' in logger.error.call_args.args[0]
+    assert hls.playlist_url('dream.mp4') == '/media/hls/dream/master.m3u8'
+    assert sorted(os.listdir(tmp_path / 'hls')) == ['dream']
+
+def test_playlist_url_before_packaging(config):
+    assert hls.playlist_url('dream.mp4') is None
+
+def test_remove_hls(config, probe, monkeypatch, tmp_path):
+    monkeypatch.setattr(hls.executor, 'run', lambda stream, name, **k: None)
+    hls.package_hls(str(tmp_path / 'dream.mp4'))
+    hls.remove_hls('dream.mp4')
+    assert hls.playlist_url('dream.mp4') is None
+
+def test_package_in_background_logs_failures(config, monkeypatch):
+    monkeypatch.setattr(hls, 'package_hls', mock.Mock(side_effect=RuntimeError('no ffmpeg')))
+    logger = mock.Mock()
+    hls.package_in_background('dream.mp4', logger).join()
+    hls.package_hls.assert_called_once_with(os.path.join(config['VIDEOS_DIR'], 'dream.mp4'), logger)
+    assert 'no ffmpeg' in logger.warning.call_args.args[0]
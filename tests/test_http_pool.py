@@ -0,0 +1,37 @@
+import pytest
+from functions import http_pool
+from scripts.fake_providers import create_app, start_server, provider_config
+
+FAST = {'whisper': 0.01, 'gpt': 0.01, 'luma_create': 0.01, 'luma_poll': 0.01, 'download': 0.01}
+
+@pytest.fixture
+def server():
+    server, base_url = start_server(create_app(FAST, render_seconds=0, video_bytes=65536))
+    yield base_url
+    server.stop()
+
+def test_requests_reuse_one_connection(server):
+    config = provider_config(server)
+    generation_id = http_pool.post(config['LUMA_GENERATIONS_ENDPOINT'], json={'prompt': 'a dream'}).json()['id']
+    for _ in range(3):
+        assert http_pool.get(f"{config['LUMA_API_URL']}/generations/{generation_id}").json()['state'] == 'completed'
+    stats = http_pool.connection_stats()[server]
+    assert stats == {'requests': 4, 'connections': 1, 'reused': 3, 'reuse_ratio': 0.75}
+
+def test_default_timeouts(monkeypatch):
+    sent = []
+    monkeypatch.setattr(http_pool, 'get_config', lambda: {'HTTP_CONNECT_TIMEOUT': 2, 'HTTP_READ_TIMEOUT': 30})
+    monkeypatch.setattr(http_pool.session(), 'request', lambda method, url, **kwargs: sent.append(kwargs))
+    http_pool.get('http://example.invalid/')
+    http_pool.post('http://example.invalid/', timeout=1)
+    assert sent == [{'timeout': (2.0, 30.0)}, {'timeout': 1}]
+
+def test_openai_client_counts_reused_connections(server):
+    client = http_pool.openai_http_client()
+    try:
+        for _ in range(3):
+            assert client.post(f"{server}/v1/chat/completions", json={'model': 'gpt-4o-mini'}).status_code == 200
+    finally:
+        client.close()
+    stats = http_pool.connection_stats()[server]
+    assert stats['requests'] == 3 and stats['connections'] == 1 and stats['reused'] == 2
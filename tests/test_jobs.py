@@ -0,0 +1,42 @@
+import pytest
+from unittest import mock
+from functions.dream_db import DreamDB
+from functions.jobs import PipelineJob
+
+@pytest.fixture
+def dream_db(tmp_path):
+    with mock.patch.object(DreamDB, '_init_sample_dreams'):
+        return DreamDB(db_path=str(tmp_path / 'dreams.db'))
+
+def test_checkpoint_is_persisted(dream_db):
+    job = PipelineJob.create(dream_db, 'kiosk')
+    job.checkpoint('prompting', transcription='a dream')
+    row = dream_db.get_job(job.id)
+    assert row['state'] == 'prompting'
+    assert row['session_key'] == 'kiosk'
+    assert row['data'] == {'transcription': 'a dream'}
+
+def test_unfinished_jobs_reload_with_their_data(dream_db):
+    running = PipelineJob.create(dream_db, 'kiosk')
+    running.checkpoint('generating', video_prompt='prompt', generation_id='gen-1')
+    done = PipelineJob.create(dream_db)
+    done.checkpoint('done', dream_id=3)
+    failed = PipelineJob.create(dream_db)
+    failed.fail(Exception('boom'))
+    rows = dream_db.get_unfinished_jobs()
+    assert [r['id'] for r in rows] == [running.id]
+    job = PipelineJob.from_row(dream_db, rows[0])
+    assert job.state == 'generating'
+    assert job.data['generation_id'] == 'gen-1'
+    assert dream_db.get_job(failed.id)['error'] == 'boom'
+
+def test_unknown_state_rejected():
+    with pytest.raises(ValueError):
+        PipelineJob().checkpoint('sleeping')
+
+def test_checkpoint_failure_does_not_raise():
+    db = mock.Mock()
+    db.update_job.side_effect = Exception('disk full')
+    job = PipelineJob(db, 1)
+    job.checkpoint('transcribing', wav_filename='a.wav')
+    assert job.data['wav_filename'] == 'a.wav'
@@ -0,0 +1,39 @@
+import pytest
+from unittest import mock
+import scripts.migrate_audio_archive as migrate_script
+
+def fake_encode(src, dst, fmt):
+    with open(dst, 'wb') as f:
+        f.write(b'x' * 10)
+
+def test_migrate_converts_wav_recordings(monkeypatch, tmp_path):
+    monkeypatch.setattr(migrate_script, 'encode_audio_file', fake_encode)
+    (tmp_path / 'a.wav').write_bytes(b'w' * 100)
+    db = mock.Mock()
+    db.get_all_dreams.return_value = [
+        {'id': 1, 'audio_filename': 'a.wav'},
+        {'id': 2, 'audio_filename': 'b.ogg'},
+        {'id': 3, 'audio_filename': 'missing.wav'},
+    ]
+    results = migrate_script.migrate(db, 'opus', str(tmp_path))
+    assert results == [(1, 100, 10)]
+    db.update_dream.assert_called_once_with(1, {'audio_filename': 'a.ogg'})
+    assert not (tmp_path / 'a.wav').exists()
+    assert (tmp_path / 'a.ogg').exists()
+
+def test_migrate_dry_run_changes_nothing(monkeypatch, tmp_path):
+    monkeypatch.setattr(migrate_script, 'encode_audio_file', fake_encode)
+    (tmp_path / 'a.wav').write_bytes(b'w' * 100)
+    db = mock.Mock()
+    db.get_all_dreams.return_value = [{'id': 1, 'audio_filename': 'a.wav'}]
+    assert migrate_script.migrate(db, 'flac', str(tmp_path), dry_run=True) == []
+    db.update_dream.assert_not_called()
+    assert (tmp_path / 'a.wav').exists()
+
+def test_migrate_rejects_wav_target(tmp_path):
+    with pytest.raises(ValueError):
+        migrate_script.migrate(mock.Mock(), 'wav', str(tmp_path))
+
+def test_print_summary(capsys):
+    migrate_script.print_summary([(1, 100, 10), (2, 200, 20)])
+    assert 'saved 270 bytes' in capsys.readouterr().out
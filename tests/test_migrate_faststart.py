@@ -0,0 +1,61 @@
+import struct
+import scripts.migrate_faststart as migrate_script
+
+def box(kind, payload=b''):
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+def large_box(kind, payload):
+    return struct.pack('>I4sQ', 1, kind, 16 + len(payload)) + payload
+
+def write_mp4(path, *boxes):
+    path.write_bytes(b''.join(boxes))
+    return path
+
+def fake_rewrite(stream, name, **kwargs):
+    # Stream copy with the index moved to the front
+    args = stream.get_args()
+    with open(args[-1], 'wb') as f:
+        f.write(box(b'ftyp', b'isom') + box(b'moov', b'index') + box(b'mdat', b'frames'))
+
+def test_is_faststart(tmp_path):
+    assert migrate_script.is_faststart(write_mp4(tmp_path / 'a.mp4', box(b'ftyp', b'isom'), box(b'moov'), box(b'mdat', b'x')))
+    assert not migrate_script.is_faststart(write_mp4(tmp_path / 'b.mp4', box(b'ftyp'), box(b'mdat', b'x' * 100), box(b'moov')))
+    # 64-bit box sizes are followed to the next box
+    assert migrate_script.is_faststart(write_mp4(tmp_path / 'c.mp4', box(b'ftyp'), large_box(b'free', b'x' * 40), box(b'moov')))
+    assert not migrate_script.is_faststart(write_mp4(tmp_path / 'd.mp4', b'junk'))
+
+def test_migrate_rewrites_only_videos_with_trailing_index(monkeypatch, tmp_path):
+    monkeypatch.setattr(migrate_script.executor, 'run', fake_rewrite)
+    slow = write_mp4(tmp_path / 'slow.mp4', box(b'ftyp', b'isom'), box(b'mdat', b'frames'), box(b'moov', b'index'))
+    write_mp4(tmp_path / 'fast.mp4', box(b'ftyp', b'isom'), box(b'moov', b'index'), box(b'mdat', b'frames'))
+    (tmp_path / 'notes.txt').write_text('not a video')
+    size = slow.stat().st_size
+    results = migrate_script.migrate(str(tmp_path))
+    assert [(name, size_) for name, size_, seconds in results] == [('slow.mp4', size)]
+    assert migrate_script.is_faststart(slow)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['fast.mp4', 'notes.txt', 'slow.mp4']
+
+def test_migrate_dry_run_changes_nothing(monkeypatch, tmp_path):
+    def fail(*a, **k): raise AssertionError('dry run should not rewrite')
+    monkeypatch.setattr(migrate_script.executor, 'run', fail)
+    slow = write_mp4(tmp_path / 'slow.mp4', box(b'mdat', b'frames'), box(b'moov'))
+    before = slow.read_bytes()
+    assert migrate_script.migrate(str(tmp_path), dry_run=True) == []
+    assert slow.read_bytes() == before
+
+def test_migrate_leaves_videos_ffmpeg_cannot_copy(monkeypatch, tmp_path, capsys):
+    def fail(stream, name, **kwargs):
+        open(stream.get_args()[-1], 'wb').close()
+        raise migrate_script.ffmpeg.Error('ffmpeg', b'', b'moov atom not found')
+    monkeypatch.setattr(migrate_script.executor, 'run', fail)
+    broken = write_mp4(tmp_path / 'broken.mp4', box(b'mdat', b'frames'))
+    assert migrate_script.migrate(str(tmp_path)) == []
+    assert broken.read_bytes() == box(b'mdat', b'frames')
+    assert [p.name for p in tmp_path.iterdir()] == ['broken.mp4']
+    assert 'moov atom not found' in capsys.readouterr().out
+
+def test_print_summary(capsys):
+    migrate_script.print_summary([('a.mp4', 3000000, 1.0), ('b.mp4', 1000000, 1.0)])
+    assert 'Rewrote 2 videos: 4000000 bytes' in capsys.readouterr().out
+    migrate_script.print_summary([])
+    assert 'No videos needed rewriting' in capsys.readouterr().out
@@ -0,0 +1,84 @@
+import pytest
+from unittest import mock
+from functions import polling
+
+KEY = ('model', '5s', '540p', False)
+
+@pytest.fixture
+def poll_config(monkeypatch):
+    config = {
+        'LUMA_MODEL': 'model',
+        'LUMA_DURATION': '5s',
+        'LUMA_RESOLUTION': '540p',
+        'LUMA_POLL_INTERVAL': 5,
+        'LUMA_POLL_MIN_INTERVAL': 1,
+        'LUMA_POLL_MAX_INTERVAL': 30,
+        'LUMA_POLL_BACKOFF_MAX': 60,
+    }
+    monkeypatch.setattr(polling, 'get_config', lambda: config)
+    return config
+
+def test_generation_key(poll_config):
+    assert polling.generation_key() == KEY
+    assert polling.generation_key(extend=True) == ('model', '5s', '540p', True)
+
+def test_window_needs_history():
+    times = polling.GenerationTimes()
+    times.record(KEY, 40)
+    times.record(KEY, 50)
+    assert times.window(KEY) is None
+    for seconds in range(41, 59):
+        times.record(KEY, seconds)
+    assert times.window(KEY) == (40, 57)
+
+def test_history_is_loaded_and_saved_through_the_db():
+    db = mock.Mock()
+    db.get_generation_times.return_value = [45.0, 44.0, 43.0]
+    times = polling.GenerationTimes(history=3)
+    times.attach(db)
+    assert times.window(KEY) == (43.0, 45.0)
+    db.get_generation_times.assert_called_once_with(*KEY, limit=3)
+    times.record(KEY, 60.0)
+    db.save_generation_time.assert_called_once_with(*KEY, 60.0)
+    # Only the newest `history` samples count
+    assert list(times.samples[KEY]) == [44.0, 45.0, 60.0]
+
+def test_history_survives_db_errors():
+    db = mock.Mock()
+    db.get_generation_times.side_effect = Exception('locked')
+    db.save_generation_time.side_effect = Exception('locked')
+    times = polling.GenerationTimes()
+    times.attach(db)
+    times.record(KEY, 40.0)
+    assert list(times.samples[KEY]) == [40.0]
+
+def test_next_poll_delay_without_history(poll_config):
+    assert polling.next_poll_delay(0, None) == 5
+    poll_config['LUMA_POLL_ADAPTIVE'] = False
+    assert polling.next_poll_delay(0, (40, 56)) == 5
+
+def test_next_poll_delay_follows_window(poll_config):
+    window = (40, 56)
+    # Sparse before the window, capped at LUMA_POLL_MAX_INTERVAL
+    assert polling.next_poll_delay(0, window) == 30
+    assert polling.next_poll_delay(30, window) == 10
+    assert polling.next_poll_delay(39.5, window) == 1
+    # WINDOW_POLLS checks across the window
+    assert polling.next_poll_delay(40, window) == 16 / polling.WINDOW_POLLS
+    # Never sparser than the fixed interval inside or after the window
+    assert polling.next_poll_delay(40, (40, 120)) == 5
+    assert polling.next_poll_delay(80, window) == 5
+
+def test_backoff_delay(poll_config, monkeypatch):
+    monkeypatch.setattr(polling.random, 'uniform', lambda a, b: b)
+    assert [polling.backoff_delay(n) for n in (1, 2, 3)] == [5, 10, 20]
+    assert polling.backoff_delay(10) == 60
+    monkeypatch.setattr(polling.random, 'uniform', lambda a, b: a)
+    assert polling.backoff_delay(2) == 5
+    assert polling.backoff_delay(1, retry_after=12) == 12
+    assert polling.backoff_delay(1, retry_after=600) == 60
+
+def test_retry_after_seconds():
+    assert polling.retry_after_seconds(mock.Mock(headers={'Retry-After': '7'})) == 7.0
+    assert polling.retry_after_seconds(mock.Mock(headers={})) is None
+    assert polling.retry_after_seconds(mock.Mock(headers={'Retry-After': 'Wed, 21 Oct 2026 07:28:00 GMT'})) is None
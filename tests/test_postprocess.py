@@ -0,0 +1,75 @@
+import gevent
+import pytest
+from unittest import mock
+from gevent.event import Event
+from functions import postprocess
+from functions.postprocess import PostProcessExecutor, ffmpeg_usage
+from functions.scheduler import StageQueue
+
+BENCH = b'frame=  120 fps= 30\nbench: utime=3.250s stime=0.250s rtime=4.100s\nbench: maxrss=81234KiB\n'
+
+@pytest.fixture
+def config(monkeypatch):
+    config = {}
+    monkeypatch.setattr(postprocess, 'get_config', lambda: config)
+    monkeypatch.setattr(postprocess.shutil, 'which', lambda name: f"/usr/bin/{name}")
+    return config
+
+def test_ffmpeg_usage():
+    assert ffmpeg_usage(BENCH) == (3.5, 81234)
+    assert ffmpeg_usage(b'no benchmark here') == (None, None)
+    assert ffmpeg_usage(None) == (None, None)
+
+def test_command_defaults_to_low_priority(config):
+    assert PostProcessExecutor().command() == ['nice', '-n', '10', 'ionice', '-c', '3', 'ffmpeg', '-benchmark']
+
+def test_command_pins_cores_and_caps_threads(config):
+    config.update({'FFMPEG_NICE': 0, 'FFMPEG_IONICE_IDLE': False, 'FFMPEG_CPUS': '1-3', 'FFMPEG_THREADS': 2})
+    assert PostProcessExecutor().command() == [
+        'taskset', '-c', '1-3', 'ffmpeg', '-benchmark', '-threads', '2', '-filter_threads', '2']
+
+def test_command_skips_missing_tools(config, monkeypatch):
+    monkeypatch.setattr(postprocess.shutil, 'which', lambda name: None)
+    config['FFMPEG_CPUS'] = '1'
+    assert PostProcessExecutor().command() == ['ffmpeg', '-benchmark']
+
+def test_run_records_cpu_time(config, monkeypatch):
+    executor = PostProcessExecutor()
+    run = mock.Mock(return_value=(b'', BENCH))
+    monkeypatch.setattr(postprocess.ffmpeg, 'run', run)
+    assert executor.run('stream', 'process_video', quiet=True) == (b'', BENCH)
+    assert run.call_args.kwargs['cmd'][-2:] == ['ffmpeg', '-benchmark']
+    [job] = executor.finished
+    assert job['name'] == 'process_video' and job['ok'] is True
+    assert job['cpu_seconds'] == 3.5 and job['max_rss_kb'] == 81234
+    assert executor.snapshot()['total_cpu_seconds'] == 3.5
+
+def test_run_records_failed_jobs(config, monkeypatch):
+    executor = PostProcessExecutor()
+    def fail(stream, **kwargs):
+        raise postprocess.ffmpeg.Error('ffmpeg', b'', b'Invalid data\n' + BENCH)
+    monkeypatch.setattr(postprocess.ffmpeg, 'run', fail)
+    with pytest.raises(postprocess.ffmpeg.Error):
+        executor.run('stream', 'process_thumbnail')
+    [job] = executor.finished
+    assert job['ok'] is False and job['cpu_seconds'] == 3.5
+    assert executor.running == []
+
+def test_snapshot_reports_queue_and_running_jobs(config):
+    executor = PostProcessExecutor()
+    queue = StageQueue('ffmpeg', 1)
+    release = Event()
+
+    def encode(name):
+        with queue.slot(), executor.job(name):
+            release.wait()
+
+    workers = [gevent.spawn(encode, name) for name in ('first', 'second', 'third')]
+    gevent.sleep(0)
+    snapshot = executor.snapshot(queue)
+    assert snapshot['queue_depth'] == 2
+    assert [job['name'] for job in snapshot['running']] == ['first']
+    release.set()
+    gevent.joinall(workers)
+    assert [job['name'] for job in executor.snapshot(queue)['recent']] == ['first', 'second', 'third']
+    assert executor.snapshot(queue)['queue_depth'] == 0
@@ -0,0 +1,125 @@
+import os
+import pytest
+from functions import recording
+
+def test_spool_writes_chunks_to_disk(tmp_path):
+    spool = recording.RecordingSpool(directory=str(tmp_path), filename='spool.webm', buffer_size=4, preallocate=0)
+    spool.write(b'ab')
+    assert spool._buffer == bytearray(b'ab')
+    spool.write(b'cd')
+    # Buffer reached buffer_size and was flushed to the file
+    assert spool._buffer == bytearray()
+    spool.write(b'e')
+    path = spool.close()
+    with open(path, 'rb') as f:
+        assert f.read() == b'abcde'
+    assert spool.size == 5
+
+def test_spool_buffer_stays_bounded(tmp_path):
+    spool = recording.RecordingSpool(directory=str(tmp_path), buffer_size=1024, preallocate=0, max_bytes=0)
+    chunk = b'x' * 1600
+    peak = 0
+    for _ in range(6000):  # ~10 minutes of 128 kbps chunks
+        spool.write(chunk)
+        peak = max(peak, len(spool._buffer))
+    assert peak < 1024 + len(chunk)
+    assert os.path.getsize(spool.close()) == 6000 * len(chunk)
+    spool.discard()
+
+def test_spool_preallocation_is_trimmed_on_close(tmp_path):
+    spool = recording.RecordingSpool(directory=str(tmp_path), filename='spool.webm', preallocate=65536)
+    spool.write(b'abc')
+    path = spool.close()
+    assert os.path.getsize(path) == 3
+
+def test_spool_write_after_close_raises(tmp_path):
+    spool = recording.RecordingSpool(directory=str(tmp_path), preallocate=0)
+    spool.close()
+    with pytest.raises(ValueError):
+        spool.write(b'a')
+
+def test_spool_mmap_and_discard(tmp_path):
+    spool = recording.RecordingSpool(directory=str(tmp_path), preallocate=0)
+    spool.write(b'hello')
+    mapped = spool.mmap()
+    assert mapped[:] == b'hello'
+    mapped.close()
+    spool.discard()
+    assert not os.path.exists(spool.path)
+
+def test_spool_mmap_empty(tmp_path):
+    spool = recording.RecordingSpool(directory=str(tmp_path), preallocate=0)
+    assert spool.mmap() == b''
+    spool.discard()
+
+def test_read_recording_accepts_chunk_list():
+    assert recording.read_recording([b'ab', b'c']) == b'abc'
+
+def test_spool_persist_survives_discard(tmp_path):
+    spool = recording.RecordingSpool(directory=str(tmp_path), preallocate=0)
+    spool.write(b'abc')
+    target = tmp_path / 'kept.webm'
+    assert spool.persist(str(target)) == str(target)
+    spool.discard()
+    assert target.read_bytes() == b'abc'
+
+def test_spool_truncates_and_drops_past_max_bytes(tmp_path):
+    spool = recording.RecordingSpool(directory=str(tmp_path), preallocate=0, max_bytes=5, max_seconds=0)
+    assert spool.write(b'abc') == 3
+    assert spool.limit_reason is None
+    assert spool.write(b'defg') == 2
+    assert spool.limit_reason == 'max_bytes'
+    assert spool.write(b'hij') == 0
+    assert bytes(spool.mmap()) == b'abcde'
+    assert spool.truncated_chunks == 1
+    assert spool.dropped_chunks == 1
+    assert spool.dropped_bytes == 5
+    spool.discard()
+
+def test_spool_drops_chunks_past_max_seconds(tmp_path, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(recording.time, 'monotonic', lambda: now[0])
+    spool = recording.RecordingSpool(directory=str(tmp_path), preallocate=0, max_bytes=0, max_seconds=10)
+    assert spool.write(b'ab') == 2
+    now[0] = 110.0
+    assert spool.limit_reason == 'max_seconds'
+    assert spool.write(b'cd') == 0
+    assert spool.size == 2
+    spool.discard()
+
+def test_recording_session_gives_each_recording_its_own_state(tmp_path):
+    session = recording.RecordingSession('kiosk')
+    assert session.state == recording.new_recording_state()
+    first = recording.RecordingSpool(directory=str(tmp_path), preallocate=0)
+    session.start(first)
+    state = session.state
+    assert session.is_recording and session.is_busy
+    session.stop()
+    assert state['status'] == 'processing'
+    session.start(recording.RecordingSpool(directory=str(tmp_path), preallocate=0))
+    assert session.state is not state
+    assert state['status'] == 'processing'
+    assert session.spool is not first
+    first.discard()
+    session.spool.discard()
+
+def test_spool_hashes_kept_audio(tmp_path):
+    import hashlib
+    spool = recording.RecordingSpool(directory=str(tmp_path), preallocate=0, max_bytes=4, max_seconds=0)
+    spool.write(b'abc')
+    spool.write(b'def')
+    assert recording.recording_hash(spool) == hashlib.sha256(b'abcd').hexdigest()
+    spool.discard()
+
+def test_recording_hash_of_chunk_list():
+    import hashlib
+    assert recording.recording_hash([b'ab', b'cd']) == hashlib.sha256(b'abcd').hexdigest()
+
+def test_spool_snapshot_while_recording(tmp_path):
+    spool = recording.RecordingSpool(directory=str(tmp_path), buffer_size=1024, preallocate=4096)
+    spool.write(b'abc')
+    assert spool.snapshot() == b'abc'
+    spool.write(b'def')
+    assert spool.snapshot() == b'abcdef'
+    spool.close()
+    assert spool.snapshot() == b'abcdef'
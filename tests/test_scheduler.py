@@ -0,0 +1,110 @@
+import gevent
+import pytest
+from gevent.event import Event
+from functions import scheduler as scheduler_module
+from functions.scheduler import PipelineScheduler, set_job_context
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    config = {'PIPELINE_WHISPER_CONCURRENCY': 1}
+    monkeypatch.setattr(scheduler_module, 'get_config', lambda: config)
+    return config
+
+def run_jobs(sched, stage, owners, hold=0.01):
+    """Start one greenlet per owner that holds a slot in `stage`; return the order they got in."""
+    order = []
+    peak = [0]
+    running = [0]
+
+    def work(owner):
+        with sched.slot(stage, owner=owner):
+            order.append(owner)
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            gevent.sleep(hold)
+            running[0] -= 1
+
+    gevent.joinall([gevent.spawn(work, owner) for owner in owners])
+    return order, peak[0]
+
+def test_limit_caps_concurrency():
+    sched = PipelineScheduler()
+    _, peak = run_jobs(sched, 'luma_poll', ['a'] * 10)
+    assert peak == 4  # default PIPELINE_LUMA_POLL_CONCURRENCY
+    assert sched.snapshot()['luma_poll']['completed'] == 10
+
+def test_limit_comes_from_config(limits):
+    limits['PIPELINE_LUMA_POLL_CONCURRENCY'] = 2
+    _, peak = run_jobs(PipelineScheduler(), 'luma_poll', ['a'] * 6)
+    assert peak == 2
+
+def test_zero_limit_is_unlimited(limits):
+    limits['PIPELINE_FFMPEG_CONCURRENCY'] = 0
+    _, peak = run_jobs(PipelineScheduler(), 'ffmpeg', ['a'] * 6)
+    assert peak == 6
+
+def test_owners_are_served_fairly():
+    # 'a' queues a burst before 'b' and 'c' arrive; they don't wait for all of it
+    order, _ = run_jobs(PipelineScheduler(), 'whisper', ['a', 'a', 'a', 'a', 'b', 'c'])
+    assert order == ['a', 'b', 'c', 'a', 'a', 'a']
+
+def test_snapshot_shows_running_and_waiting():
+    sched = PipelineScheduler()
+    release = Event()
+
+    def work(owner):
+        with sched.slot('whisper', owner=owner, job_id=7):
+            release.wait()
+
+    greenlets = [gevent.spawn(work, owner) for owner in ('a', 'b')]
+    gevent.sleep(0)
+    snapshot = sched.snapshot()['whisper']
+    assert snapshot['limit'] == 1
+    assert [t['owner'] for t in snapshot['active']] == ['a']
+    assert [t['owner'] for t in snapshot['waiting']] == ['b']
+    assert snapshot['waiting'][0]['job_id'] == 7
+    release.set()
+    gevent.joinall(greenlets)
+    assert sched.snapshot()['whisper']['active'] == []
+
+def test_killed_waiter_leaves_the_queue():
+    sched = PipelineScheduler()
+    release = Event()
+
+    def work():
+        with sched.slot('whisper'):
+            release.wait()
+
+    first = gevent.spawn(work)
+    second = gevent.spawn(work)
+    gevent.sleep(0)
+    second.kill()
+    assert sched.snapshot()['whisper']['waiting'] == []
+    release.set()
+    first.join()
+    assert sched.snapshot()['whisper']['completed'] == 1
+
+def test_slot_uses_job_context():
+    sched = PipelineScheduler()
+    seen = []
+
+    def work():
+        set_job_context('kiosk', 3)
+        with sched.slot('gpt'):
+            seen.append(sched.snapshot()['gpt']['active'][0])
+
+    gevent.spawn(work).join()
+    assert seen[0]['owner'] == 'kiosk'
+    assert seen[0]['job_id'] == 3
+
+def test_slot_is_released_on_error():
+    sched = PipelineScheduler()
+    with pytest.raises(RuntimeError):
+        with sched.slot('whisper'):
+            raise RuntimeError('boom')
+    assert sched.snapshot()['whisper']['active'] == []
+
+def test_unknown_stage():
+    with pytest.raises(ValueError):
+        with PipelineScheduler().slot('upload'):
+            pass
@@ -82,6 +82,17 @@ def test_process_audio_external_api_failure(mocker):
     assert any(x['name'] == 'error' and 'External API failed' in x['args'][0]['message'] for x in received)
     client.disconnect()
 
+def test_binary_audio_stream(socketio_client, mocker):
+    mock_process = mocker.patch('dream_recorder.process_audio', autospec=True)
+    socketio_client.emit('start_recording')
+    socketio_client.emit('stream_recording', {'data': b'\x01\x02\x03', 'timestamp': 0})
+    socketio_client.emit('stream_recording', {'data': [4, 5], 'timestamp': 0})
+    socketio_client.emit('stop_recording')
+    time.sleep(0.1)
+    spool = mock_process.call_args[0][4]
+    assert bytes(spool.mmap()) == b'\x01\x02\x03\x04\x05'
+    spool.discard()
+
 def test_large_audio_stream(socketio_client):
     socketio_client.emit('start_recording')
     for _ in range(100):
@@ -96,4 +107,88 @@ def test_state_reset_after_recording(socketio_client, mocker):
     # Start again, should reset state
     socketio_client.emit('start_recording')
     received = socketio_client.get_received()
-    assert any(x['name'] == 'state_update' and x['args'][0]['status'] == 'recording' for x in received) 
\ No newline at end of file
+    assert any(x['name'] == 'state_update' and x['args'][0]['status'] == 'recording' for x in received) 
+def new_client(socketio_client, monkeypatch, **kwargs):
+    """A fresh client with no session left over from earlier tests."""
+    import dream_recorder
+    # Earlier tests may have reloaded the module, replacing its SocketIO instance
+    monkeypatch.setattr(dream_recorder, 'socketio', socketio_client.socketio)
+    return socketio_client.socketio.test_client(socketio_client.app, **kwargs)
+
+def test_recording_limit_stops_and_processes(socketio_client, mocker, monkeypatch):
+    from functions.config_loader import get_config
+    monkeypatch.setitem(get_config(), 'RECORDING_MAX_BYTES', 4)
+    mock_process = mocker.patch('dream_recorder.process_audio', autospec=True)
+    client = new_client(socketio_client, monkeypatch)
+    client.get_received()
+    client.emit('start_recording')
+    client.emit('stream_recording', {'data': b'\x01\x02\x03', 'timestamp': 0})
+    client.emit('stream_recording', {'data': b'\x04\x05\x06', 'timestamp': 0})
+    client.emit('stream_recording', {'data': b'\x07', 'timestamp': 0})
+    time.sleep(0.1)
+    received = client.get_received()
+    limits = [x['args'][0] for x in received if x['name'] == 'recording_limit']
+    assert limits and limits[0]['reason'] == 'max_bytes' and limits[0]['bytes'] == 4
+    assert any(x['name'] == 'state_update' and x['args'][0]['status'] == 'processing' for x in received)
+    mock_process.assert_called_once()
+    spool = mock_process.call_args[0][4]
+    assert bytes(spool.mmap()) == b'\x01\x02\x03\x04'
+    spool.discard()
+    client.disconnect()
+
+def test_concurrent_recordings_are_isolated(socketio_client, mocker, monkeypatch):
+    mock_process = mocker.patch('dream_recorder.process_audio', autospec=True)
+    kiosk = new_client(socketio_client, monkeypatch, auth={'device_id': 'kiosk'})
+    phone = new_client(socketio_client, monkeypatch, auth={'device_id': 'phone'})
+    kiosk.emit('start_recording')
+    phone.emit('start_recording')
+    kiosk.emit('stream_recording', {'data': b'kiosk', 'timestamp': 0})
+    phone.emit('stream_recording', {'data': b'phone', 'timestamp': 0})
+    phone.emit('stop_recording')
+    kiosk.emit('stream_recording', {'data': b'!', 'timestamp': 0})
+    kiosk.emit('stop_recording')
+    time.sleep(0.1)
+    calls = {c[0][0]: c[0] for c in mock_process.call_args_list}
+    assert set(calls) == {'kiosk', 'phone'}
+    assert bytes(calls['kiosk'][4].mmap()) == b'kiosk!'
+    assert bytes(calls['phone'][4].mmap()) == b'phone'
+    # Each recording has its own state dict
+    assert calls['kiosk'][3] is not calls['phone'][3]
+    for args in calls.values():
+        args[4].discard()
+    kiosk.disconnect()
+    phone.disconnect()
+
+def test_device_session_survives_reconnect(socketio_client, mocker, monkeypatch):
+    import dream_recorder
+    mock_process = mocker.patch('dream_recorder.process_audio', autospec=True)
+    client = new_client(socketio_client, monkeypatch, auth={'device_id': 'tablet'})
+    client.emit('start_recording')
+    client.emit('stream_recording', {'data': b'abc', 'timestamp': 0})
+    client.disconnect()
+    assert dream_recorder.recording_sessions['tablet'].is_recording
+    client = new_client(socketio_client, monkeypatch, auth={'device_id': 'tablet'})
+    received = client.get_received()
+    assert any(x['name'] == 'state_update' and x['args'][0]['is_recording'] for x in received)
+    client.emit('stream_recording', {'data': b'def', 'timestamp': 0})
+    client.emit('stop_recording')
+    time.sleep(0.1)
+    spool = mock_process.call_args[0][4]
+    assert bytes(spool.mmap()) == b'abcdef'
+    spool.discard()
+    client.disconnect()
+    assert 'tablet' not in dream_recorder.recording_sessions
+
+def test_disconnect_processes_sid_session(socketio_client, mocker, monkeypatch):
+    import dream_recorder
+    mock_process = mocker.patch('dream_recorder.process_audio', autospec=True)
+    client = new_client(socketio_client, monkeypatch)
+    client.emit('start_recording')
+    client.emit('stream_recording', {'data': b'abc', 'timestamp': 0})
+    client.disconnect()
+    time.sleep(0.1)
+    mock_process.assert_called_once()
+    spool = mock_process.call_args[0][4]
+    assert bytes(spool.mmap()) == b'abc'
+    spool.discard()
+    assert mock_process.call_args[0][0] not in dream_recorder.recording_sessions
@@ -0,0 +1,143 @@
+import pytest
+from unittest import mock
+from functions import speculative
+from functions.jobs import PipelineJob
+from functions.recording import RecordingSpool
+
+@pytest.fixture
+def config(monkeypatch):
+    config = {
+        'LUMA_EXTEND': False,
+        'WHISPER_MODEL': 'whisper-1',
+        'OPENAI_API_KEY': 'sk-test',
+        'SPECULATIVE_INTERVAL_SECONDS': 0.01,
+        'SPECULATIVE_STABLE_SECONDS': 1.0,
+        'SPECULATIVE_MIN_WORDS': 3,
+        'SPECULATIVE_MATCH_RATIO': 0.9,
+        'SPECULATIVE_MAX_GENERATIONS': 2,
+        'SPECULATIVE_WHISPER_BASE_URL': 'http://localhost:8000/v1',
+    }
+    monkeypatch.setattr(speculative, 'get_config', lambda: config)
+    # Each partial transcript is taken a second after the previous one
+    clock = iter(range(1000))
+    monkeypatch.setattr(speculative, 'time', mock.Mock(monotonic=lambda: next(clock)))
+    return config
+
+@pytest.fixture
+def luma(monkeypatch):
+    """Fake GPT and Luma calls; returns the created and cancelled generation IDs."""
+    calls = {'created': [], 'cancelled': []}
+    def fake_create(prompt, logger=None):
+        calls['created'].append(prompt)
+        return f"gen-{len(calls['created'])}"
+    monkeypatch.setattr(speculative, 'create_generation', fake_create)
+    monkeypatch.setattr(speculative, 'cancel_generation', lambda gen_id, logger=None: calls['cancelled'].append(gen_id))
+    monkeypatch.setattr(speculative.audio, 'generate_video_prompt', lambda text, **kwargs: f"video of {text}")
+    return calls
+
+def make_speculation(partials):
+    spec = speculative.SpeculativeGeneration(mock.Mock(), owner='kiosk')
+    spec.transcribe_partial = mock.Mock(side_effect=partials)
+    return spec
+
+def test_transcripts_match():
+    assert speculative.transcripts_match('I was flying, over a city.', 'i was flying over a city')
+    assert not speculative.transcripts_match('I was flying', 'I was flying over a city of glass')
+    assert not speculative.transcripts_match('', '')
+
+def test_generation_starts_once_transcript_is_stable(config, luma):
+    spec = make_speculation(['I was', 'I was flying over a city', 'I was flying over a city'])
+    spec.step()
+    spec.step()
+    assert luma['created'] == []
+    spec.step()
+    assert luma['created'] == ['video of I was flying over a city']
+    assert spec.generation_id == 'gen-1'
+
+def test_short_transcripts_are_not_speculated(config, luma):
+    spec = make_speculation(['I was', 'I was'])
+    spec.step()
+    spec.step()
+    assert luma['created'] == []
+
+def test_generation_cancelled_when_speaker_continues(config, luma):
+    spec = make_speculation(['I was flying', 'I was flying', 'I was flying over a city of glass and rivers'])
+    spec.step()
+    spec.step()
+    spec.step()
+    assert luma['cancelled'] == ['gen-1']
+    assert spec.generation_id is None
+
+def test_max_generations(config, luma):
+    config['SPECULATIVE_MAX_GENERATIONS'] = 1
+    spec = make_speculation(['a b c', 'a b c', 'a b c d e f', 'a b c d e f'])
+    for _ in range(4):
+        spec.step()
+    assert len(luma['created']) == 1
+
+def test_resolve_adopts_matching_generation(config, luma):
+    spec = make_speculation(['I was flying over a city', 'I was flying over a city'])
+    spec.step()
+    spec.step()
+    job = PipelineJob()
+    assert spec.resolve(job, 'I was flying over a city.') is True
+    assert job.data == {'video_prompt': 'video of I was flying over a city', 'luma_extend': False, 'generation_id': 'gen-1'}
+    spec.discard()
+    assert luma['cancelled'] == []
+
+def test_resolve_cancels_diverging_generation(config, luma):
+    spec = make_speculation(['I was flying over a city', 'I was flying over a city'])
+    spec.step()
+    spec.step()
+    job = PipelineJob()
+    assert spec.resolve(job, 'I was swimming under the sea with whales') is False
+    assert job.data == {}
+    assert luma['cancelled'] == ['gen-1']
+
+def test_background_loop_runs_until_stopped(config, luma):
+    spec = make_speculation(['a b c'] * 1000)
+    spec.start()
+    speculative.gevent.sleep(0.05)
+    spec.finish()
+    assert spec.greenlet.dead
+    assert luma['created'] == ['video of a b c']
+
+def test_step_errors_are_logged(config, luma):
+    logger = mock.Mock()
+    spec = speculative.SpeculativeGeneration(mock.Mock(), logger=logger)
+    spec.transcribe_partial = mock.Mock(side_effect=Exception('offline'))
+    spec.start()
+    speculative.gevent.sleep(0.03)
+    spec.finish()
+    logger.warning.assert_called()
+
+def test_transcribe_partial_uses_local_whisper(config, tmp_path, monkeypatch):
+    config['SPECULATIVE_WHISPER_BASE_URL'] = 'http://localhost:8000/v1'
+    config['SPECULATIVE_WHISPER_MODEL'] = 'small'
+    spool = RecordingSpool(directory=str(tmp_path), preallocate=0)
+    spool.write(b'audio')
+    client = mock.Mock()
+    client.audio.transcriptions.create.return_value = mock.Mock(text='partial')
+    monkeypatch.setitem(speculative._partial_clients, 'http://localhost:8000/v1', client)
+    spec = speculative.SpeculativeGeneration(spool)
+    assert spec.transcribe_partial() == 'partial'
+    client.audio.transcriptions.create.assert_called_once_with(model='small', file=('partial.webm', b'audio'))
+    spool.discard()
+
+def test_no_speculation_without_local_whisper(config, tmp_path, monkeypatch):
+    config['SPECULATIVE_WHISPER_BASE_URL'] = ''
+    monkeypatch.setattr(speculative, '_warned_no_local_whisper', False)
+    openai_create = mock.Mock()
+    monkeypatch.setattr(speculative.audio.client.audio.transcriptions, 'create', openai_create)
+    spool = RecordingSpool(directory=str(tmp_path), preallocate=0)
+    spool.write(b'audio')
+    logger = mock.Mock()
+    spec = speculative.SpeculativeGeneration(spool, logger=logger).start()
+    assert spec.greenlet is None
+    assert spec.transcribe_partial() == ''
+    speculative.SpeculativeGeneration(spool, logger=logger).start()
+    # Warned about once per process, and nothing was sent to OpenAI
+    logger.warning.assert_called_once()
+    openai_create.assert_not_called()
+    assert speculative.partial_whisper_client() is None
+    spool.discard()
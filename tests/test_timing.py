@@ -0,0 +1,39 @@
+import pytest
+from functions import timing
+
+@pytest.fixture
+def recorded():
+    events = []
+    timing.set_stage_listener(lambda stage, seconds, ok: events.append((stage, ok)))
+    yield events
+    timing.set_stage_listener(None)
+
+def test_timed_stage_reports_to_listener(recorded):
+    with timing.timed_stage('gpt'):
+        pass
+    with pytest.raises(RuntimeError):
+        with timing.timed_stage('whisper'):
+            raise RuntimeError('boom')
+    assert recorded == [('gpt', True), ('whisper', False)]
+
+def test_timed_stage_without_listener():
+    with timing.timed_stage('gpt'):
+        pass
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert timing.percentile(values, 50) == 50
+    assert timing.percentile(values, 95) == 95
+    assert timing.percentile(values, 99) == 99
+    assert timing.percentile([3.0], 99) == 3.0
+
+def test_summarize_durations():
+    summary = timing.summarize_durations([('gpt', 0.2), ('gpt', 0.4), ('gpt', 400.0), ('whisper', 1.0)])
+    assert summary['gpt']['count'] == 3
+    assert summary['gpt']['p50'] == 0.4
+    assert summary['gpt']['p99'] == 400.0
+    assert summary['gpt']['max'] == 400.0
+    assert summary['gpt']['histogram']['0.25'] == 1
+    assert summary['gpt']['histogram']['0.5'] == 1
+    assert summary['gpt']['histogram']['inf'] == 1
+    assert summary['whisper']['mean'] == 1.0
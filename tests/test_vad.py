@@ -0,0 +1,76 @@
+import wave
+import numpy as np
+import pytest
+from unittest import mock
+from functions import vad
+
+SAMPLE_RATE = 8000
+
+def tone(seconds, amplitude=0.3):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * 300 * t) * amplitude * 32767).astype(np.int16)
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.int16)
+
+def test_frame_energies_db():
+    samples = np.concatenate([silence(0.1), tone(0.1)])
+    energies = vad.frame_energies_db(samples, 80)
+    assert len(energies) == 20
+    assert energies[:10].max() < -100
+    assert energies[10:].min() > -20
+
+def test_trim_silence_trims_edges():
+    samples = np.concatenate([silence(2), tone(1), silence(3)])
+    trimmed, removed = vad.trim_silence(samples, SAMPLE_RATE, frame_ms=10, padding_ms=100, max_pause_ms=0)
+    assert removed == pytest.approx(4.8, abs=0.05)
+    assert len(trimmed) / SAMPLE_RATE == pytest.approx(1.2, abs=0.05)
+
+def test_trim_silence_compacts_long_pauses():
+    samples = np.concatenate([tone(1), silence(5), tone(1)])
+    _, removed = vad.trim_silence(samples, SAMPLE_RATE, frame_ms=10, padding_ms=0, max_pause_ms=1000)
+    assert removed == pytest.approx(4.0, abs=0.05)
+
+def test_trim_silence_keeps_short_pauses():
+    samples = np.concatenate([tone(1), silence(0.5), tone(1)])
+    trimmed, removed = vad.trim_silence(samples, SAMPLE_RATE, frame_ms=10, padding_ms=0, max_pause_ms=1000)
+    assert removed == 0
+    assert len(trimmed) == len(samples)
+
+def test_trim_silence_short_clip_padding_stays_aligned():
+    # Five 30 ms frames, voiced only in the first; the padding kernel is longer than the clip
+    samples = np.concatenate([tone(0.03), silence(0.12)])
+    trimmed, removed = vad.trim_silence(samples, SAMPLE_RATE, frame_ms=30, padding_ms=90, max_pause_ms=0)
+    assert len(trimmed) == int(0.12 * SAMPLE_RATE)
+    assert removed == pytest.approx(0.03)
+    assert np.array_equal(trimmed[:240], samples[:240])
+
+def test_trim_silence_all_silent_is_unchanged():
+    samples = silence(1)
+    trimmed, removed = vad.trim_silence(samples, SAMPLE_RATE)
+    assert removed == 0.0
+    assert len(trimmed) == len(samples)
+
+def test_trim_wav_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(vad, 'get_config', lambda: {'AUDIO_VAD_PADDING_MS': 0, 'AUDIO_VAD_FRAME_MS': 10})
+    path = str(tmp_path / 'rec.wav')
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(np.concatenate([silence(1), tone(1), silence(1)]).tobytes())
+    logger = mock.Mock()
+    trimmed, sample_rate, removed = vad.trim_wav_file(path, logger)
+    assert sample_rate == SAMPLE_RATE
+    assert removed == pytest.approx(2.0, abs=0.05)
+    logger.info.assert_called()
+
+def test_trim_wav_file_rejects_stereo(tmp_path):
+    path = str(tmp_path / 'stereo.wav')
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(b'\x00' * 400)
+    with pytest.raises(ValueError):
+        vad.trim_wav_file(path)
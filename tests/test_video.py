@@ -10,6 +10,7 @@ def mock_config(monkeypatch):
         'FFMPEG_DENOISE_THRESHOLD': 0.3,
         'FFMPEG_BILATERAL_SIGMA': 0.4,
         'FFMPEG_NOISE_STRENGTH': 0.5,
+        'FFMPEG_SINGLE_PASS': False,
         'THUMBS_DIR': '/tmp',
         'LUMA_GENERATIONS_ENDPOINT': 'http://fake/api',
         'LUMALABS_API_KEY': 'fake-key',
@@ -30,17 +31,20 @@ def mock_logger():
 def test_process_video_success(monkeypatch, mock_config, mock_logger):
     monkeypatch.setattr(video.ffmpeg, 'input', lambda x: x)
     monkeypatch.setattr(video.ffmpeg, 'filter', lambda s, *a, **k: s)
-    monkeypatch.setattr(video.ffmpeg, 'output', lambda s, p: (s, p))
+    outputs = []
+    monkeypatch.setattr(video.ffmpeg, 'output', lambda s, p, **k: outputs.append(k) or (s, p))
     monkeypatch.setattr(video.ffmpeg, 'run', lambda *a, **k: None)
     monkeypatch.setattr(video.shutil, 'move', lambda src, dst: None)
     result = video.process_video('input.mp4', logger=mock_logger)
     assert result == 'input.mp4'
+    # Written fast-start, so playback can begin before the whole file has loaded
+    assert outputs == [{'movflags': '+faststart'}]
     mock_logger.info.assert_called()
 
 def test_process_video_error(monkeypatch, mock_config, mock_logger):
     monkeypatch.setattr(video.ffmpeg, 'input', lambda x: x)
     monkeypatch.setattr(video.ffmpeg, 'filter', lambda s, *a, **k: s)
-    monkeypatch.setattr(video.ffmpeg, 'output', lambda s, p: (s, p))
+    monkeypatch.setattr(video.ffmpeg, 'output', lambda s, p, **k: (s, p))
     def raise_exc(*a, **k): raise Exception('ffmpeg fail')
     monkeypatch.setattr(video.ffmpeg, 'run', raise_exc)
     with pytest.raises(Exception):
@@ -50,7 +54,7 @@ def test_process_video_error(monkeypatch, mock_config, mock_logger):
 def test_process_video_logs_error(monkeypatch, mock_config, mock_logger):
     monkeypatch.setattr(video.ffmpeg, 'input', lambda x: x)
     monkeypatch.setattr(video.ffmpeg, 'filter', lambda s, *a, **k: s)
-    monkeypatch.setattr(video.ffmpeg, 'output', lambda s, p: (s, p))
+    monkeypatch.setattr(video.ffmpeg, 'output', lambda s, p, **k: (s, p))
     def raise_exc(*a, **k): raise Exception('fail')
     monkeypatch.setattr(video.ffmpeg, 'run', raise_exc)
     with pytest.raises(Exception):
@@ -60,7 +64,7 @@ def test_process_video_logs_error(monkeypatch, mock_config, mock_logger):
 def test_process_video_error_no_logger(monkeypatch, mock_config):
     monkeypatch.setattr(video.ffmpeg, 'input', lambda x: x)
     monkeypatch.setattr(video.ffmpeg, 'filter', lambda s, *a, **k: s)
-    monkeypatch.setattr(video.ffmpeg, 'output', lambda s, p: (s, p))
+    monkeypatch.setattr(video.ffmpeg, 'output', lambda s, p, **k: (s, p))
     def raise_exc(*a, **k): raise Exception('fail')
     monkeypatch.setattr(video.ffmpeg, 'run', raise_exc)
     with pytest.raises(Exception):
@@ -69,7 +73,7 @@ def test_process_video_error_no_logger(monkeypatch, mock_config):
 def test_process_video_exception(monkeypatch, mock_config, mock_logger):
     monkeypatch.setattr(video.ffmpeg, 'input', lambda x: x)
     monkeypatch.setattr(video.ffmpeg, 'filter', lambda s, *a, **k: s)
-    monkeypatch.setattr(video.ffmpeg, 'output', lambda s, p: (s, p))
+    monkeypatch.setattr(video.ffmpeg, 'output', lambda s, p, **k: (s, p))
     monkeypatch.setattr(video.ffmpeg, 'run', lambda *a, **k: None)
     def raise_exc(*a, **k): raise Exception('move fail')
     monkeypatch.setattr(video.shutil, 'move', raise_exc)
@@ -77,6 +81,25 @@ def test_process_video_exception(monkeypatch, mock_config, mock_logger):
         video.process_video('input.mp4', logger=mock_logger)
     mock_logger.error.assert_called()
 
+def test_output_names_differ_within_the_same_second(monkeypatch, mock_config):
+    from datetime import datetime
+    from functions.scheduler import set_job_context
+    moments = iter([datetime(2026, 1, 1, 12, 0, 0, 1000 * n) for n in range(4)] + [datetime(2026, 1, 1, 12, 0, 0)] * 4)
+    monkeypatch.setattr(video, 'datetime', mock.Mock(now=lambda: next(moments)))
+    try:
+        # Distinct microseconds
+        assert video.video_destination()[1] != video.video_destination()[1]
+        assert video.thumbnail_destination()[1] != video.thumbnail_destination()[1]
+        # The very same instant, in two sessions' jobs
+        names = []
+        for job_id in (1, 2):
+            set_job_context('session', job_id)
+            names.append((video.video_destination()[0], video.thumbnail_destination()[0]))
+    finally:
+        set_job_context(None)
+    assert names == [('generated_20260101_120000_000000_job1.mp4', 'thumb_20260101_120000_000000_job1.png'),
+                     ('generated_20260101_120000_000000_job2.mp4', 'thumb_20260101_120000_000000_job2.png')]
+
 def test_process_thumbnail_success(monkeypatch, mock_config, mock_logger):
     fake_probe = {'streams': [{'codec_type': 'video', 'width': 100, 'height': 80}]}
     monkeypatch.setattr(video.ffmpeg, 'probe', lambda x: fake_probe)
@@ -146,13 +169,13 @@ def test_generate_video_success(monkeypatch, mock_config, mock_logger):
     fake_post = mock.Mock()
     fake_post.status_code = 200
     fake_post.json.return_value = {'id': 'genid'}
-    monkeypatch.setattr(video.requests, 'post', lambda *a, **k: fake_post)
+    monkeypatch.setattr(video.http_pool, 'post', lambda *a, **k: fake_post)
     fake_get = mock.Mock()
     fake_get.status_code = 200
     fake_get.json.return_value = {'state': 'completed', 'assets': {'video': 'http://video.url'}}
     fake_get.iter_content = lambda chunk_size: [b'data']
     fake_get.raise_for_status = lambda: None
-    monkeypatch.setattr(video.requests, 'get', lambda *a, **k: fake_get)
+    monkeypatch.setattr(video.http_pool, 'get', lambda *a, **k: fake_get)
     monkeypatch.setattr(video.os, 'makedirs', lambda d, exist_ok: None)
     monkeypatch.setattr(video, 'process_video', lambda *a, **k: 'processed.mp4')
     monkeypatch.setattr(video, 'process_thumbnail', lambda *a, **k: 'thumb.png')
@@ -164,7 +187,7 @@ def test_generate_video_api_error(monkeypatch, mock_config, mock_logger):
     fake_post = mock.Mock()
     fake_post.status_code = 500
     fake_post.text = 'fail'
-    monkeypatch.setattr(video.requests, 'post', lambda *a, **k: fake_post)
+    monkeypatch.setattr(video.http_pool, 'post', lambda *a, **k: fake_post)
     with pytest.raises(Exception):
         video.generate_video('prompt', filename='file.mp4', luma_extend=False, logger=mock_logger) 
 
@@ -172,13 +195,13 @@ def test_generate_video_missing_video_url(monkeypatch, mock_config, mock_logger)
     fake_post = mock.Mock()
     fake_post.status_code = 200
     fake_post.json.return_value = {'id': 'genid'}
-    monkeypatch.setattr(video.requests, 'post', lambda *a, **k: fake_post)
+    monkeypatch.setattr(video.http_pool, 'post', lambda *a, **k: fake_post)
     fake_get = mock.Mock()
     fake_get.status_code = 200
     fake_get.json.return_value = {'state': 'completed', 'assets': {}}
     fake_get.iter_content = lambda chunk_size: [b'data']
     fake_get.raise_for_status = lambda: None
-    monkeypatch.setattr(video.requests, 'get', lambda *a, **k: fake_get)
+    monkeypatch.setattr(video.http_pool, 'get', lambda *a, **k: fake_get)
     with pytest.raises(Exception):
         video.generate_video('prompt', filename='file.mp4', luma_extend=False, logger=mock_logger)
     assert any('Video URL not found' in str(c[0][0]) for c in mock_logger.error.call_args_list)
@@ -187,7 +210,7 @@ def test_generate_video_failed_api(monkeypatch, mock_config, mock_logger):
     fake_post = mock.Mock()
     fake_post.status_code = 500
     fake_post.text = 'fail'
-    monkeypatch.setattr(video.requests, 'post', lambda *a, **k: fake_post)
+    monkeypatch.setattr(video.http_pool, 'post', lambda *a, **k: fake_post)
     with pytest.raises(Exception):
         video.generate_video('prompt', filename='file.mp4', luma_extend=False, logger=mock_logger)
     assert any('Luma API error' in str(e) for e in [str(c[0][0]) for c in mock_logger.error.call_args_list] + [str(a) for a in mock_logger.info.call_args_list])
@@ -197,13 +220,13 @@ def test_generate_video_fallback(monkeypatch, mock_config, mock_logger):
     fake_post = mock.Mock()
     fake_post.status_code = 200
     fake_post.json.return_value = {'id': 'genid'}
-    monkeypatch.setattr(video.requests, 'post', lambda *a, **k: fake_post)
+    monkeypatch.setattr(video.http_pool, 'post', lambda *a, **k: fake_post)
     fake_get = mock.Mock()
     fake_get.status_code = 200
     fake_get.json.return_value = {'state': 'completed', 'assets': {'video': 'http://video.url'}}
     fake_get.iter_content = lambda chunk_size: [b'data']
     fake_get.raise_for_status = lambda: None
-    monkeypatch.setattr(video.requests, 'get', lambda *a, **k: fake_get)
+    monkeypatch.setattr(video.http_pool, 'get', lambda *a, **k: fake_get)
     monkeypatch.setattr(video.os, 'makedirs', lambda d, exist_ok: None)
     monkeypatch.setattr(video, 'process_video', lambda *a, **k: 'processed.mp4')
     monkeypatch.setattr(video, 'process_thumbnail', lambda *a, **k: 'thumb.png')
@@ -215,7 +238,7 @@ def test_generate_video_error_no_logger(monkeypatch, mock_config):
     fake_post = mock.Mock()
     fake_post.status_code = 500
     fake_post.text = 'fail'
-    monkeypatch.setattr(video.requests, 'post', lambda *a, **k: fake_post)
+    monkeypatch.setattr(video.http_pool, 'post', lambda *a, **k: fake_post)
     with pytest.raises(Exception):
         video.generate_video('prompt', filename='file.mp4', luma_extend=False, logger=None) 
 
@@ -227,7 +250,7 @@ def test_generate_video_luma_extend(monkeypatch, mock_config, mock_logger):
         {'id': 'genid'},  # initial
         {'id': 'extendid'}  # extension
     ]
-    monkeypatch.setattr(video.requests, 'post', lambda *a, **k: fake_post)
+    monkeypatch.setattr(video.http_pool, 'post', lambda *a, **k: fake_post)
     # poll_for_completion returns a video_url for both
     def fake_get(*a, **k):
         resp = mock.Mock()
@@ -236,7 +259,7 @@ def test_generate_video_luma_extend(monkeypatch, mock_config, mock_logger):
         resp.iter_content = lambda chunk_size: [b'data']
         resp.raise_for_status = lambda: None
         return resp
-    monkeypatch.setattr(video.requests, 'get', fake_get)
+    monkeypatch.setattr(video.http_pool, 'get', fake_get)
     monkeypatch.setattr(video.os, 'makedirs', lambda d, exist_ok: None)
     monkeypatch.setattr(video, 'process_video', lambda *a, **k: 'processed.mp4')
     monkeypatch.setattr(video, 'process_thumbnail', lambda *a, **k: 'thumb.png')
@@ -247,13 +270,13 @@ def test_generate_video_poll_for_completion_failed(monkeypatch, mock_config, moc
     fake_post = mock.Mock()
     fake_post.status_code = 200
     fake_post.json.return_value = {'id': 'genid'}
-    monkeypatch.setattr(video.requests, 'post', lambda *a, **k: fake_post)
+    monkeypatch.setattr(video.http_pool, 'post', lambda *a, **k: fake_post)
     def fake_get(*a, **k):
         resp = mock.Mock()
         resp.status_code = 200
         resp.json.return_value = {'state': 'failed', 'failure_reason': 'bad'}
         return resp
-    monkeypatch.setattr(video.requests, 'get', fake_get)
+    monkeypatch.setattr(video.http_pool, 'get', fake_get)
     with pytest.raises(Exception) as exc:
         video.generate_video('prompt', filename='file.mp4', luma_extend=False, logger=mock_logger)
     assert 'Video generation failed' in str(exc.value)
@@ -262,13 +285,13 @@ def test_generate_video_poll_for_completion_error(monkeypatch, mock_config, mock
     fake_post = mock.Mock()
     fake_post.status_code = 200
     fake_post.json.return_value = {'id': 'genid'}
-    monkeypatch.setattr(video.requests, 'post', lambda *a, **k: fake_post)
+    monkeypatch.setattr(video.http_pool, 'post', lambda *a, **k: fake_post)
     def fake_get(*a, **k):
         resp = mock.Mock()
         resp.status_code = 200
         resp.json.return_value = {'state': 'error', 'error': 'api error'}
         return resp
-    monkeypatch.setattr(video.requests, 'get', fake_get)
+    monkeypatch.setattr(video.http_pool, 'get', fake_get)
     with pytest.raises(Exception) as exc:
         video.generate_video('prompt', filename='file.mp4', luma_extend=False, logger=mock_logger)
     assert 'Video generation failed' in str(exc.value)
@@ -277,14 +300,14 @@ def test_generate_video_poll_for_completion_timeout(monkeypatch, mock_config, mo
     fake_post = mock.Mock()
     fake_post.status_code = 200
     fake_post.json.return_value = {'id': 'genid'}
-    monkeypatch.setattr(video.requests, 'post', lambda *a, **k: fake_post)
+    monkeypatch.setattr(video.http_pool, 'post', lambda *a, **k: fake_post)
     # Always return running state
     def fake_get(*a, **k):
         resp = mock.Mock()
         resp.status_code = 200
         resp.json.return_value = {'state': 'running'}
         return resp
-    monkeypatch.setattr(video.requests, 'get', fake_get)
+    monkeypatch.setattr(video.http_pool, 'get', fake_get)
     # Patch get_config to set max_attempts=1 for quick timeout
     monkeypatch.setattr(video, 'get_config', lambda: {
         'LUMA_GENERATIONS_ENDPOINT': 'http://fake/api',
@@ -309,7 +332,7 @@ def test_generate_video_missing_extend_id(monkeypatch, mock_config, mock_logger)
         {'id': 'genid'},  # initial
         {}  # extension missing id
     ]
-    monkeypatch.setattr(video.requests, 'post', lambda *a, **k: fake_post)
+    monkeypatch.setattr(video.http_pool, 'post', lambda *a, **k: fake_post)
     def fake_get(*a, **k):
         resp = mock.Mock()
         resp.status_code = 200
@@ -317,7 +340,7 @@ def test_generate_video_missing_extend_id(monkeypatch, mock_config, mock_logger)
         resp.iter_content = lambda chunk_size: [b'data']
         resp.raise_for_status = lambda: None
         return resp
-    monkeypatch.setattr(video.requests, 'get', fake_get)
+    monkeypatch.setattr(video.http_pool, 'get', fake_get)
     monkeypatch.setattr(video.os, 'makedirs', lambda d, exist_ok: None)
     monkeypatch.setattr(video, 'process_video', lambda *a, **k: 'processed.mp4')
     monkeypatch.setattr(video, 'process_thumbnail', lambda *a, **k: 'thumb.png')
@@ -332,21 +355,21 @@ def test_generate_video_missing_video_url_extension(monkeypatch, mock_config, mo
         {'id': 'genid'},  # initial
         {'id': 'extendid'}  # extension
     ]
-    monkeypatch.setattr(video.requests, 'post', lambda *a, **k: fake_post)
+    monkeypatch.setattr(video.http_pool, 'post', lambda *a, **k: fake_post)
     # poll_for_completion returns no video_url for extension
     def fake_get(*a, **k):
         resp = mock.Mock()
         resp.status_code = 200
         resp.json.return_value = {'state': 'completed', 'assets': {}}
         return resp
-    monkeypatch.setattr(video.requests, 'get', fake_get)
+    monkeypatch.setattr(video.http_pool, 'get', fake_get)
     with pytest.raises(Exception) as exc:
         video.generate_video('prompt ***** extension', filename='file.mp4', luma_extend=True, logger=mock_logger)
     assert 'Video URL not found' in str(exc.value)
 
 def test_generate_video_outer_exception(monkeypatch, mock_config, mock_logger):
     def raise_exc(*a, **k): raise Exception('outer fail')
-    monkeypatch.setattr(video.requests, 'post', raise_exc)
+    monkeypatch.setattr(video.http_pool, 'post', raise_exc)
     with pytest.raises(Exception):
         video.generate_video('prompt', filename='file.mp4', luma_extend=False, logger=mock_logger)
     mock_logger.error.assert_called()
@@ -355,7 +378,7 @@ def test_process_video_generic_exception(monkeypatch, mock_config, mock_logger):
     import functions.video as video
     monkeypatch.setattr(video.ffmpeg, 'input', lambda x: x)
     monkeypatch.setattr(video.ffmpeg, 'filter', lambda s, *a, **k: s)
-    monkeypatch.setattr(video.ffmpeg, 'output', lambda s, p: (s, p))
+    monkeypatch.setattr(video.ffmpeg, 'output', lambda s, p, **k: (s, p))
     def raise_exc(*a, **k): raise Exception('fail')
     monkeypatch.setattr(video.ffmpeg, 'run', lambda *a, **k: None)
     monkeypatch.setattr(video.shutil, 'move', raise_exc)
@@ -376,6 +399,548 @@ def test_process_thumbnail_generic_exception(monkeypatch, mock_config, mock_logg
 def test_generate_video_outer_exception_no_logger(monkeypatch, mock_config):
     import functions.video as video
     def raise_exc(*a, **k): raise Exception('outer fail')
-    monkeypatch.setattr(video.requests, 'post', raise_exc)
+    monkeypatch.setattr(video.http_pool, 'post', raise_exc)
     with pytest.raises(Exception):
-        video.generate_video('prompt', filename='file.mp4', luma_extend=False, logger=None) 
\ No newline at end of file
+        video.generate_video('prompt', filename='file.mp4', luma_extend=False, logger=None) 
+def test_generate_video_resumes_known_generation(monkeypatch, mock_config, mock_logger):
+    from functions.jobs import PipelineJob
+    def fail_post(*a, **k): raise AssertionError('a new generation should not be created')
+    monkeypatch.setattr(video.http_pool, 'post', fail_post)
+    polled = []
+    def fake_get(url, *a, **k):
+        polled.append(url)
+        resp = mock.Mock()
+        resp.status_code = 200
+        resp.json.return_value = {'state': 'completed', 'assets': {'video': 'http://video.url'}}
+        resp.iter_content = lambda chunk_size: [b'data']
+        resp.raise_for_status = lambda: None
+        return resp
+    monkeypatch.setattr(video.http_pool, 'get', fake_get)
+    monkeypatch.setattr(video.os, 'makedirs', lambda d, exist_ok: None)
+    monkeypatch.setattr(video, 'process_video', lambda *a, **k: 'processed.mp4')
+    monkeypatch.setattr(video, 'process_thumbnail', lambda *a, **k: 'thumb.png')
+    job = PipelineJob(state='generating', data={'generation_id': 'genid'})
+    result = video.generate_video('prompt', filename='file.mp4', luma_extend=False, logger=mock_logger, job=job)
+    assert result == ('file.mp4', 'thumb.png')
+    assert polled[0] == 'http://fake/api/generations/genid'
+    assert job.data['video_url'] == 'http://video.url'
+    assert job.data['thumb_filename'] == 'thumb.png'
+
+def test_generate_video_skips_finished_steps(monkeypatch, mock_config, mock_logger):
+    from functions.jobs import PipelineJob
+    def fail(*a, **k): raise AssertionError('step should have been skipped')
+    monkeypatch.setattr(video.http_pool, 'post', fail)
+    monkeypatch.setattr(video.http_pool, 'get', fail)
+    monkeypatch.setattr(video, 'process_video', fail)
+    monkeypatch.setattr(video, 'process_thumbnail', lambda *a, **k: 'thumb.png')
+    job = PipelineJob(state='post-processing', data={
+        'generation_id': 'genid', 'video_url': 'http://video.url', 'video_filename': 'saved.mp4',
+        'downloaded': True, 'video_processed': True
+    })
+    assert video.generate_video('prompt', logger=mock_logger, job=job) == ('saved.mp4', 'thumb.png')
+
+def test_cancel_generation(monkeypatch, mock_config, mock_logger):
+    calls = []
+    def fake_delete(url, headers):
+        calls.append(url)
+        return mock.Mock(status_code=204)
+    monkeypatch.setattr(video.http_pool, 'delete', fake_delete)
+    assert video.cancel_generation('gen-1', mock_logger) is True
+    assert calls == ['http://fake/api/generations/gen-1']
+    monkeypatch.setattr(video.http_pool, 'delete', lambda url, headers: mock.Mock(status_code=404, text='gone'))
+    assert video.cancel_generation('gen-1', mock_logger) is False
+    def raise_delete(url, headers): raise Exception('offline')
+    monkeypatch.setattr(video.http_pool, 'delete', raise_delete)
+    assert video.cancel_generation('gen-1', mock_logger) is False
+
+def test_split_prompts():
+    assert video.split_prompts('one ***** two', 1) == ['one ***** two']
+    assert video.split_prompts('one ***** two', 2) == ['one', 'two']
+    assert video.split_prompts('one ***** two', 3) == ['one', 'two', 'two']
+    assert video.split_prompts('one ***** two ***** three', 2) == ['one', 'two']
+    assert video.split_prompts('one', 2) == ['one', 'Continue on with this video']
+
+def test_extend_segments(monkeypatch):
+    monkeypatch.setattr(video, 'get_config', lambda: {'LUMA_EXTEND_SEGMENTS': 4})
+    assert video.extend_segments(False) == 1
+    assert video.extend_segments(True) == 4
+    monkeypatch.setattr(video, 'get_config', lambda: {'LUMA_EXTEND_SEGMENTS': 1})
+    assert video.extend_segments(True) == 2
+
+def chain_config(monkeypatch, tmp_path, **updates):
+    config = dict(video.get_config(), VIDEOS_DIR=str(tmp_path), **updates)
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+
+def fake_luma(monkeypatch):
+    """Fake Luma API: every generation is complete, and each video URL names its generation."""
+    posted = []
+    def fake_post(url, headers, json):
+        posted.append(json)
+        return mock.Mock(status_code=200, json=lambda: {'id': f"gen{len(posted)}"})
+    def fake_get(url, *a, **k):
+        resp = mock.Mock()
+        resp.status_code = 200
+        resp.json.return_value = {'state': 'completed', 'assets': {'video': f"http://video/{url.rsplit('/', 1)[-1]}"}}
+        resp.iter_content = lambda chunk_size: [url.encode()]
+        resp.raise_for_status = lambda: None
+        return resp
+    monkeypatch.setattr(video.http_pool, 'post', fake_post)
+    monkeypatch.setattr(video.http_pool, 'get', fake_get)
+    monkeypatch.setattr(video, 'process_thumbnail', lambda *a, **k: 'thumb.png')
+    return posted
+
+def test_generate_video_chains_segments_with_previews(monkeypatch, mock_config, mock_logger, tmp_path):
+    from functions.jobs import PipelineJob
+    chain_config(monkeypatch, tmp_path, LUMA_EXTEND_SEGMENTS=3)
+    posted = fake_luma(monkeypatch)
+    processed = []
+    monkeypatch.setattr(video, 'process_video', lambda path, logger=None: processed.append(path) or path)
+    previews = []
+    job = PipelineJob()
+    result = video.generate_video('one ***** two ***** three', filename='file.mp4', luma_extend=True,
+                                  logger=mock_logger, job=job, on_preview=previews.append)
+    assert result == ('file.mp4', 'thumb.png')
+    assert [body['prompt'] for body in posted] == ['one', 'two', 'three']
+    assert 'keyframes' not in posted[0]
+    assert posted[1]['keyframes']['frame0']['id'] == 'gen1'
+    assert posted[2]['keyframes']['frame0']['id'] == 'gen2'
+    assert job.data['extend_ids'] == ['gen2', 'gen3']
+    # Both intermediate segments were downloaded, processed and previewed before the final video
+    assert len(previews) == 2 and job.data['preview_filenames'] == previews
+    assert (tmp_path / previews[0]).read_bytes().endswith(b'gen1')
+    assert (tmp_path / previews[1]).read_bytes().endswith(b'gen2')
+    assert (tmp_path / 'file.mp4').read_bytes().endswith(b'gen3')
+    assert len(processed) == 3
+    video.remove_preview_files(previews)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['file.mp4']
+
+def test_generate_video_preview_failure_does_not_fail_video(monkeypatch, mock_config, mock_logger, tmp_path):
+    chain_config(monkeypatch, tmp_path)
+    fake_luma(monkeypatch)
+    monkeypatch.setattr(video, 'process_video', lambda path, logger=None: path)
+    def broken_preview(filename): raise Exception('client gone')
+    result = video.generate_video('one ***** two', filename='file.mp4', luma_extend=True, logger=mock_logger,
+                                  on_preview=broken_preview)
+    assert result == ('file.mp4', 'thumb.png')
+    assert any('Could not prepare preview' in str(c) for c in mock_logger.warning.call_args_list)
+
+def test_generate_video_previews_can_be_disabled(monkeypatch, mock_config, mock_logger, tmp_path):
+    chain_config(monkeypatch, tmp_path, LUMA_EXTEND_PREVIEW=False)
+    fake_luma(monkeypatch)
+    monkeypatch.setattr(video, 'process_video', lambda path, logger=None: path)
+    previews = []
+    video.generate_video('one ***** two', filename='file.mp4', luma_extend=True, logger=mock_logger,
+                         on_preview=previews.append)
+    assert previews == []
+
+def test_generate_video_resumes_legacy_extend_id(monkeypatch, mock_config, mock_logger, tmp_path):
+    from functions.jobs import PipelineJob
+    chain_config(monkeypatch, tmp_path)
+    posted = fake_luma(monkeypatch)
+    monkeypatch.setattr(video, 'process_video', lambda path, logger=None: path)
+    job = PipelineJob(state='generating', data={'generation_id': 'genA', 'extend_id': 'genB'})
+    video.generate_video('one ***** two', filename='file.mp4', luma_extend=True, logger=mock_logger, job=job)
+    assert posted == []
+    assert job.data['video_url'] == 'http://video/genB'
+
+def status_responses(monkeypatch, responses):
+    """Make each status check return (or raise) the next of `responses`."""
+    responses = iter(responses)
+    def fake_get(url, *a, **k):
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+    monkeypatch.setattr(video.http_pool, 'get', fake_get)
+
+def completed_response():
+    return mock.Mock(status_code=200, json=lambda: {'state': 'completed', 'assets': {'video': 'http://video.url'}})
+
+def test_poll_generation_backs_off_on_errors(monkeypatch, mock_config, mock_logger):
+    import requests
+    backoffs = []
+    def fake_backoff(failures, retry_after=None):
+        backoffs.append((failures, retry_after))
+        return 0.001
+    monkeypatch.setattr(video, 'backoff_delay', fake_backoff)
+    monkeypatch.setattr(video, 'next_poll_delay', lambda elapsed, window: 0.001)
+    status_responses(monkeypatch, [
+        requests.ConnectionError('reset'),
+        mock.Mock(status_code=429, text='slow down', headers={'Retry-After': '3'}),
+        mock.Mock(status_code=500, text='oops', headers={}),
+        mock.Mock(status_code=200, json=lambda: {'state': 'dreaming'}),
+        mock.Mock(status_code=502, text='bad gateway', headers={}),
+        completed_response(),
+    ])
+    config = dict(video.get_config(), LUMA_MAX_POLL_ATTEMPTS=6)
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+    assert video.poll_generation('genid', mock_logger) == 'http://video.url'
+    # Failures in a row back off further; a successful check resets the count
+    assert backoffs == [(1, None), (2, 3.0), (3, None), (1, None)]
+
+def test_poll_generation_learns_render_times(monkeypatch, mock_config, mock_logger, generation_times,
+                                             generation_tracker):
+    key = ('model', '1', 'res', False)
+    monkeypatch.setattr(video, 'generation_key', lambda extend=False: key)
+    monkeypatch.setattr(video, 'next_poll_delay', lambda elapsed, window: 0.01)
+    monkeypatch.setattr(video.http_pool, 'post', lambda *a, **k: mock.Mock(status_code=200, json=lambda: {'id': 'genid'}))
+    status_responses(monkeypatch, [mock.Mock(status_code=200, json=lambda: {'state': 'dreaming'}), completed_response()])
+    config = dict(video.get_config(), LUMA_MAX_POLL_ATTEMPTS=5)
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+    generation_id = video.create_generation('prompt', logger=mock_logger)
+    assert video.poll_generation(generation_id, mock_logger) == 'http://video.url'
+    # Finished between the check that saw it dreaming and the one that saw it completed
+    assert len(generation_times.samples[key]) == 1
+    assert 0 < generation_times.samples[key][0] < 0.01
+    assert generation_tracker.generations == {}
+
+def test_poll_generation_reports_each_status_check(monkeypatch, mock_config, mock_logger):
+    from functions.timing import set_stage_listener
+    import requests
+    monkeypatch.setattr(video, 'backoff_delay', lambda failures, retry_after=None: 0.001)
+    monkeypatch.setattr(video, 'next_poll_delay', lambda elapsed, window: 0.001)
+    status_responses(monkeypatch, [
+        requests.ConnectionError('reset'),
+        mock.Mock(status_code=200, json=lambda: {'state': 'dreaming'}),
+        completed_response(),
+    ])
+    config = dict(video.get_config(), LUMA_MAX_POLL_ATTEMPTS=5)
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+    stages = []
+    set_stage_listener(lambda stage, seconds, ok: stages.append((stage, ok)))
+    try:
+        assert video.poll_generation('genid', mock_logger) == 'http://video.url'
+    finally:
+        set_stage_listener(None)
+    assert stages == [('luma_poll', False), ('luma_poll', True), ('luma_poll', True), ('luma_wait', True)]
+
+def test_tracker_checks_due_generations_with_one_list_request(monkeypatch, mock_config, mock_logger, generation_tracker):
+    urls = []
+    def fake_get(url, params=None, headers=None):
+        urls.append(url)
+        if url.endswith('/generations'):
+            assert params == {'limit': video.LIST_PAGE_SIZE}
+            return mock.Mock(status_code=200, json=lambda: {'generations': [
+                {'id': 'gen-1', 'state': 'completed', 'assets': {'video': 'http://video/1'}},
+                {'id': 'gen-2', 'state': 'completed', 'assets': {'video': 'http://video/2'}},
+                {'id': 'other', 'state': 'dreaming'},
+            ]})
+        return mock.Mock(status_code=200, json=lambda: {'state': 'completed', 'assets': {'video': 'http://video/3'}})
+    monkeypatch.setattr(video.http_pool, 'get', fake_get)
+    for generation_id in ('gen-1', 'gen-2', 'gen-3'):
+        generation_tracker.track(generation_id)
+    results = [video.poll_generation(generation_id, mock_logger) for generation_id in ('gen-1', 'gen-2', 'gen-3')]
+    assert results == ['http://video/1', 'http://video/2', 'http://video/3']
+    # gen-3 isn't on the first page of the list, so it is fetched on its own
+    assert urls == ['http://fake/api/generations', 'http://fake/api/generations/gen-3']
+
+def test_tracker_backs_off_all_due_generations_when_list_is_rate_limited(monkeypatch, mock_config, generation_tracker):
+    urls = []
+    def fake_get(url, params=None, headers=None):
+        urls.append(url)
+        return mock.Mock(status_code=429, text='slow down', headers={'Retry-After': '7'})
+    monkeypatch.setattr(video.http_pool, 'get', fake_get)
+    backoffs = []
+    def fake_backoff(failures, retry_after=None):
+        backoffs.append((failures, retry_after))
+        return 60
+    monkeypatch.setattr(video, 'backoff_delay', fake_backoff)
+    config = dict(video.get_config(), LUMA_MAX_POLL_ATTEMPTS=5)
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+    for n in range(5):
+        generation_tracker.track(f"gen-{n}")
+    video.gevent.sleep(0.01)
+    # One list request, no per-generation fallbacks, and the server's Retry-After is honoured
+    assert urls == ['http://fake/api/generations']
+    assert backoffs == [(1, 7.0)] * 5
+    assert all(entry['next_check_in'] > 50 for entry in generation_tracker.snapshot())
+
+def test_tracker_survives_a_check_that_raises(monkeypatch, mock_config, mock_logger, generation_tracker):
+    delays = iter([RuntimeError('bad window')])
+    def fake_next_poll_delay(elapsed, window):
+        delay = next(delays, 0.001)
+        if isinstance(delay, Exception):
+            raise delay
+        return delay
+    monkeypatch.setattr(video, 'next_poll_delay', fake_next_poll_delay)
+    monkeypatch.setattr(video, 'backoff_delay', lambda failures, retry_after=None: 0.001)
+    pages = iter(['dreaming', 'completed'])
+    def fake_get(url, params=None, headers=None):
+        state = next(pages)
+        return mock.Mock(status_code=200, json=lambda: {'generations': [
+            {'id': generation_id, 'state': state, 'assets': {'video': f"http://video/{generation_id}"}}
+            for generation_id in ('gen-1', 'gen-2')
+        ]})
+    monkeypatch.setattr(video.http_pool, 'get', fake_get)
+    config = dict(video.get_config(), LUMA_MAX_POLL_ATTEMPTS=5)
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+    for generation_id in ('gen-1', 'gen-2'):
+        generation_tracker.track(generation_id)
+    # Applying the first list response raises; the poller backs both off and carries on
+    results = [video.poll_generation(generation_id, mock_logger) for generation_id in ('gen-1', 'gen-2')]
+    assert results == ['http://video/gen-1', 'http://video/gen-2']
+    mock_logger.error.assert_any_call("Unexpected error checking generation gen-1: bad window")
+
+def test_tracker_fails_generation_if_recovery_raises(monkeypatch, mock_config, mock_logger, generation_tracker):
+    def raise_exc(*a, **k):
+        raise RuntimeError('broken')
+    monkeypatch.setattr(video.http_pool, 'get', raise_exc)
+    monkeypatch.setattr(video, 'backoff_delay', raise_exc)
+    config = dict(video.get_config(), LUMA_MAX_POLL_ATTEMPTS=5)
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+    with pytest.raises(RuntimeError, match='broken'):
+        video.poll_generation('genid', mock_logger)
+    assert generation_tracker.generations == {}
+
+def test_tracker_snapshot_and_forget(monkeypatch, mock_config, generation_tracker):
+    monkeypatch.setattr(video.http_pool, 'get', lambda *a, **k: mock.Mock(status_code=200, json=lambda: {'state': 'dreaming'}))
+    config = dict(video.get_config(), LUMA_CALLBACK_TIMEOUT=60)
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+    generation_tracker.track('gen-1', callback=True)
+    [entry] = generation_tracker.snapshot()
+    assert entry['id'] == 'gen-1' and entry['callback'] is True and entry['checks'] == 0
+    assert 59 <= entry['next_check_in'] <= 60
+    generation_tracker.forget('gen-1')
+    assert generation_tracker.snapshot() == []
+    assert generation_tracker.deliver({'id': 'gen-1', 'state': 'completed'}) is False
+
+class FakeVideoResponse:
+    def __init__(self, body, status_code=200, drop_after=None):
+        self.body = body
+        self.status_code = status_code
+        self.drop_after = drop_after
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            if self.drop_after is not None and start >= self.drop_after:
+                raise video.ChunkedEncodingError('connection dropped')
+            yield self.body[start:start + chunk_size]
+
+@pytest.mark.parametrize('honours_range', [True, False])
+def test_video_chunks_resume_interrupted_download(monkeypatch, mock_config, mock_logger, honours_range):
+    body = bytes(range(256)) * 4
+    config = dict(video.get_config(), DOWNLOAD_CHUNK_SIZE=100, DOWNLOAD_RETRIES=1)
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+    monkeypatch.setattr(video.gevent, 'sleep', lambda s: None)
+    ranges = []
+    def fake_get(url, stream, headers):
+        ranges.append(headers)
+        if headers is None:
+            return FakeVideoResponse(body, drop_after=300)
+        offset = int(headers['Range'][len('bytes='):-1])
+        return FakeVideoResponse(body[offset:], 206) if honours_range else FakeVideoResponse(body)
+    monkeypatch.setattr(video.http_pool, 'get', fake_get)
+    assert b''.join(video.video_chunks('http://video.url', mock_logger)) == body
+    assert ranges == [None, {'Range': 'bytes=300-'}]
+    mock_logger.warning.assert_called_once()
+
+def test_video_chunks_resume_after_timeouts(monkeypatch, mock_config, mock_logger):
+    import requests
+    body = bytes(range(256))
+    config = dict(video.get_config(), DOWNLOAD_CHUNK_SIZE=100, DOWNLOAD_RETRIES=2)
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+    monkeypatch.setattr(video.gevent, 'sleep', lambda s: None)
+    class TimingOutResponse(FakeVideoResponse):
+        def iter_content(self, chunk_size):
+            yield self.body[:chunk_size]
+            raise requests.exceptions.ReadTimeout('read timed out')
+    ranges = []
+    def fake_get(url, stream, headers):
+        ranges.append(headers)
+        if len(ranges) == 1:
+            return TimingOutResponse(body)
+        if len(ranges) == 2:
+            raise requests.exceptions.ConnectTimeout('connect timed out')
+        return FakeVideoResponse(body[100:], 206)
+    monkeypatch.setattr(video.http_pool, 'get', fake_get)
+    # A read timeout mid-body and a timeout on the resumed request both resume from byte 100
+    assert b''.join(video.video_chunks('http://video.url', mock_logger)) == body
+    assert ranges == [None, {'Range': 'bytes=100-'}, {'Range': 'bytes=100-'}]
+    assert mock_logger.warning.call_count == 2
+
+def test_video_chunks_give_up_after_retries(monkeypatch, mock_config):
+    config = dict(video.get_config(), DOWNLOAD_CHUNK_SIZE=100, DOWNLOAD_RETRIES=2)
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+    monkeypatch.setattr(video.gevent, 'sleep', lambda s: None)
+    calls = []
+    def fake_get(url, stream, headers):
+        calls.append(headers)
+        return FakeVideoResponse(bytes(1000), drop_after=0)
+    monkeypatch.setattr(video.http_pool, 'get', fake_get)
+    with pytest.raises(video.ChunkedEncodingError):
+        list(video.video_chunks('http://video.url'))
+    assert len(calls) == 3
+
+class FakeFFmpegProcess:
+    def __init__(self, stream, returncode=0):
+        self.part_path = next(arg for arg in stream.get_args() if arg.endswith('.part'))
+        self.returncode = None
+        self.exit_code = returncode
+        self.stdin = mock.Mock()
+        self.stderr = mock.Mock(read=lambda: b'moov atom not found')
+        self.killed = False
+
+    def wait(self):
+        if self.returncode is None and self.exit_code == 0:
+            with open(self.part_path, 'wb') as f:
+                f.write(b''.join(c.args[0] for c in self.stdin.write.call_args_list))
+        if self.returncode is None:
+            self.returncode = self.exit_code
+        return self.returncode
+
+    def kill(self):
+        self.killed = True
+        self.returncode = -9
+
+    def poll(self):
+        return self.returncode
+
+@pytest.fixture
+def stream_config(monkeypatch, mock_config, tmp_path):
+    config = dict(video.get_config(), VIDEOS_DIR=str(tmp_path), DOWNLOAD_CHUNK_SIZE=4, DOWNLOAD_STREAM_TO_FFMPEG=True)
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+    monkeypatch.setattr(video.http_pool, 'get', lambda url, stream, headers: FakeVideoResponse(b'video bytes'))
+    return config
+
+def test_stream_process_video_pipes_download_into_ffmpeg(monkeypatch, stream_config, tmp_path, mock_logger):
+    processes = []
+    def fake_run_async(stream, **kwargs):
+        assert kwargs['pipe_stdin'] is True
+        args = stream.get_args()
+        assert args[args.index('-i') + 1] == 'pipe:0' and '-nostats' in args
+        processes.append(FakeFFmpegProcess(stream))
+        return processes[0]
+    monkeypatch.setattr(video.ffmpeg, 'run_async', fake_run_async)
+    assert video.stream_process_video('http://video.url', 'dream.mp4', mock_logger) == ('dream.mp4', None)
+    assert (tmp_path / 'dream.mp4').read_bytes() == b'video bytes'
+    # The body went to FFmpeg in DOWNLOAD_CHUNK_SIZE pieces, and nothing else was written
+    assert processes[0].stdin.write.call_count == 3
+    assert [p.name for p in tmp_path.iterdir()] == ['dream.mp4']
+
+def test_stream_process_video_gives_up_on_a_stalled_ffmpeg(monkeypatch, stream_config, tmp_path, mock_logger):
+    stream_config['DOWNLOAD_STREAM_TIMEOUT'] = 0.05
+    processes = []
+    def fake_run_async(stream, **kwargs):
+        process = FakeFFmpegProcess(stream)
+        # FFmpeg stops reading stdin, e.g. while it is blocked on a full stderr pipe
+        process.stdin.write.side_effect = lambda chunk: video.gevent.sleep(10)
+        processes.append(process)
+        return process
+    monkeypatch.setattr(video.ffmpeg, 'run_async', fake_run_async)
+    with pytest.raises(Exception, match='took over 0.05s'):
+        video.stream_process_video('http://video.url', 'dream.mp4', mock_logger)
+    assert processes[0].killed
+    assert list(tmp_path.iterdir()) == []
+
+def test_generate_video_falls_back_when_ffmpeg_cannot_read_the_pipe(monkeypatch, stream_config, tmp_path, mock_logger):
+    monkeypatch.setattr(video.ffmpeg, 'run_async', lambda stream, **k: FakeFFmpegProcess(stream, returncode=1))
+    processed = []
+    monkeypatch.setattr(video, 'process_video', lambda path, logger=None: processed.append(path))
+    monkeypatch.setattr(video, 'process_thumbnail', lambda *a, **k: 'thumb.png')
+    job = video.PipelineJob(data={'generation_id': 'gen', 'video_url': 'http://video.url'})
+    assert video.generate_video('prompt', 'dream.mp4', logger=mock_logger, job=job) == ('dream.mp4', 'thumb.png')
+    # The failed stream left no partial file; the video was downloaded, then processed
+    assert [p.name for p in tmp_path.iterdir()] == ['dream.mp4']
+    assert (tmp_path / 'dream.mp4').read_bytes() == b'video bytes'
+    assert processed == [str(tmp_path / 'dream.mp4')]
+    assert job.data['video_processed'] is True
+
+def test_generate_video_streams_into_ffmpeg(monkeypatch, stream_config, tmp_path, mock_logger):
+    monkeypatch.setattr(video.ffmpeg, 'run_async', lambda stream, **k: FakeFFmpegProcess(stream))
+    monkeypatch.setattr(video, 'process_video', mock.Mock())
+    monkeypatch.setattr(video, 'process_thumbnail', lambda *a, **k: 'thumb.png')
+    job = video.PipelineJob(data={'generation_id': 'gen', 'video_url': 'http://video.url'})
+    assert video.generate_video('prompt', 'dream.mp4', logger=mock_logger, job=job) == ('dream.mp4', 'thumb.png')
+    video.process_video.assert_not_called()
+    assert job.data['downloaded'] is True and job.data['video_processed'] is True
+
+def test_single_pass_outputs_split_one_decode(mock_config):
+    args = video.single_pass_outputs(video.ffmpeg.input('in.mp4'), 'out.mp4', 'thumb.png').get_args()
+    assert args.count('-i') == 1
+    graph = args[args.index('-filter_complex') + 1]
+    assert 'split=2' in graph and 'trim=start=1' in graph
+    # The square crop is worked out by ffmpeg from the frame size, no probe needed
+    assert f"crop={video.SQUARE_SIDE}:{video.SQUARE_SIDE}" in graph
+    assert args[-3:] == ['-vframes', '1', 'thumb.png']
+
+def test_process_video_and_thumbnail(monkeypatch, mock_config, tmp_path, mock_logger):
+    config = dict(video.get_config(), THUMBS_DIR=str(tmp_path / 'thumbs'))
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+    source = tmp_path / 'dream.mp4'
+    source.write_bytes(b'raw')
+    def fake_run(stream, **kwargs):
+        args = stream.get_args()
+        with open(next(arg for arg in args if arg.endswith('.mp4') and arg != str(source)), 'wb') as f:
+            f.write(b'filtered')
+        with open(args[-1], 'wb') as f:
+            f.write(b'png')
+    monkeypatch.setattr(video.ffmpeg, 'run', fake_run)
+    thumb_filename = video.process_video_and_thumbnail(str(source), mock_logger)
+    assert source.read_bytes() == b'filtered'
+    assert (tmp_path / 'thumbs' / thumb_filename).read_bytes() == b'png'
+
+def test_process_video_and_thumbnail_short_video(monkeypatch, mock_config, tmp_path, mock_logger):
+    config = dict(video.get_config(), THUMBS_DIR=str(tmp_path))
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+    source = tmp_path / 'dream.mp4'
+    source.write_bytes(b'raw')
+    monkeypatch.setattr(video.ffmpeg, 'run', lambda stream, **k: None)
+    with pytest.raises(RuntimeError):
+        video.process_video_and_thumbnail(str(source), mock_logger)
+    assert source.read_bytes() == b'raw'
+
+def test_generate_video_single_pass(monkeypatch, mock_config, mock_logger):
+    config = dict(video.get_config(), FFMPEG_SINGLE_PASS=True)
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+    monkeypatch.setattr(video, 'download_video', lambda url, filename, logger: filename)
+    monkeypatch.setattr(video, 'process_video_and_thumbnail', lambda path, logger=None: 'thumb.png')
+    monkeypatch.setattr(video, 'process_video', mock.Mock())
+    monkeypatch.setattr(video, 'process_thumbnail', mock.Mock())
+    job = video.PipelineJob(data={'generation_id': 'gen', 'video_url': 'http://video.url'})
+    assert video.generate_video('prompt', 'dream.mp4', logger=mock_logger, job=job) == ('dream.mp4', 'thumb.png')
+    video.process_video.assert_not_called()
+    video.process_thumbnail.assert_not_called()
+    assert job.data['video_processed'] is True and job.data['thumb_filename'] == 'thumb.png'
+
+def test_stream_process_video_with_thumbnail(monkeypatch, stream_config, tmp_path, mock_logger):
+    stream_config['THUMBS_DIR'] = str(tmp_path / 'thumbs')
+    monkeypatch.setattr(video.ffmpeg, 'run_async', lambda stream, **k: FakeFFmpegProcess(stream))
+    filename, thumb_filename = video.stream_process_video('http://video.url', 'dream.mp4', mock_logger, thumbnail=True)
+    assert filename == 'dream.mp4' and thumb_filename.startswith('thumb_')
+
+@pytest.mark.parametrize('preset, expected, absent', [
+    ('full', ['vaguedenoiser', 'bilateral'], ['hqdn3d', '-preset']),
+    ('balanced', ['hqdn3d', 'noise', '-preset', 'fast'], ['vaguedenoiser', 'bilateral']),
+    ('fast', ['eq', 'vibrance', 'noise', 'veryfast', '-threads'], ['hqdn3d', 'vaguedenoiser']),
+    ('passthrough', ['-c', 'copy'], ['-filter_complex']),
+])
+def test_ffmpeg_presets(mock_config, preset, expected, absent):
+    command = ' '.join(video.filtered_output(video.ffmpeg.input('in.mp4'), 'out.mp4', preset).get_args())
+    assert all(part in command for part in expected)
+    assert not any(part in command for part in absent)
+
+def test_ffmpeg_preset_from_config(monkeypatch, mock_config):
+    config = dict(video.get_config(), FFMPEG_PRESET='fast')
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+    assert video.ffmpeg_preset() is video.FFMPEG_PRESETS['fast']
+    config['FFMPEG_PRESET'] = 'cinematic'
+    with pytest.raises(ValueError):
+        video.ffmpeg_preset()
+
+def test_single_pass_passthrough_copies_video(mock_config):
+    args = video.single_pass_outputs(video.ffmpeg.input('in.mp4'), 'out.mp4', 'thumb.png', 'passthrough').get_args()
+    assert args[args.index('out.mp4') - 6:args.index('out.mp4')] == ['-map', '0:v', '-c', 'copy', '-movflags', '+faststart']
+    assert 'split' not in args[args.index('-filter_complex') + 1]
+
+def test_output_options_cap_threads(monkeypatch, mock_config):
+    config = dict(video.get_config(), FFMPEG_THREADS=1)
+    monkeypatch.setattr(video, 'get_config', lambda: config)
+    monkeypatch.setattr(video, 'thread_cap', lambda: config['FFMPEG_THREADS'])
+    assert video.output_options('fast') == {'preset': 'veryfast', 'threads': 1, 'movflags': '+faststart'}
+    assert video.output_options('full') == {'threads': 1, 'movflags': '+faststart'}
+    assert video.output_options('passthrough') == {'c': 'copy', 'movflags': '+faststart'}
+    config['FFMPEG_THREADS'] = 0
+    assert video.output_options('full') == {'movflags': '+faststart'}